@@ -13,21 +13,25 @@
 
 import errno
 import hashlib
+import itertools
 import json
 import logging
 import os
+import shutil
 import subprocess
 import sys
 import tempfile
 import socket
 import time
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from distutils.spawn import find_executable
 from http import HTTPStatus
 from pathlib import Path
-from threading import Thread, Lock, Condition
-from wsgiref.simple_server import WSGIRequestHandler, make_server
+from socketserver import ThreadingMixIn
+from threading import BoundedSemaphore, Thread, Lock, Condition
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
 from jinja2 import Environment, FileSystemLoader
 
 import daemon
@@ -52,15 +56,107 @@ client_channel = "tool-meister-client"
 # FIXME: move to a constants area, or a configuration setting.
 _MAX_TOOL_DATA_SIZE = 2 ** 30
 
+# Longest chunk size or trailer line accepted in "chunked" PUT requests.
+_MAX_CHUNK_LINE = 1024
+
+# The digits of the hexadecimal chunk sizes of "chunked" PUT requests.
+_HEX_DIGITS = b"0123456789abcdefABCDEF"
+
+# The compression formats of the tar balls sent by Tool Meisters, detected by
+# their magic numbers, with the suffix of the tar ball and the tar options to
+# unpack it; the last entry, for uncompressed tar balls, matches anything.
+_COMPRESSIONS = (
+    (b"\xfd7zXZ\x00", ".tar.xz", ["-J"]),
+    (b"\x28\xb5\x2f\xfd", ".tar.zst", ["-I", "zstd"]),
+    (b"\x04\x22\x4d\x18", ".tar.lz4", ["-I", "lz4"]),
+    (b"\x1f\x8b", ".tar.gz", ["-z"]),
+    (b"BZh", ".tar.bz2", ["-j"]),
+    (b"", ".tar", []),
+)
+
+
+def _detect_compression(head):
+    """Return the suffix and the tar options to unpack a tar ball starting
+    with the given bytes (see _COMPRESSIONS).
+    """
+    for magic, suffix, tar_opts in _COMPRESSIONS:
+        if head.startswith(magic):
+            return suffix, tar_opts
+
+
+def _read_chunked(iostr):
+    """Generate the data of the chunks of an HTTP/1.1 "chunked" request body
+    read from the given input stream, raising ValueError if it is not
+    properly encoded, or is truncated.
+
+    Any chunk extensions and trailer fields are ignored.
+    """
+    while True:
+        line = iostr.readline(_MAX_CHUNK_LINE)
+        if not line.endswith(b"\n"):
+            if len(line) == _MAX_CHUNK_LINE:
+                raise ValueError("chunk size line too long")
+            raise ValueError("truncated chunk size line")
+        size = line.split(b";", 1)[0].strip()
+        if not size or size.strip(_HEX_DIGITS):
+            raise ValueError(f"malformed chunk size line, {line!r}")
+        chunk_size = int(size, 16)
+        if chunk_size == 0:
+            break
+        remaining_bytes = chunk_size
+        while remaining_bytes > 0:
+            buf = iostr.read(
+                _BUFFER_SIZE if remaining_bytes > _BUFFER_SIZE else remaining_bytes
+            )
+            if not buf:
+                raise ValueError("truncated chunk")
+            remaining_bytes -= len(buf)
+            yield buf
+        if iostr.readline(_MAX_CHUNK_LINE).strip():
+            raise ValueError("missing chunk terminator")
+    while True:
+        line = iostr.readline(_MAX_CHUNK_LINE)
+        if not line.endswith(b"\n"):
+            if len(line) == _MAX_CHUNK_LINE:
+                raise ValueError("trailer line too long")
+            raise ValueError("truncated trailer")
+        if not line.strip():
+            break
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """ThreadingWSGIServer - a WSGIServer handling each request in its own
+    thread, with at most `slots` requests handled at a time, the threads of
+    further requests waiting for a slot.
+
+    The slots are acquired by the request threads, and not by the thread
+    accepting the connections, so that a shutdown() is not held up while all
+    the slots are busy.
+    """
+
+    daemon_threads = True
+
+    # The BoundedSemaphore limiting the number of requests handled at a time,
+    # set before serving requests.
+    slots = None
+
+    def process_request_thread(self, request, client_address):
+        with self.slots:
+            super().process_request_thread(request, client_address)
+
 
 class DataSinkWsgiServer(ServerAdapter):
     """DataSinkWsgiServer - an re-implementation of Bottle's WSGIRefServer
     where we have access to the underlying WSGIServer instance in order to
     invoke it's stop() method, and we also provide an WSGIReqeustHandler with
     an opinionated logging implementation.
+
+    Requests are handled one at a time, unless a `concurrency` greater than
+    one is given, when up to that many are handled at a time, each in its
+    own thread (see ThreadingWSGIServer).
     """
 
-    def __init__(self, *args, logger=None, **kw):
+    def __init__(self, *args, logger=None, concurrency=1, **kw):
         if logger is None:
             raise Exception("DataSinkWsgiServer requires a logger")
         super().__init__(*args, **kw)
@@ -101,6 +197,7 @@ class DataSinkWsgiServer(ServerAdapter):
                 )
 
         self.options["handler_class"] = DataSinkWsgiRequestHandler
+        self._concurrency = concurrency
         self._server = None
         self._lock = Lock()
         self._cv = Condition(lock=self._lock)
@@ -109,7 +206,17 @@ class DataSinkWsgiServer(ServerAdapter):
     def run(self, app):
         assert self._server is None, "'run' method called twice"
         self._logger.debug("Making tool data sink WSGI server ...")
-        server = make_server(self.host, self.port, app, **self.options)
+        if self._concurrency > 1:
+            server = make_server(
+                self.host,
+                self.port,
+                app,
+                server_class=ThreadingWSGIServer,
+                **self.options,
+            )
+            server.slots = BoundedSemaphore(self._concurrency)
+        else:
+            server = make_server(self.host, self.port, app, **self.options)
         with self._lock:
             self._server = server
             self._cv.notify()
@@ -422,6 +529,7 @@ class ToolDataSink(Bottle):
         benchmark_run_dir,
         tool_group,
         logger,
+        concurrency=1,
     ):
         super(ToolDataSink, self).__init__()
         # Save external state
@@ -453,9 +561,35 @@ class ToolDataSink(Bottle):
             method="PUT",
             callback=self.put_document,
         )
-        # The list of states where we expect Tool Meisters to send data to us.
-        self._data_states = frozenset(("send", "sysinfo"))
-        self._server = DataSinkWsgiServer(host=bind_hostname, port=8080, logger=logger)
+        # The MD5 sum of streamed documents is verified by a separate PUT.
+        self.route(
+            "/tool-data/<data_ctx>/<hostname>/md5sum",
+            method="PUT",
+            callback=self.put_md5sum,
+        )
+        self.route(
+            "/sysinfo-data/<data_ctx>/<hostname>/md5sum",
+            method="PUT",
+            callback=self.put_md5sum,
+        )
+        # The staging directory and MD5 sum of each streamed document waiting
+        # for its MD5 sum to be verified, by host name.
+        self._streamed = dict()
+        # With more than one PUT request handled at a time, the tar balls
+        # received are unpacked by a pool of as many workers, the hosts of
+        # those which fail to be unpacked being reported by state_change().
+        if concurrency > 1:
+            self._unpackers = ThreadPoolExecutor(max_workers=concurrency)
+        else:
+            self._unpackers = None
+        self._unpack_failures = []
+        # The list of states where we expect Tool Meisters to send data to us;
+        # for "stop-and-send", each Tool Meister sends its data as soon as its
+        # own tools are stopped.
+        self._data_states = frozenset(("send", "stop-and-send", "sysinfo"))
+        self._server = DataSinkWsgiServer(
+            host=bind_hostname, port=8080, logger=logger, concurrency=concurrency
+        )
 
         # Setup the Redis server channel subscription
         logger.debug("pubsub")
@@ -632,6 +766,8 @@ class ToolDataSink(Bottle):
             self.web_server_thread.join()
         except Exception:
             pass
+        if self._unpackers is not None:
+            self._unpackers.shutdown(wait=True)
 
     def _fetch_tms(self):
         """_fetch_tms - fetch all the Tool Meister data for all recorded tool
@@ -821,6 +957,7 @@ class ToolDataSink(Bottle):
         directory_bytes = directory_str.encode("utf-8")
         self.data_ctx = hashlib.md5(directory_bytes).hexdigest()
 
+        status = "success"
         # Transition to "send" state should reset self._tm_tracking
         with self._lock:
             if self.state == "init":
@@ -877,6 +1014,11 @@ class ToolDataSink(Bottle):
                 # tool meisters before proceeding.
                 self._wait_for_all_data()
                 # At this point all tracking data should be "dormant" again.
+                if self._unpack_failures:
+                    status = "failed to unpack data from {}".format(
+                        ", ".join(sorted(self._unpack_failures))
+                    )
+                    self._unpack_failures = []
             else:
                 assert self.state in (
                     "start",
@@ -886,7 +1028,7 @@ class ToolDataSink(Bottle):
                 # FIXME: we should assert that all Tool Meister's tracking
                 # data is "dormant".
 
-        self._send_client_status("success")
+        self._send_client_status(status)
 
     def _send_client_status(self, status):
         """_send_client_status - encapsulate sending back the status message to
@@ -922,15 +1064,10 @@ class ToolDataSink(Bottle):
                 ret_val = 0
         return ret_val
 
-    def put_document(self, data_ctx, hostname):
-        """put_document - PUT callback method for Bottle web server end point
-
-        The put_document method is called by threads serving web requests.
-        There can be N threads configured at one time calling this method.
-
-        Public method, returns None, raises no exceptions directly, calls the
-        Bottle abort() method for error handling.
-
+    def _check_put(self, data_ctx, hostname):
+        """_check_put - verify that a PUT request for the given data context
+        is expected from the given host, calling the Bottle abort() method
+        when it is not.
         """
         with self._lock:
             if self.state not in self._data_states:
@@ -955,6 +1092,23 @@ class ToolDataSink(Bottle):
                 )
                 abort(400, "No data expected from a Tool Meister")
 
+    def put_document(self, data_ctx, hostname):
+        """put_document - PUT callback method for Bottle web server end point
+
+        The put_document method is called by threads serving web requests.
+        There can be N threads configured at one time calling this method.
+
+        Public method, returns None, raises no exceptions directly, calls the
+        Bottle abort() method for error handling.
+
+        A document sent with a "chunked" transfer encoding is handed off to
+        _put_stream() instead.
+        """
+        self._check_put(data_ctx, hostname)
+
+        if request.get("HTTP_TRANSFER_ENCODING", "").lower() == "chunked":
+            return self._put_stream(hostname)
+
         try:
             content_length = int(request["CONTENT_LENGTH"])
         except ValueError:
@@ -980,19 +1134,22 @@ class ToolDataSink(Bottle):
         if not target_dir.is_dir():
             self.logger.error("ERROR - directory, '%s', does not exist", target_dir)
             abort(500, "INTERNAL ERROR")
-        host_data_tb_name = target_dir / f"{hostname}.tar.xz"
-        if host_data_tb_name.exists():
-            abort(409, f"{host_data_tb_name} already uploaded")
-        host_data_tb_md5 = Path(f"{host_data_tb_name}.md5")
+        for _, suffix, _ in _COMPRESSIONS:
+            host_data_tb_name = target_dir / f"{hostname}{suffix}"
+            if host_data_tb_name.exists():
+                abort(409, f"{host_data_tb_name} already uploaded")
 
         with tempfile.NamedTemporaryFile(mode="wb", dir=target_dir) as ofp:
             total_bytes = 0
             iostr = request["wsgi.input"]
             h = hashlib.md5()
+            head = b""
             while remaining_bytes > 0:
                 buf = iostr.read(
                     _BUFFER_SIZE if remaining_bytes > _BUFFER_SIZE else remaining_bytes
                 )
+                if not head:
+                    head = buf
                 bytes_read = len(buf)
                 total_bytes += bytes_read
                 remaining_bytes -= bytes_read
@@ -1008,6 +1165,12 @@ class ToolDataSink(Bottle):
             if total_bytes <= 0:
                 abort(400, "No data received")
 
+            # Name the tar ball after its compression format, which is
+            # detected from its first bytes.
+            suffix, tar_opts = _detect_compression(head)
+            host_data_tb_name = target_dir / f"{hostname}{suffix}"
+            host_data_tb_md5 = Path(f"{host_data_tb_name}.md5")
+
             # First write the .md5
             try:
                 with host_data_tb_md5.open("w") as md5fp:
@@ -1051,14 +1214,30 @@ class ToolDataSink(Bottle):
                     host_data_tb_name,
                 )
 
-        # Now unpack that tar ball
+        # Now unpack that tar ball, leaving it to the pool of unpackers, if
+        # there is one, so that the next PUT can be received meanwhile.
+        unpack_args = (hostname, target_dir, host_data_tb_name, tar_opts)
+        if self._unpackers is not None:
+            self._unpackers.submit(self._unpack_and_post, *unpack_args)
+            return
+        if not self._unpack(*unpack_args):
+            abort(500, "INTERNAL ERROR")
+        self._posted(hostname)
+
+    def _unpack(self, hostname, target_dir, host_data_tb_name, tar_opts):
+        """_unpack - unpack the given tar ball received from the given host
+        into the target directory, removing it and its .md5 once unpacked.
+
+        Returns True on success, False on failure, logging any errors.
+        """
+        host_data_tb_md5 = Path(f"{host_data_tb_name}.md5")
         o_file = target_dir / f"{hostname}.tar.out"
         e_file = target_dir / f"{hostname}.tar.err"
         try:
             # Invoke tar directly for efficiency.
             with o_file.open("w") as ofp, e_file.open("w") as efp:
                 cp = subprocess.run(
-                    [tar_path, "-xf", host_data_tb_name],
+                    [tar_path, *tar_opts, "-xf", host_data_tb_name],
                     cwd=target_dir,
                     stdin=None,
                     stdout=ofp,
@@ -1066,34 +1245,187 @@ class ToolDataSink(Bottle):
                 )
         except Exception:
             self.logger.exception("Failed to extract tar ball, '%s'", host_data_tb_name)
-            abort(500, "INTERNAL ERROR")
-        else:
-            if cp.returncode != 0:
-                self.logger.error(
-                    "Failed to create tar ball; return code: %d", cp.returncode
-                )
-                abort(500, "INTERNAL ERROR")
-            else:
-                self.logger.debug("Successfully unpacked %s", host_data_tb_name)
-                try:
-                    o_file.unlink()
-                    e_file.unlink()
-                    host_data_tb_md5.unlink()
-                    host_data_tb_name.unlink()
-                except Exception:
-                    self.logger.exception(
-                        "Error removing unpacked tar ball '%s' and it's .md5",
-                        host_data_tb_name,
-                    )
+            return False
+        if cp.returncode != 0:
+            self.logger.error(
+                "Failed to create tar ball; return code: %d", cp.returncode
+            )
+            return False
+        self.logger.debug("Successfully unpacked %s", host_data_tb_name)
+        try:
+            o_file.unlink()
+            e_file.unlink()
+            host_data_tb_md5.unlink()
+            host_data_tb_name.unlink()
+        except Exception:
+            self.logger.exception(
+                "Error removing unpacked tar ball '%s' and it's .md5",
+                host_data_tb_name,
+            )
+        return True
+
+    def _unpack_and_post(self, hostname, *args):
+        """_unpack_and_post - unpack a tar ball received from the given host
+        (see _unpack()) in a worker of the pool of unpackers, then tell the
+        "watcher" thread that another PUT document has arrived, remembering
+        the host if it failed to be unpacked.
+        """
+        try:
+            unpacked = self._unpack(hostname, *args)
+        except Exception:
+            self.logger.exception("Unexpected error unpacking data from %s", hostname)
+            unpacked = False
+        if not unpacked:
+            with self._lock:
+                self._unpack_failures.append(hostname)
+        self._posted(hostname)
 
-        # Tell the waiting "watcher" thread engaging in a "state" change
-        # that another PUT document has arrived.
+    def _posted(self, hostname):
+        """_posted - tell the waiting "watcher" thread engaging in a "state"
+        change that another PUT document has arrived.
+        """
         with self._lock:
             tm_tracker = self._tm_tracking[hostname]
             assert tm_tracker["posted"] == "waiting", f"tm_tracker = {tm_tracker!r}"
             tm_tracker["posted"] = "dormant"
             self._cv.notify()
 
+    def _put_stream(self, hostname):
+        """_put_stream - receive a document sent with a "chunked" transfer
+        encoding, piping it into the tar command as it arrives, so that it is
+        unpacked while it is being sent.
+
+        The tar ball is unpacked into a staging directory, and only moved
+        into the target directory once its MD5 sum, which the Tool Meister
+        only knows when it has sent it all, is verified by put_md5sum().
+
+        Returns None, calls the Bottle abort() method for error handling.
+        """
+        target_dir = self.directory
+        if not target_dir.is_dir():
+            self.logger.error("ERROR - directory, '%s', does not exist", target_dir)
+            abort(500, "INTERNAL ERROR")
+        if (target_dir / hostname).exists():
+            abort(409, f"{target_dir / hostname} already uploaded")
+        with self._lock:
+            staged = self._streamed.pop(hostname, None)
+        if staged is not None:
+            # A previous attempt that was never verified.
+            shutil.rmtree(staged[0], ignore_errors=True)
+
+        # The compression format of the tar ball is detected from its first
+        # chunk.
+        chunks = _read_chunked(request["wsgi.input"])
+        try:
+            head = next(chunks, b"")
+        except ValueError as exc:
+            abort(400, f"Invalid chunked content, {exc}")
+        if not head:
+            abort(400, "No data received")
+        _, tar_opts = _detect_compression(head)
+
+        staging_dir = Path(tempfile.mkdtemp(dir=target_dir, prefix=f".{hostname}."))
+        o_file = target_dir / f"{hostname}.tar.out"
+        e_file = target_dir / f"{hostname}.tar.err"
+        staged = False
+        try:
+            with o_file.open("w") as ofp, e_file.open("w") as efp:
+                # Invoke tar directly for efficiency.
+                tar_proc = subprocess.Popen(
+                    [tar_path, *tar_opts, "-xf", "-"],
+                    cwd=staging_dir,
+                    stdin=subprocess.PIPE,
+                    stdout=ofp,
+                    stderr=efp,
+                )
+                try:
+                    total_bytes = 0
+                    h = hashlib.md5()
+                    try:
+                        for buf in itertools.chain((head,), chunks):
+                            total_bytes += len(buf)
+                            if total_bytes > _MAX_TOOL_DATA_SIZE:
+                                abort(400, "Content object too large, keep it at 1 GB")
+                            h.update(buf)
+                            tar_proc.stdin.write(buf)
+                    except ValueError as exc:
+                        abort(400, f"Invalid chunked content, {exc}")
+                    except BrokenPipeError:
+                        # The tar command exited early, reported below.
+                        pass
+                    tar_proc.stdin.close()
+                    returncode = tar_proc.wait()
+                finally:
+                    if tar_proc.poll() is None:
+                        tar_proc.kill()
+                        tar_proc.wait()
+            if returncode != 0:
+                self.logger.error(
+                    "Failed to extract streamed tar ball; return code: %d", returncode
+                )
+                abort(500, "INTERNAL ERROR")
+            self.logger.debug(
+                "Successfully unpacked %d streamed bytes from %s", total_bytes, hostname
+            )
+            try:
+                o_file.unlink()
+                e_file.unlink()
+            except Exception:
+                self.logger.exception(
+                    "Error removing tar command output files of %s", hostname
+                )
+            with self._lock:
+                self._streamed[hostname] = (staging_dir, h.hexdigest())
+            staged = True
+        finally:
+            if not staged:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def put_md5sum(self, data_ctx, hostname):
+        """put_md5sum - PUT callback method for Bottle web server end point
+        verifying the MD5 sum of a document received by _put_stream().
+
+        On success, the unpacked document is moved from its staging directory
+        into the target directory, and the "watcher" thread is told it has
+        arrived.
+
+        Public method, returns None, raises no exceptions directly, calls the
+        Bottle abort() method for error handling.
+        """
+        self._check_put(data_ctx, hostname)
+
+        try:
+            exp_md5 = request["HTTP_MD5SUM"]
+        except Exception:
+            self.logger.exception(request.keys())
+            abort(400, "Missing required md5sum header")
+
+        with self._lock:
+            staged = self._streamed.pop(hostname, None)
+        if staged is None:
+            abort(400, "No streamed data to verify")
+        staging_dir, cur_md5 = staged
+        try:
+            if cur_md5 != exp_md5:
+                abort(
+                    400, f"Content, {cur_md5}, does not match its MD5SUM, {exp_md5}",
+                )
+            try:
+                for entry in staging_dir.iterdir():
+                    entry.rename(self.directory / entry.name)
+            except Exception:
+                self.logger.exception(
+                    "Failed to move streamed data of %s from '%s' to '%s'",
+                    hostname,
+                    staging_dir,
+                    self.directory,
+                )
+                abort(500, "INTERNAL ERROR")
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+        self._posted(hostname)
+
 
 def main(argv):
     PROG = Path(argv[0]).name
@@ -1160,11 +1492,17 @@ def main(argv):
         #
         # E.g. params = '{ "channel": "run-chan",
         #                  "benchmark_run_dir": "/loo/goo" }'
+        #
+        # An optional "concurrency" parameter gives the number of PUT requests
+        # handled at a time, one by default.
         params = json.loads(params_str)
         channel = params["channel"]
         benchmark_run_dir = Path(params["benchmark_run_dir"]).resolve(strict=True)
         bind_hostname = params["bind_hostname"]
         tool_group = params["group"]
+        concurrency = int(params.get("concurrency", 1))
+        if concurrency < 1:
+            raise ValueError(f"invalid concurrency, {concurrency:d}")
     except Exception as ex:
         logger.error("Unable to fetch and decode parameter key, %s: %s", param_key, ex)
         return 6
@@ -1219,6 +1557,7 @@ def main(argv):
                 benchmark_run_dir,
                 tool_group,
                 logger,
+                concurrency=concurrency,
             )
             tds_app.execute()
         except OSError as exc:
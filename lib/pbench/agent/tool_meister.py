@@ -67,6 +67,29 @@ from pbench.common.utils import md5sum
 # FIXME: The client response channel should be in a shared constants module.
 client_channel = "tool-meister-client"
 
+# Read the output of the tar command in 64 KB chunks when streaming it.
+_BUFFER_SIZE = 65536
+
+# How long to wait for the pid files of the tools being stopped to show up,
+# and how often to check on them and on their processes.
+_PID_FILE_WAIT = 10
+_POLL_INTERVAL = 0.1
+
+# The compression engines a Tool Meister can be configured to use for the tar
+# balls it sends: the suffix of their tar balls, whether the engine can use
+# multiple threads, and the compression levels used for small, medium and
+# large payloads per CPU (see compression_level()).
+compression_engines = {
+    "xz": dict(suffix=".tar.xz", threads=True, levels=(6, 3, 1)),
+    "zstd": dict(suffix=".tar.zst", threads=True, levels=(12, 6, 3)),
+    "lz4": dict(suffix=".tar.lz4", threads=False, levels=(9, 1, 1)),
+    "none": dict(suffix=".tar", threads=False, levels=None),
+}
+
+# The payload per CPU up to which the "small" and "medium" levels are used.
+_SMALL_PAYLOAD = 32 * 1024 * 1024
+_MEDIUM_PAYLOAD = 256 * 1024 * 1024
+
 # Logging format string for unit tests
 fmtstr_ut = "%(levelname)s %(name)s %(funcName)s -- %(message)s"
 fmtstr = "%(asctime)s %(levelname)s %(process)s %(thread)s %(name)s %(funcName)s %(lineno)d -- %(message)s"
@@ -267,6 +290,14 @@ class Tool:
         self.tool_dir = tool_dir
         self.start_process = None
         self.stop_process = None
+        # The time.monotonic() when both the start and stop processes were
+        # found to have exited.
+        self.stopped = None
+
+    @property
+    def pid_file(self):
+        """The pid file the tool writes once it is running."""
+        return self.tool_dir / self.name / f"{self.name}.pid"
 
     def _check_no_processes(self):
         if self.start_process is not None:
@@ -306,22 +337,19 @@ class Tool:
                 f"Tool({self.name}) has an unexpected stop process running"
             )
 
-        # FIXME - before we "stop" a tool, check to see if a
-        # "{tool}/{tool}.pid" file exists.  If it doesn't wait for a second to
-        # show up, if after a second it does not show up, then give up waiting
-        # and just call the stop method.
-        tool_pid_file = self.tool_dir / self.name / f"{self.name}.pid"
-        cnt = 0
-        while not tool_pid_file.exists() and cnt < 100:
-            time.sleep(0.1)
-            cnt += 1
+        # The caller waits for the "{tool}/{tool}.pid" file to show up
+        # before stopping a tool, giving up waiting for it after
+        # _PID_FILE_WAIT seconds (see ToolMeister._stop_running_tools()).
+        tool_pid_file = self.pid_file
         if not tool_pid_file.exists():
             self.logger.warning(
-                "Tool(%s) pid file, %s, does not exist after waiting 10 seconds",
+                "Tool(%s) pid file, %s, does not exist after waiting %d seconds",
                 self.name,
                 tool_pid_file,
+                _PID_FILE_WAIT,
             )
 
+        self.stopped = None
         args = [
             f"{self.pbench_bin}/tool-scripts/{self.name}",
             "--stop",
@@ -336,6 +364,20 @@ class Tool:
                 args, stdin=subprocess.DEVNULL, stdout=ofp, stderr=efp
             )
 
+    def poll(self):
+        """Return True once both the tool's "stop" process and its start
+        process have exited, without waiting for them, recording when they
+        were first found to have exited.
+        """
+        if (
+            self.stopped is None
+            and self.stop_process is not None
+            and self.stop_process.poll() is not None
+            and self.start_process.poll() is not None
+        ):
+            self.stopped = time.monotonic()
+        return self.stopped is not None
+
     def wait(self):
         """Wait for any tool processes to terminate after a "stop" process has
         completed.
@@ -355,6 +397,8 @@ class Tool:
             # ... then we wait for the start process to finish
             self.start_process.wait()
             self.start_process = None
+            if self.stopped is None:
+                self.stopped = time.monotonic()
         else:
             raise ToolException(f"Tool({self.name}) wait not called after 'stop'")
 
@@ -381,6 +425,95 @@ class ToolMeisterError(Exception):
     pass
 
 
+def compression_level(levels, size, cpus):
+    """compression_level - return the level of the given levels to compress a
+    payload of the given size with the given number of CPUs, trading a lower
+    compression ratio for speed as the payload per CPU grows.
+    """
+    per_cpu = size / cpus
+    if per_cpu <= _SMALL_PAYLOAD:
+        return levels[0]
+    if per_cpu <= _MEDIUM_PAYLOAD:
+        return levels[1]
+    return levels[2]
+
+
+def payload_size(directory):
+    """payload_size - return the total size of the files under the given
+    directory.
+    """
+    size = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def available_cpus():
+    """available_cpus - return the number of CPUs this process can run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class TarStream:
+    """TarStream - an iterable over the bytes of the compressed tar ball of a
+    directory, as they are written by the tar command, computing their MD5
+    sum on the fly.
+
+    The tar command, writing the tar ball to its standard output, is only
+    started when the stream is first iterated over, so that a new TarStream
+    object has to be created for each attempt to send it, and it is killed
+    if the stream is not read to its end.
+    """
+
+    def __init__(self, args, parent_dir, efp):
+        self.args = args
+        self.parent_dir = parent_dir
+        self.efp = efp
+        self.size = 0
+        self._md5 = hashlib.md5()
+
+    @property
+    def md5(self):
+        return self._md5.hexdigest()
+
+    def __iter__(self):
+        tar_proc = subprocess.Popen(
+            self.args,
+            cwd=self.parent_dir,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=self.efp,
+        )
+        try:
+            while True:
+                buf = tar_proc.stdout.read(_BUFFER_SIZE)
+                if not buf:
+                    break
+                self.size += len(buf)
+                self._md5.update(buf)
+                yield buf
+            tar_proc.stdout.close()
+            returncode = tar_proc.wait()
+            if returncode != 0:
+                # Raising here aborts the HTTP request before its final
+                # chunk is sent, so the Tool Data Sink discards what it
+                # received.
+                raise ToolMeisterError(
+                    f"Failed to create tar ball; return code: {returncode:d}"
+                )
+        finally:
+            if tar_proc.poll() is None:
+                tar_proc.kill()
+                tar_proc.wait()
+            tar_proc.stdout.close()
+
+
 class ToolMeister:
     """Encapsulate tool life-cycle
 
@@ -411,6 +544,13 @@ class ToolMeister:
                           " --group argument to the individual tools>",
             "hostname":   "<hostname of tool meister, should be same as"
                           " 'hostname -f' where tool meister is running>",
+            "streaming":  "<optional, true to stream collected data to the"
+                          " tool data sink as it is compressed, instead of"
+                          " writing it to a local tar ball first>",
+            "compression": "<optional, the compression engine used for the"
+                          " data sent to the tool data sink, one of the"
+                          " compression_engines; single-threaded xz at its"
+                          " default level when not given>",
             "tools": {
                 "tool-0": [ "--opt-0", "--opt-1", ..., "--opt-N" ],
                 "tool-1": [ "--opt-0", "--opt-1", ..., "--opt-N" ],
@@ -420,12 +560,12 @@ class ToolMeister:
         }
 
     Each action message should contain three pieces of data: the action to
-    take, either start, stop, or send, the tool group to apply that action to,
-    and the directory in which to store the data. In JSON form it will look
-    like:
+    take, either start, stop, send, or stop-and-send (stop, then send right
+    away), the tool group to apply that action to, and the directory in which
+    to store the data. In JSON form it will look like:
 
         {
-            "action":     "<'start'|'stop'|'send'>",
+            "action":     "<'start'|'stop'|'send'|'stop-and-send'>",
             "group":     "<tool group name>",
             "directory": "<directory in which to store tool data>"
         }
@@ -435,7 +575,8 @@ class ToolMeister:
     ${benchmark_results_dir} using the controller's host name; if the Tool
     Meister is running remotely, then it will use a local temporary directory
     to write it's data, and will send that data to the Tool Data Sink during
-    the "send" phase.
+    the "send" phase, or as soon as its tools are stopped for the
+    "stop-and-send" action.
 
     """
 
@@ -459,8 +600,12 @@ class ToolMeister:
             tools = params["tools"]
         except KeyError as exc:
             raise ToolMeisterError(f"Invalid parameter block, missing key {exc}")
-        else:
-            return benchmark_run_dir, channel, controller, group, hostname, tools
+        compression = params.get("compression")
+        if compression is not None and compression not in compression_engines:
+            raise ToolMeisterError(
+                f"Invalid parameter block, unknown compression engine {compression!r}"
+            )
+        return benchmark_run_dir, channel, controller, group, hostname, tools
 
     def __init__(
         self, pbench_bin, tar_path, sysinfo_dump, params, redis_server, logger
@@ -477,8 +622,25 @@ class ToolMeister:
             self._hostname,
             self._tools,
         ) = ret_val
+        self._streaming = bool(params.get("streaming", False))
         self._rs = redis_server
         self.logger = logger
+        self._compression = params.get("compression")
+        if (
+            self._compression is not None
+            and compression_engines[self._compression]["levels"] is not None
+            and find_executable(self._compression) is None
+        ):
+            logger.warning(
+                "Compression engine %s not found, using xz", self._compression
+            )
+            self._compression = None
+        # The suffix of the name of the tar balls sent.
+        self._tar_suffix = (
+            ".tar.xz"
+            if self._compression is None
+            else compression_engines[self._compression]["suffix"]
+        )
         self.tool_metadata = toolmetadata.ToolMetadata(
             "redis", redis_server, self.logger
         )
@@ -512,9 +674,23 @@ class ToolMeister:
             "init": {"curr": "startup", "next": "idle", "action": self.init_tools},
             "start": {"curr": "idle", "next": "running", "action": self.start_tools},
             "stop": {"curr": "running", "next": "idle", "action": self.stop_tools},
+            "stop-and-send": {
+                "curr": "running",
+                "next": "idle",
+                "action": self.stop_and_send_tools,
+            },
         }
         self._valid_actions = frozenset(
-            ["end", "init", "send", "start", "stop", "sysinfo", "terminate"]
+            [
+                "end",
+                "init",
+                "send",
+                "start",
+                "stop",
+                "stop-and-send",
+                "sysinfo",
+                "terminate",
+            ]
         )
         for key in self._state_trans.keys():
             assert (
@@ -643,7 +819,7 @@ class ToolMeister:
         self.logger.debug("%s: msg - %r", self._hostname, data)
         return action_method, data
 
-    def _send_client_status(self, status):
+    def _send_client_status(self, status, stop_latency=None):
         """_send_client_status - convenience method to properly publish a
         client operation status.
 
@@ -657,7 +833,13 @@ class ToolMeister:
         #     "hostname": "< the host name on which the ds or tm is running >",
         #     "status": "success|< a message to be displayed on error >"
         #   }
+        # A "stop" status also contains the seconds each tool took to stop:
+        #   {
+        #     "stop_latency": { "< tool name >": < seconds >, ... }
+        #   }
         msg = dict(kind="tm", hostname=self._hostname, status=status)
+        if stop_latency is not None:
+            msg["stop_latency"] = stop_latency
         self.logger.debug("publish tmc")
         try:
             num_present = self._rs.publish(
@@ -818,9 +1000,26 @@ class ToolMeister:
         """_wait_for_tools - convenience method to properly wait for all the
         currently running tools to finish before returning to the caller.
 
+        The processes of all the tools are polled together, so that when each
+        of them exits is known, before waiting on each tool in turn.
+
         Returns the # of failures encountered waiting for tools, logging any
         errors along the way.
         """
+        pending = [
+            tool
+            for name, tool in self._running_tools.items()
+            if name not in self.persist_tools and tool.stop_process is not None
+        ]
+        while pending:
+            try:
+                pending = [tool for tool in pending if not tool.poll()]
+            except Exception:
+                # Reported by the tool's wait() below.
+                break
+            if pending:
+                time.sleep(_POLL_INTERVAL)
+
         failures = 0
         for name in sorted(self._tools.keys()):
             if name in self.persist_tools:
@@ -842,7 +1041,7 @@ class ToolMeister:
                 failures += 1
         return failures
 
-    def stop_tools(self, data):
+    def stop_tools(self, data, send=False):
         """stop_tools - stop any running tools.
 
         The 'action' and 'group' values of the payload have already been
@@ -851,6 +1050,10 @@ class ToolMeister:
         This method only proceeds if the 'directory' entry value of the
         payload matches what was previously provided to a "start tools"
         action.
+
+        When `send` is True, the tool data collected is sent to the tool data
+        sink as soon as the tools are stopped (see send_tools()), a single
+        client status being reported for both.
         """
         if self._directory != data["directory"]:
             self.logger.error(
@@ -862,8 +1065,10 @@ class ToolMeister:
             )
             return False
 
+        stop_begin = time.monotonic()
         failures = 0
         tool_cnt = 0
+        tools = []
         for name in sorted(self._tools.keys()):
             if name in self.persist_tools:
                 continue
@@ -876,14 +1081,14 @@ class ToolMeister:
                 )
                 failures += 1
                 continue
-            try:
-                tool.stop()
-            except Exception:
-                self.logger.exception(
-                    "Failed to stop tool %s running in background", name
-                )
-                failures += 1
+            tools.append(tool)
+        failures += self._stop_running_tools(tools)
         failures += self._wait_for_tools()
+        stop_latency = {
+            tool.name: round(tool.stopped - stop_begin, 3)
+            for tool in tools
+            if tool.stopped is not None
+        }
 
         # Clean up the running tools data structure explicitly ahead of
         # potentially receiving another start tools.
@@ -906,12 +1111,94 @@ class ToolMeister:
         self._tool_dir = None
 
         if failures > 0:
-            msg = f"{failures} of {tool_cnt} failed stopping tools"
-            self._send_client_status(msg)
+            status = f"{failures} of {tool_cnt} failed stopping tools"
         else:
-            self._send_client_status("success")
+            status = "success"
+        if send:
+            # The tool data sink expects data from us even when some tools
+            # failed to stop, so send whatever was collected regardless.
+            send_failures, send_status = self._send_tools(data)
+            failures += send_failures
+            if status == "success":
+                status = send_status
+        self._send_client_status(status, stop_latency=stop_latency)
+        return failures
+
+    def stop_and_send_tools(self, data):
+        """stop_and_send_tools - stop any running tools, then send the tool
+        data collected right away, without waiting for the tools of the other
+        Tool Meisters to stop as separate "stop" and "send" actions do.
+        """
+        return self.stop_tools(data, send=True)
+
+    def _stop_running_tools(self, tools):
+        """_stop_running_tools - stop the given tools, each as soon as its pid
+        file shows up, so that a tool slow to write its pid file does not hold
+        up stopping the others.
+
+        The pid files of all the tools are polled together, until they have
+        all shown up, or _PID_FILE_WAIT seconds have passed, when the tools
+        left are stopped anyway.  The tools found ready together are stopped
+        in the order given.
+
+        Returns the # of failures encountered stopping tools, logging any
+        errors along the way.
+        """
+        failures = 0
+        deadline = time.monotonic() + _PID_FILE_WAIT
+        pending = tools
+        while pending:
+            expired = time.monotonic() >= deadline
+            waiting = []
+            for tool in pending:
+                if not expired and not tool.pid_file.exists():
+                    waiting.append(tool)
+                    continue
+                try:
+                    tool.stop()
+                except Exception:
+                    self.logger.exception(
+                        "Failed to stop tool %s running in background", tool.name
+                    )
+                    failures += 1
+            pending = waiting
+            if pending:
+                # Note when the tools already stopped exit meanwhile.
+                for tool in tools:
+                    tool.poll()
+                time.sleep(_POLL_INTERVAL)
         return failures
 
+    def _tar_command(self, directory, archive):
+        """_tar_command - return the tar command creating the given archive
+        ("-" for its standard output) of the given directory, when run from
+        its parent directory.
+
+        The level of the configured compression engine is picked from the
+        size of the directory and the number of CPUs available, all of which
+        are used by multi-threaded engines.
+        """
+        if self._compression is None:
+            return [self.tar_path, "-Jcf", archive, directory.name]
+        engine = compression_engines[self._compression]
+        args = [self.tar_path, "-cf", archive]
+        if engine["levels"] is not None:
+            cpus = available_cpus()
+            size = payload_size(directory)
+            level = compression_level(engine["levels"], size, cpus)
+            program = [self._compression, f"-{level:d}"]
+            if engine["threads"]:
+                program.append(f"-T{cpus:d}")
+            args.extend(["-I", " ".join(program)])
+            self.logger.debug(
+                "%s: compressing %d bytes with %r",
+                self._hostname,
+                size,
+                " ".join(program),
+            )
+        args.append(directory.name)
+        return args
+
     def _send_directory(self, directory, uri, ctx):
         """_send_directory - tar up the given directory and send via PUT to the
         URL constructed from the "uri" fragment, using the provided context.
@@ -923,21 +1210,22 @@ class ToolMeister:
 
            f"http://{self._controller}:8080/{uri}/{ctx}/{self._hostname}"
 
+        When streaming is enabled in the parameters, the directory is sent by
+        _stream_directory() instead.
         """
+        if self._streaming:
+            return self._stream_directory(directory, uri, ctx)
         failures = 0
         parent_dir = directory.parent
-        tar_file = parent_dir / f"{self._hostname}.tar.xz"
+        tar_file = parent_dir / f"{self._hostname}{self._tar_suffix}"
+        tar_args = self._tar_command(directory, tar_file)
         o_file = parent_dir / f"{self._hostname}.tar.out"
         e_file = parent_dir / f"{self._hostname}.tar.err"
         try:
             # Invoke tar directly for efficiency.
             with o_file.open("w") as ofp, e_file.open("w") as efp:
                 cp = subprocess.run(
-                    [self.tar_path, "-Jcf", tar_file, self._hostname],
-                    cwd=parent_dir,
-                    stdin=None,
-                    stdout=ofp,
-                    stderr=efp,
+                    tar_args, cwd=parent_dir, stdin=None, stdout=ofp, stderr=efp,
                 )
         except Exception:
             self.logger.exception("Failed to create tar ball '%s'", tar_file)
@@ -1058,6 +1346,88 @@ class ToolMeister:
                 )
         return failures
 
+    def _stream_directory(self, directory, uri, ctx):
+        """_stream_directory - send the given directory via a PUT to the same
+        URL as _send_directory(), streaming the output of the tar command as
+        the chunked body of the request instead of first writing it to a
+        local tar ball.
+
+        The MD5 sum of the streamed bytes is only known once they are all
+        sent, so it is sent afterwards by a second PUT to the same URL
+        followed by "/md5sum", to which the Tool Data Sink only responds
+        with success if it matches what it received.
+        """
+        failures = 0
+        parent_dir = directory.parent
+        e_file = parent_dir / f"{self._hostname}.tar.err"
+        url = f"http://{self._controller}:8080/{uri}/{ctx}/{self._hostname}"
+        self.logger.debug(
+            "%s: starting stream_data group=%s, directory=%s",
+            self._hostname,
+            self._group,
+            self._directory,
+        )
+        try:
+            tar_args = self._tar_command(directory, "-")
+            with e_file.open("w") as efp:
+                sent = False
+                retries = 200
+                while not sent:
+                    # Each attempt needs its own stream, re-running tar.
+                    tar_stream = TarStream(tar_args, parent_dir, efp)
+                    try:
+                        response = requests.put(url, data=tar_stream)
+                    except (
+                        ConnectionRefusedError,
+                        requests.exceptions.ConnectionError,
+                    ) as exc:
+                        self.logger.debug("%s", exc)
+                        # Try until we get a connection.
+                        time.sleep(0.1)
+                        retries -= 1
+                        if retries <= 0:
+                            raise
+                    else:
+                        sent = True
+            if response.status_code == 200:
+                response = requests.put(
+                    f"{url}/md5sum", headers={"md5sum": tar_stream.md5}
+                )
+            if response.status_code != 200:
+                self.logger.error(
+                    "PUT '%s' failed with '%d', '%s'",
+                    url,
+                    response.status_code,
+                    response.text,
+                )
+                failures += 1
+            else:
+                self.logger.debug(
+                    "PUT '%s' succeeded ('%d', '%s'), %d bytes streamed",
+                    url,
+                    response.status_code,
+                    response.text,
+                    tar_stream.size,
+                )
+                try:
+                    shutil.rmtree(parent_dir)
+                except Exception:
+                    self.logger.exception(
+                        "Failed to remove tool data hierarchy, '%s'", parent_dir,
+                    )
+                    failures += 1
+            self.logger.info(
+                "%s: PUT %s completed %s %s",
+                self._hostname,
+                uri,
+                self._group,
+                directory,
+            )
+        except Exception:
+            self.logger.exception("Failed to stream tar ball of '%s'", directory)
+            failures += 1
+        return failures
+
     def send_tools(self, data):
         """send_tools - send any collected tool data to the tool data sink.
 
@@ -1068,19 +1438,25 @@ class ToolMeister:
         payload matches what was previously provided to a "start tools"
         action.
         """
+        failures, status = self._send_tools(data)
+        self._send_client_status(status)
+        return failures
 
+    def _send_tools(self, data):
+        """_send_tools - send any collected tool data to the tool data sink
+        (see send_tools()), returning the # of failures encountered and the
+        client status to report.
+        """
         if self.state in ("running", "startup"):
             # The "send tool data" action is only allowed when the Tool
             # Meister has left the startup state (received the first "init" at
             # least, and is not running any tools. It is a no-op if a "send"
             # is issued "send" before any tools were started.
             msg = f"send action received in state '{self.state}'"
-            self._send_client_status(msg)
-            return 1
+            return 1, msg
 
         if len(set(self._tools.keys()) - set(self.persist_tools)) == 0:
-            self._send_client_status("success")
-            return 0
+            return 0, "success"
 
         directory = data["directory"]
         try:
@@ -1093,8 +1469,7 @@ class ToolMeister:
                 directory,
                 self.directories.keys(),
             )
-            self._send_client_status("internal-error")
-            return 1
+            return 1, "internal-error"
 
         if self._hostname == self._controller:
             del self.directories[directory]
@@ -1103,8 +1478,7 @@ class ToolMeister:
             )
             # Note that we don't have a directory to send when a Tool
             # Meister runs on the same host as the controller.
-            self._send_client_status("success")
-            return 0
+            return 0, "success"
 
         assert tool_dir.name == self._hostname, (
             f"Logic Bomb! Final path component of the tool directory is"
@@ -1118,10 +1492,10 @@ class ToolMeister:
         if failures == 0:
             del self.directories[directory]
 
-        self._send_client_status(
-            "success" if failures == 0 else f"{failures} failures sending tool data"
+        return (
+            failures,
+            "success" if failures == 0 else f"{failures} failures sending tool data",
         )
-        return failures
 
     def end_tools(self, data):
         """end_tools - stop all the persistent data collection tools."""
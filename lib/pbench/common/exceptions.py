@@ -56,3 +56,21 @@ class BadSampleName(Exception):
     """
 
     pass
+
+
+class BadManifest(Exception):
+    """Raised when a tar ball's persisted manifest cannot be used, because it
+    is unreadable, of a different format version, or does not belong to the
+    tar ball (MD5 mismatch).
+    """
+
+    pass
+
+
+class BadCheckpoint(Exception):
+    """Raised when the indexing checkpoint left for a tar ball cannot be used,
+    because it is unreadable, of a different format version, or does not
+    belong to the tar ball (MD5 mismatch).
+    """
+
+    pass
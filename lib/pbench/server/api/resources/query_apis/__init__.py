@@ -2,8 +2,19 @@
 Helper functions to get the elasticsearch specific configurations
 """
 
+import itertools
 from configparser import NoSectionError, NoOptionError
 
+import requests
+from requests.adapters import HTTPAdapter
+
+from pbench.server.esconfig import EsConfig
+
+# The requests sessions, one per set of Elasticsearch nodes, shared by all the
+# query API requests, and the rotation of the node URLs for each set.
+_es_sessions = {}
+_es_url_cycles = {}
+
 
 def get_es_host(config):
     try:
@@ -20,10 +31,35 @@ def get_es_port(config):
 
 
 def get_es_url(config):
-    try:
-        return f"http://{get_es_host(config)}:{get_es_port(config)}"
-    except (NoOptionError, NoSectionError):
+    """Return the base URL of the Elasticsearch node to use for the next
+    request, taking turns between the configured nodes, or an empty string
+    when there are none.
+    """
+    es_config = EsConfig.get(config)
+    if es_config is None:
         return ""
+    urls = tuple(es_config.urls)
+    return next(_es_url_cycles.setdefault(urls, itertools.cycle(urls)))
+
+
+def get_es_session(config):
+    """Return the requests session to use to talk to the configured
+    Elasticsearch nodes, keeping up to "connection_pool_size" connections open
+    to each of them, as the indexer does.
+    """
+    es_config = EsConfig.get(config)
+    if es_config is None:
+        return requests.Session()
+    key = (tuple(es_config.urls), es_config.pool_size)
+    session = _es_sessions.get(key)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=len(es_config.hosts), pool_maxsize=es_config.pool_size
+        )
+        session.mount("http://", adapter)
+        session = _es_sessions.setdefault(key, session)
+    return session
 
 
 def get_index_prefix(config):
@@ -1,7 +1,7 @@
 import requests
 from flask_restful import Resource, abort
 from flask import request, make_response
-from pbench.server.api.resources.query_apis import get_es_url
+from pbench.server.api.resources.query_apis import get_es_session, get_es_url
 
 
 class Elasticsearch(Resource):
@@ -10,6 +10,7 @@ class Elasticsearch(Resource):
     def __init__(self, config, logger):
         self.logger = logger
         self.elasticsearch = get_es_url(config)
+        self.session = get_es_session(config)
 
     def post(self):
         json_data = request.get_json(silent=True)
@@ -33,12 +34,12 @@ class Elasticsearch(Resource):
                 url = f"{self.elasticsearch}/{json_data['indices']}"
 
             if "payload" in json_data:
-                es_response = requests.post(url, json=json_data["payload"])
+                es_response = self.session.post(url, json=json_data["payload"])
             else:
                 self.logger.debug(
                     "No payload found in Elasticsearch post request json data"
                 )
-                es_response = requests.get(url)
+                es_response = self.session.get(url)
             es_response.raise_for_status()
 
         except requests.exceptions.HTTPError as e:
@@ -3,7 +3,11 @@ from flask_restful import Resource, abort
 import requests
 
 from dateutil import parser, rrule
-from pbench.server.api.resources.query_apis import get_es_url, get_index_prefix
+from pbench.server.api.resources.query_apis import (
+    get_es_session,
+    get_es_url,
+    get_index_prefix,
+)
 
 
 class QueryControllers(Resource):
@@ -14,6 +18,7 @@ class QueryControllers(Resource):
     def __init__(self, config, logger):
         self.logger = logger
         self.es_url = get_es_url(config)
+        self.session = get_es_session(config)
         self.prefix = get_index_prefix(config)
 
     @staticmethod
@@ -212,7 +217,7 @@ class QueryControllers(Resource):
         uri = f"{self.es_url}/{uri_fragment}/_search"
         try:
             # query Elasticsearch
-            es_response = requests.post(
+            es_response = self.session.post(
                 uri,
                 params={"ignore_unavailable": "true"},
                 headers={
@@ -2,7 +2,11 @@ from flask import jsonify
 from flask_restful import Resource, abort
 import requests
 
-from pbench.server.api.resources.query_apis import get_es_url, get_index_prefix
+from pbench.server.api.resources.query_apis import (
+    get_es_session,
+    get_es_url,
+    get_index_prefix,
+)
 
 
 class QueryMonthIndices(Resource):
@@ -13,6 +17,7 @@ class QueryMonthIndices(Resource):
     def __init__(self, config, logger):
         self.logger = logger
         self.es_url = get_es_url(config)
+        self.session = get_es_session(config)
         self.prefix = get_index_prefix(config)
 
     def get(self):
@@ -48,7 +53,7 @@ class QueryMonthIndices(Resource):
         uri = f"{self.es_url}/_aliases"
         try:
             # query Elasticsearch
-            es_response = requests.get(uri, headers={"Accept": "application/json"})
+            es_response = self.session.get(uri, headers={"Accept": "application/json"})
             es_response.raise_for_status()
         except requests.exceptions.HTTPError as e:
             self.logger.exception("HTTP error {} from Elasticsearch post request", e)
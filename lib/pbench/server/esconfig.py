@@ -0,0 +1,115 @@
+"""Elasticsearch connection settings shared by the indexer, the server status
+reports, and the server query APIs.
+"""
+
+from configparser import NoOptionError, NoSectionError
+
+from pbench.common.exceptions import ConfigFileError
+
+
+class EsConfig:
+    """The Elasticsearch nodes to talk to, and how to talk to them, as
+    configured by the following options of the "elasticsearch" section of the
+    configuration:
+
+        host, port - the single node to use when "hosts" is not given, and
+            the default port of the "hosts" entries
+        hosts - a comma separated list of "host[:port]" nodes over which the
+            requests are spread
+        host_selector - how a node is picked for each request: "round_robin"
+            (the default), "random", or "least_loaded", the node with the
+            fewest requests in flight
+        connection_pool_size - the maximum number of HTTP connections kept
+            open to each node (default 10)
+        dead_timeout - the number of seconds a node which failed a request
+            is left out before being tried again (default 60)
+        max_retries - the number of other nodes tried when a node fails a
+            request (default: one less than the number of nodes)
+        sniff_on_start, sniff_on_connection_fail - whether to discover the
+            nodes of the cluster from the configured ones at start up, and
+            when a node fails (default no)
+        sniffer_timeout - when given, the number of seconds between periodic
+            discoveries of the nodes of the cluster
+
+    Raises NoSectionError or NoOptionError when no node is configured, and
+    ConfigFileError for invalid option values.
+    """
+
+    selectors = ("round_robin", "random", "least_loaded")
+
+    def __init__(self, config):
+        conf = config.conf
+        port = conf.get("elasticsearch", "port", fallback=None)
+        try:
+            hosts = conf.get("elasticsearch", "hosts")
+        except NoOptionError:
+            hosts = conf.get("elasticsearch", "host")
+        self.hosts = []
+        for entry in hosts.split(","):
+            entry = entry.strip()
+            if not entry:
+                continue
+            host, sep, host_port = entry.partition(":")
+            if not host or (sep and not host_port):
+                raise ConfigFileError(
+                    f"Invalid elasticsearch host, '{entry}', expected host[:port]"
+                )
+            if not (host_port or port):
+                raise NoOptionError("port", "elasticsearch")
+            self.hosts.append(dict(host=host, port=host_port or port))
+        if not self.hosts:
+            raise NoOptionError("hosts", "elasticsearch")
+
+        self.selector = conf.get(
+            "elasticsearch", "host_selector", fallback="round_robin"
+        )
+        if self.selector not in self.selectors:
+            raise ConfigFileError(
+                f"Unsupported host_selector, '{self.selector}', expected one of"
+                f" {', '.join(self.selectors)}"
+            )
+        try:
+            self.pool_size = conf.getint(
+                "elasticsearch", "connection_pool_size", fallback=10
+            )
+            self.dead_timeout = conf.getfloat(
+                "elasticsearch", "dead_timeout", fallback=60.0
+            )
+            self.max_retries = conf.getint(
+                "elasticsearch", "max_retries", fallback=len(self.hosts) - 1
+            )
+            self.sniff_on_start = conf.getboolean(
+                "elasticsearch", "sniff_on_start", fallback=False
+            )
+            self.sniff_on_connection_fail = conf.getboolean(
+                "elasticsearch", "sniff_on_connection_fail", fallback=False
+            )
+            self.sniffer_timeout = conf.getfloat(
+                "elasticsearch", "sniffer_timeout", fallback=None
+            )
+        except ValueError as e:
+            raise ConfigFileError(str(e))
+        if self.pool_size < 1:
+            raise ConfigFileError(
+                f"Invalid connection_pool_size, {self.pool_size!r}, must be"
+                " greater than zero"
+            )
+        if self.max_retries < 0:
+            raise ConfigFileError(
+                f"Invalid max_retries, {self.max_retries!r}, must not be negative"
+            )
+
+    @property
+    def urls(self):
+        """The base URLs of the configured nodes."""
+        return [f"http://{h['host']}:{h['port']}" for h in self.hosts]
+
+    @staticmethod
+    def get(config):
+        """Return the EsConfig of the given configuration, or None when it
+        does not configure any Elasticsearch node.
+        """
+        try:
+            return EsConfig(config)
+        except (NoSectionError, NoOptionError):
+            return None
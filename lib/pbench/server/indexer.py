@@ -2,27 +2,39 @@
 result tar balls.
 """
 
+import bisect
 import copy
 import csv
 import glob
 import hashlib
+import io
+import itertools
 import json
+import locale
 import logging
 import math
+import multiprocessing
 import os
+import pickle
 import re
+import signal
 import socket
+import stat
 import sys
 import tarfile
+import tempfile
+import threading
 import errno
-from collections import Counter
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, closing, contextmanager
 from configparser import ConfigParser
 from configparser import Error as ConfigParserError
 from configparser import NoOptionError, NoSectionError
 from datetime import datetime, timedelta
 from operator import itemgetter
 from random import SystemRandom
-from time import sleep as _sleep
+from time import monotonic, perf_counter, sleep as _sleep
 from pathlib import Path
 
 from urllib3 import Timeout
@@ -40,14 +52,22 @@ from pbench.common.exceptions import (
     TemplateError,
     BadIterationName,
     BadSampleName,
+    BadManifest,
+    BadCheckpoint,
 )
 from pbench.common.logger import get_pbench_logger
 
 import pbench.server
 from pbench.server import tstos
+from pbench.server.esconfig import EsConfig
 
 try:
-    from elasticsearch import Elasticsearch, VERSION
+    from elasticsearch import Elasticsearch, Urllib3HttpConnection, VERSION
+    from elasticsearch.connection_pool import (
+        ConnectionSelector,
+        RandomSelector,
+        RoundRobinSelector,
+    )
 
     assert VERSION[0] == 7, "Pbench currently requires Elasticsearch V7.x"
 except ImportError:
@@ -479,42 +499,84 @@ class PbenchTemplates:
         )
 
 
+class _LoadTrackingConnection(Urllib3HttpConnection):
+    """An HTTP connection to an Elasticsearch node which keeps track of the
+    number of its requests in flight, for the _LeastLoadedSelector.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+    def perform_request(self, *args, **kwargs):
+        with self._in_flight_lock:
+            self.in_flight += 1
+        try:
+            return super().perform_request(*args, **kwargs)
+        finally:
+            with self._in_flight_lock:
+                self.in_flight -= 1
+
+
+class _LeastLoadedSelector(ConnectionSelector):
+    """Select the live node with the fewest requests in flight, taking turns
+    between equally loaded nodes.
+    """
+
+    def __init__(self, opts):
+        super().__init__(opts)
+        self._turn = itertools.count()
+
+    def select(self, connections):
+        start = next(self._turn) % len(connections)
+        rotated = connections[start:] + connections[:start]
+        return min(rotated, key=lambda conn: conn.in_flight)
+
+
+_es_selectors = dict(
+    round_robin=RoundRobinSelector,
+    random=RandomSelector,
+    least_loaded=_LeastLoadedSelector,
+)
+
+
 def _get_es_hosts(config, logger):
     """
-    Return list of dicts (a single dict for now) - that's what ES is expecting.
+    Return the EsConfig of the configured Elasticsearch nodes, or None when
+    the configuration does not provide any.
     """
-    try:
-        host = config.get("elasticsearch", "host")
-        port = config.get("elasticsearch", "port")
-    except (NoSectionError, NoOptionError):
+    es_config = EsConfig.get(config)
+    if es_config is None:
         logger.warning(
             "Failed to find an [elasticsearch] section with host and port defined"
             " in {} configuration file.",
             " ".join(config.files),
         )
-        return None
-    timeoutobj = Timeout(total=1200, connect=10, read=_read_timeout)
-    return [
-        dict(host=host, port=port, timeout=timeoutobj),
-    ]
+    return es_config
 
 
 def get_es(config, logger):
     """Return an Elasticsearch() object derived from the given configuration.
     If the configuration does not provide the necessary data, we return None
     instead.
+
+    The client spreads its requests over all the configured nodes, keeping a
+    pool of HTTP connections to each, and leaving out a node for a while when
+    it fails a request (see EsConfig).
     """
-    hosts = _get_es_hosts(config, logger)
-    if hosts is None:
+    es_config = _get_es_hosts(config, logger)
+    if es_config is None:
         return None
     if config._unittests:
         if MockElasticsearch is None:
             raise Exception("MockElasticsearch is not available!")
-        es = MockElasticsearch(hosts, max_retries=0)
+        es = MockElasticsearch(es_config.hosts, max_retries=0)
         from elasticsearch import helpers
 
         global helpers
         helpers.streaming_bulk = es.mockstrm.streaming_bulk
+        helpers.parallel_bulk = es.mockstrm.parallel_bulk
 
         # Fake out the timestamps generated by the pyesbulk module by directly
         # re-binding the name in the pyesbulk scope
@@ -524,7 +586,23 @@ def get_es(config, logger):
         # file instead of setting the logging level up so high.
         logging.getLogger("urllib3").setLevel(logging.FATAL)
         logging.getLogger("elasticsearch1").setLevel(logging.FATAL)
-        es = Elasticsearch(hosts, max_retries=0)
+        es = Elasticsearch(
+            es_config.hosts,
+            # The connection options apply to nodes found by sniffing as well.
+            timeout=Timeout(total=1200, connect=10, read=_read_timeout),
+            maxsize=es_config.pool_size,
+            selector_class=_es_selectors[es_config.selector],
+            connection_class=(
+                _LoadTrackingConnection
+                if es_config.selector == "least_loaded"
+                else Urllib3HttpConnection
+            ),
+            dead_timeout=es_config.dead_timeout,
+            max_retries=es_config.max_retries,
+            sniff_on_start=es_config.sniff_on_start,
+            sniff_on_connection_fail=es_config.sniff_on_connection_fail,
+            sniffer_timeout=es_config.sniffer_timeout,
+        )
     return es
 
 
@@ -539,7 +617,492 @@ _read_timeout = 100000 * 60.0
 _request_timeout = 100000 * 60.0
 
 
-def es_index(es, actions, errorsfp, logger, _dbg=0):
+class BulkEngine:
+    """The bulk indexing engine used by es_index(), as configured by the
+    following options of the "Indexing" section of the configuration:
+
+        bulk_engine - "streaming" (the default), which sends one bulk request
+            at a time, or "parallel", which keeps up to "bulk_concurrency"
+            bulk requests in flight while the next ones are being built
+        bulk_action_count - the maximum number of actions per bulk request
+            of the "parallel" engine (default 500)
+        bulk_max_bytes - the maximum size in bytes of a bulk request of the
+            "parallel" engine (default 100 MiB)
+        bulk_concurrency - the number of concurrent bulk requests of the
+            "parallel" engine (default 4)
+
+    Both engines retry rejected actions (e.g. 429, rejected execution) with a
+    randomized exponential backoff, and the "parallel" engine stops building
+    bulk requests while backing off.
+    """
+
+    engines = ("streaming", "parallel")
+
+    def __init__(self, config):
+        conf = config.conf
+        self.engine = conf.get("Indexing", "bulk_engine", fallback="streaming")
+        if self.engine not in self.engines:
+            raise ConfigFileError(
+                f"Unsupported bulk_engine, '{self.engine}', expected one of"
+                f" {', '.join(self.engines)}"
+            )
+        try:
+            self.action_count = conf.getint(
+                "Indexing", "bulk_action_count", fallback=500
+            )
+            self.max_bytes = conf.getint(
+                "Indexing", "bulk_max_bytes", fallback=100 * 1024 * 1024
+            )
+            self.concurrency = conf.getint("Indexing", "bulk_concurrency", fallback=4)
+        except ValueError as e:
+            raise ConfigFileError(str(e))
+        for name in ("action_count", "max_bytes", "concurrency"):
+            if getattr(self, name) < 1:
+                raise ConfigFileError(
+                    f"Invalid bulk_{name}, {getattr(self, name)!r}, must be"
+                    " greater than zero"
+                )
+
+    def index(self, es, actions, errorsfp, logger):
+        """Index the given actions, returning the same result tuple as
+        es_index().
+        """
+        if self.engine == "parallel":
+            return pyesbulk.parallel_bulk(
+                es,
+                actions,
+                errorsfp,
+                logger,
+                chunk_size=self.action_count,
+                max_chunk_bytes=self.max_bytes,
+                thread_count=self.concurrency,
+                # Only build as many bulk requests ahead as can be sent.
+                queue_size=self.concurrency,
+            )
+        return pyesbulk.streaming_bulk(es, actions, errorsfp, logger)
+
+
+class IndexingStats:
+    """Performance statistics gathered while indexing tar balls:
+
+        phases - the seconds spent in each phase of generating the documents
+            of a tar ball ("open", "members", "sosreports", "run", "toc",
+            "tool_data", "tool_csv", "tool_json", "tool_stdout",
+            "result_data", "result_json", "user_benchmark"), where the time
+            of a phase excludes that of the phases nested in it
+        hashing - the seconds spent computing the IDs of the documents, and
+            the number of IDs computed (included in the time of the phases)
+        serialization - the seconds spent serializing actions for bulk
+            requests, and the number of actions serialized
+        tools - by tool name, the number of documents generated and the
+            seconds spent generating them
+        counters - the number of tar balls indexed, their documents by
+            outcome (successes, duplicates, failures, retries), the seconds
+            spent in es_index(), the number and bytes of bulk requests, and
+            the hits and misses of the timestamp cache (ts_cache_hits,
+            ts_cache_misses)
+        bulk_latency - a histogram of the bulk request latencies
+
+    Document generation is single threaded, while bulk requests may be sent
+    concurrently by the "parallel" bulk engine, so only the recording of bulk
+    requests is serialized.
+
+    The statistics of the tar ball being generated are the "active" ones, to
+    which the computing of document IDs is charged.
+    """
+
+    # Upper bounds, in seconds, of the bulk request latency histogram buckets.
+    latency_buckets = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    active = None
+
+    def __init__(self):
+        self.phases = Counter()
+        self.hashing = Counter()
+        self.serialization = Counter()
+        self.tools = _dict_const()
+        self.counters = Counter()
+        self.bulk_latency = [0] * (len(self.latency_buckets) + 1)
+        self.bulk_latency_sum = 0.0
+        self._lock = threading.Lock()
+        self._stack = []
+        self._mark = 0.0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_stack"] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def begin(self, phase):
+        """Start timing the given phase, pausing the current one, returning
+        the current time.
+        """
+        now = perf_counter()
+        if self._stack:
+            self.phases[self._stack[-1]] += now - self._mark
+        self._stack.append(phase)
+        self._mark = now
+        return now
+
+    def end(self):
+        """Stop timing the current phase, resuming the one it paused,
+        returning the current time.
+        """
+        now = perf_counter()
+        self.phases[self._stack.pop()] += now - self._mark
+        self._mark = now
+        return now
+
+    @contextmanager
+    def phase(self, phase):
+        """Time the body of a "with" statement as the given phase."""
+        self.begin(phase)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def timed(self, phase, iterable, tool=None):
+        """Generate the items of the given iterable, timing the generation of
+        each as the given phase, but not the consumption of the items.  When
+        a tool name is given, the items generated and the time spent are also
+        charged to that tool.
+        """
+        it = iter(iterable)
+        count = 0
+        elapsed = 0.0
+        try:
+            while True:
+                beg = self.begin(phase)
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += self.end() - beg
+                count += 1
+                yield item
+        finally:
+            if tool is not None:
+                tool_stats = self.tools.setdefault(tool, Counter())
+                tool_stats["documents"] += count
+                tool_stats["seconds"] += elapsed
+
+    def record_bulk(self, elapsed, size):
+        """Record a bulk request of the given size, in bytes, and latency."""
+        bucket = bisect.bisect_left(self.latency_buckets, elapsed)
+        with self._lock:
+            self.counters["bulk_requests"] += 1
+            self.counters["bulk_bytes"] += size
+            self.bulk_latency[bucket] += 1
+            self.bulk_latency_sum += elapsed
+
+    def record_index(self, es_res, elapsed):
+        """Record the outcome of indexing a tar ball, the result tuple of
+        es_index(), and the time it took.
+        """
+        _, _, successes, duplicates, failures, retries = es_res
+        self.counters["tarballs"] += 1
+        self.counters["successes"] += successes
+        self.counters["duplicates"] += duplicates
+        self.counters["failures"] += failures
+        self.counters["retries"] += retries
+        self.counters["index_seconds"] += elapsed
+
+    def record_opctx(self, opctx, tbname):
+        """Record the statistics counters (see _stats_counters) kept in the
+        operational contexts of the given tar ball.
+        """
+        for ctx in opctx:
+            if ctx["tbname"] == tbname:
+                for name in _stats_counters:
+                    self.counters[name] += ctx["counters"][name]
+
+    def merge(self, other):
+        """Add the statistics of another IndexingStats object to these."""
+        self.phases.update(other.phases)
+        self.hashing.update(other.hashing)
+        self.serialization.update(other.serialization)
+        for tool, tool_stats in other.tools.items():
+            self.tools.setdefault(tool, Counter()).update(tool_stats)
+        with self._lock:
+            self.counters.update(other.counters)
+            for bucket, count in enumerate(other.bulk_latency):
+                self.bulk_latency[bucket] += count
+            self.bulk_latency_sum += other.bulk_latency_sum
+
+    def to_dict(self):
+        """Return the statistics as a JSON serializable dictionary."""
+        tools = _dict_const()
+        for tool in sorted(self.tools):
+            tool_stats = self.tools[tool]
+            seconds = tool_stats["seconds"]
+            tools[tool] = _dict_const(
+                documents=tool_stats["documents"],
+                seconds=round(seconds, 6),
+                docs_per_sec=round(tool_stats["documents"] / seconds, 3)
+                if seconds > 0
+                else 0.0,
+            )
+        buckets = []
+        cumulative = 0
+        for le, count in zip(self.latency_buckets + ("+Inf",), self.bulk_latency):
+            cumulative += count
+            buckets.append([le, cumulative])
+        return _dict_const(
+            phases=_dict_const(
+                (phase, round(self.phases[phase], 6)) for phase in sorted(self.phases)
+            ),
+            hashing=_dict_const(
+                seconds=round(self.hashing["seconds"], 6),
+                documents=self.hashing["documents"],
+            ),
+            serialization=_dict_const(
+                seconds=round(self.serialization["seconds"], 6),
+                actions=self.serialization["actions"],
+            ),
+            tools=tools,
+            counters=_dict_const(
+                (name, self.counters[name]) for name in sorted(self.counters)
+            ),
+            bulk_latency=_dict_const(
+                buckets=buckets, sum=round(self.bulk_latency_sum, 6), count=cumulative,
+            ),
+        )
+
+    def to_prometheus(self, labels=None):
+        """Return the statistics in the Prometheus text exposition format,
+        each sample carrying the given labels.
+        """
+
+        def fmt(extra=None):
+            lbls = dict(labels or {})
+            if extra:
+                lbls.update(extra)
+            if not lbls:
+                return ""
+            return "{{{}}}".format(
+                ",".join(f'{k}="{v}"' for k, v in sorted(lbls.items()))
+            )
+
+        lines = []
+
+        def metric(name, mtype, help, samples):
+            lines.append(f"# HELP pbench_index_{name} {help}")
+            lines.append(f"# TYPE pbench_index_{name} {mtype}")
+            for suffix, extra, value in samples:
+                lines.append(f"pbench_index_{name}{suffix}{fmt(extra)} {value}")
+
+        stats = self.to_dict()
+        metric(
+            "phase_seconds",
+            "gauge",
+            "Seconds spent in each phase of generating documents.",
+            [("", dict(phase=p), v) for p, v in stats["phases"].items()],
+        )
+        metric(
+            "hashing_seconds",
+            "gauge",
+            "Seconds spent computing document IDs.",
+            [("", None, stats["hashing"]["seconds"])],
+        )
+        metric(
+            "serialization_seconds",
+            "gauge",
+            "Seconds spent serializing bulk request actions.",
+            [("", None, stats["serialization"]["seconds"])],
+        )
+        for name, help in (
+            ("documents", "Documents generated for each tool."),
+            ("seconds", "Seconds spent generating the documents of each tool."),
+            ("docs_per_sec", "Documents generated per second for each tool."),
+        ):
+            metric(
+                f"tool_{name}",
+                "gauge",
+                help,
+                [("", dict(tool=t), v[name]) for t, v in stats["tools"].items()],
+            )
+        metric(
+            "documents",
+            "gauge",
+            "Documents indexed, by outcome.",
+            [
+                ("", dict(outcome=o), self.counters[o])
+                for o in ("successes", "duplicates", "failures", "retries")
+            ],
+        )
+        for name, help in (
+            ("tarballs", "Tar balls indexed."),
+            ("index_seconds", "Seconds spent indexing tar balls."),
+            ("bulk_requests", "Bulk requests sent."),
+            ("bulk_bytes", "Bytes of bulk requests sent."),
+        ):
+            metric(name, "gauge", help, [("", None, self.counters[name])])
+        metric(
+            "timestamp_cache_lookups",
+            "gauge",
+            "Timestamp cache lookups, by outcome.",
+            [
+                ("", dict(outcome=o), self.counters[f"ts_cache_{o}"])
+                for o in ("hits", "misses")
+            ],
+        )
+        latency = stats["bulk_latency"]
+        metric(
+            "bulk_request_seconds",
+            "histogram",
+            "Latency of bulk requests.",
+            [("_bucket", dict(le=le), count) for le, count in latency["buckets"]]
+            + [("_sum", None, latency["sum"]), ("_count", None, latency["count"])],
+        )
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, labels=None):
+        """Atomically (re)write the given Prometheus text file (e.g. for the
+        node exporter's "textfile" collector).
+        """
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as fp:
+            fp.write(self.to_prometheus(labels))
+        os.replace(tmp, path)
+
+
+class _Delegate:
+    """Delegate all attribute references to the wrapped object."""
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+class _TimedSerializer(_Delegate):
+    """Charge the serializing of bulk request actions to an IndexingStats."""
+
+    def __init__(self, serializer, stats):
+        super().__init__(serializer)
+        self._stats = stats
+
+    def dumps(self, data):
+        beg = perf_counter()
+        try:
+            return self._target.dumps(data)
+        finally:
+            self._stats.serialization["seconds"] += perf_counter() - beg
+            self._stats.serialization["actions"] += 1
+
+
+class _BulkSerializer(_Delegate):
+    """Serialize the sources of bulk request actions as the wrapped
+    serializer does, splicing in the JSON of their _ConstFragment values,
+    each serialized once by the wrapped serializer.
+
+    The members of a source are not in the same order as those of the
+    source in the bulk request, which does not matter to Elasticsearch.
+    """
+
+    def dumps(self, data):
+        if not isinstance(data, dict) or not any(
+            type(val) is _ConstFragment for val in data.values()
+        ):
+            return self._target.dumps(data)
+        rest = {}
+        fragments = []
+        for key, val in data.items():
+            if type(val) is _ConstFragment:
+                if val.bulk_json is None:
+                    val.bulk_json = self._target.dumps(val)
+                fragments.append(
+                    "%s:%s" % (json.dumps(key, ensure_ascii=False), val.bulk_json)
+                )
+            else:
+                rest[key] = val
+        body = self._target.dumps(rest)
+        return "%s%s%s}" % (body[:-1], "," if rest else "", ",".join(fragments))
+
+
+class _EsDelegate(_Delegate):
+    """An Elasticsearch client wrapped for es_index()."""
+
+    def __init__(self, es):
+        super().__init__(es)
+        # pyesbulk finds the Elasticsearch module of the client by way of the
+        # client's class, unless told.
+        if not getattr(es, "force_elastic_search_module", None):
+            module = type(es).__module__.split(".")[0]
+            self.force_elastic_search_module = (
+                module if module.startswith("elasticsearch") else "elasticsearch"
+            )
+
+
+class _SplicingEs(_EsDelegate):
+    """An Elasticsearch client serializing the sources of the actions of its
+    bulk requests with a _BulkSerializer.
+    """
+
+    def __init__(self, es):
+        super().__init__(es)
+        transport = getattr(es, "transport", None)
+        if transport is not None:
+            self.transport = _Delegate(transport)
+            self.transport.serializer = _BulkSerializer(transport.serializer)
+
+
+class _InstrumentedEs(_EsDelegate):
+    """An Elasticsearch client recording the bulk requests it sends, and the
+    serializing of their actions, in an IndexingStats.
+    """
+
+    def __init__(self, es, stats):
+        super().__init__(es)
+        self._stats = stats
+        transport = getattr(es, "transport", None)
+        if transport is not None:
+            self.transport = _Delegate(transport)
+            self.transport.serializer = _TimedSerializer(transport.serializer, stats)
+
+    def bulk(self, *args, **kwargs):
+        body = kwargs.get("body", args[0] if args else b"")
+        size = len(body.encode("utf-8") if isinstance(body, str) else body)
+        beg = perf_counter()
+        try:
+            return self._target.bulk(*args, **kwargs)
+        finally:
+            self._stats.record_bulk(perf_counter() - beg, size)
+
+
+class _CheckpointingEs(_EsDelegate):
+    """An Elasticsearch client recording the outcome of the actions of each
+    bulk request it sends in an IndexingCheckpoint.
+    """
+
+    def __init__(self, es, checkpoint):
+        super().__init__(es)
+        self._checkpoint = checkpoint
+
+    def bulk(self, *args, **kwargs):
+        resp = self._target.bulk(*args, **kwargs)
+        self._checkpoint.record_bulk(resp)
+        return resp
+
+
+def es_index(
+    es,
+    actions,
+    errorsfp,
+    logger,
+    _dbg=0,
+    bulk_engine=None,
+    stats=None,
+    checkpoint=None,
+):
     """
     es_index Encapsulate the interface to the pyesbulk module index code.
 
@@ -550,12 +1113,268 @@ def es_index(es, actions, errorsfp, logger, _dbg=0):
         actions ([type]): Elasticsearch bulk index action tuples
         errorsfp ([type]): A file pointer for error reporting
         logger ([type]): Standard logging object for use by bulk indexer
+        bulk_engine ([BulkEngine]): The bulk indexing engine to use, one
+            bulk request at a time when not provided
+        stats ([IndexingStats]): Where to record the bulk requests sent,
+            and the outcome of indexing the actions, when provided
+        checkpoint ([IndexingCheckpoint]): Where to record the actions
+            acknowledged by Elasticsearch, when provided, which is saved
+            when indexing is interrupted
 
     Returns:
         tuple of (start time, end time, indexed count, duplicate count, failed
         count, and retries)
     """
-    return pyesbulk.streaming_bulk(es, actions, errorsfp, logger)
+    if MockElasticsearch is None or not isinstance(es, MockElasticsearch):
+        # The mock'd client does not send any bulk requests.
+        es = _SplicingEs(es)
+        if checkpoint is not None:
+            es = _CheckpointingEs(es, checkpoint)
+        if stats is not None:
+            es = _InstrumentedEs(es, stats)
+    if stats is not None:
+        beg = perf_counter()
+    try:
+        if bulk_engine is not None:
+            res = bulk_engine.index(es, actions, errorsfp, logger)
+        else:
+            res = pyesbulk.streaming_bulk(es, actions, errorsfp, logger)
+    except BaseException:
+        if checkpoint is not None:
+            # Record the actions sent but not acknowledged as well.
+            try:
+                checkpoint.save()
+            except OSError as e:
+                logger.warning("Failed to save indexing checkpoint: {}", e)
+        raise
+    if stats is not None:
+        stats.record_index(res, perf_counter() - beg)
+    if checkpoint is not None:
+        res = checkpoint.adjust_result(res)
+    return res
+
+
+# Counters kept along side the error counters of each operational context,
+# which only provide statistics, and are not errors: they are reported by
+# IndexingStats instead (see IndexingStats.record_opctx()).
+_stats_counters = frozenset(("ts_cache_hits", "ts_cache_misses"))
+
+
+class TimestampFormatter:
+    """Convert the millisecond timestamps found in the data of a run into
+    absolute ISO string timestamps, as PbenchData.mk_abs_timestamp_millis()
+    does, remembering the most recently used ones since the same timestamps
+    are seen over and over for the various tools and hosts of a run.
+
+    The run window is kept in integer microseconds since the epoch so that
+    the range checks and the relative timestamp correction don't require
+    any datetime arithmetic.  Timestamps which are invalid or outside of the
+    run window are not handled here, leaving their reporting to the caller.
+    """
+
+    _epoch = datetime(1970, 1, 1)
+    # Restrict ourselves to four digit years, which is all that the ISO
+    # format string handles consistently.
+    _min_us = (datetime(1000, 1, 1) - _epoch) // timedelta(microseconds=1)
+    _max_us = (datetime.max - _epoch) // timedelta(microseconds=1)
+
+    def __init__(self, start_run_ts, end_run_ts, maxsize=32768):
+        self.start_us = (start_run_ts - self._epoch) // timedelta(microseconds=1)
+        self.end_us = (end_run_ts - self._epoch) // timedelta(microseconds=1)
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+
+    def format(self, orig_ts, counters):
+        """Return the absolute ISO string timestamp for the given millis since
+        the epoch relative or absolute timestamp, or None if it is invalid or
+        outside of the run window.
+
+        The "ts_cache_hits" and "ts_cache_misses" counters are maintained in
+        the given counters object.
+        """
+        try:
+            ts_val = self._cache[orig_ts]
+        except KeyError:
+            pass
+        else:
+            self._cache.move_to_end(orig_ts)
+            counters["ts_cache_hits"] += 1
+            return ts_val
+        try:
+            orig_ts_float = float(orig_ts)
+            # Round to microseconds the same way datetime.utcfromtimestamp()
+            # does.
+            frac, whole = math.modf(orig_ts_float / 1000)
+            ts_us = int(whole) * 1000000 + round(frac * 1e6)
+            if ts_us < self._min_us or ts_us > self._max_us:
+                return None
+            if ts_us < self.start_us:
+                # Treat the timestamp as relative to the start of the run,
+                # rounded to microseconds the same way timedelta() does.
+                ts_us = self.start_us + round(orig_ts_float * 1000)
+                if ts_us < self._min_us:
+                    return None
+            if ts_us > self.end_us:
+                return None
+        except (TypeError, ValueError, OverflowError):
+            return None
+        ts_val = (self._epoch + timedelta(microseconds=ts_us)).isoformat(
+            timespec="microseconds"
+        )
+        self._cache[orig_ts] = ts_val
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        counters["ts_cache_misses"] += 1
+        return ts_val
+
+
+class JsonArrayIterator:
+    """Iterate over the elements of the outer JSON array held in the given
+    file, decoding each one only when the iteration reaches it, so that one
+    element at a time is held in memory instead of the entire document.
+
+    The elements are exactly what json.load() would have returned in the
+    list.  Since a file is only known to be valid once it has been read to
+    the end, a decoding error ends the iteration and is recorded in the
+    "error" attribute, instead of being raised, unless the file was
+    validated first (see validate()).
+
+    Use JsonArrayIterator.load() to construct one.
+    """
+
+    _ws = re.compile(r"[ \t\n\r]*")
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, fp, buf, pos, chunk_size):
+        self.fp = fp
+        self.error = None
+        self._buf = buf
+        self._pos = pos
+        self._chunk_size = chunk_size
+        self._eof = False
+
+    @classmethod
+    def load(cls, fp, chunk_size=64 * 1024, validate=False):
+        """Return a JsonArrayIterator over the JSON array held in the given
+        file, or, when the file does not hold an array, the JSON document
+        loaded in full, raising ValueError if it is invalid, as json.load()
+        does.
+
+        When `validate` is True, an array which is invalid raises ValueError
+        as well, the way json.load() does (see validate()).
+        """
+        buf = fp.read(chunk_size)
+        while True:
+            pos = cls._ws.match(buf).end()
+            if pos < len(buf):
+                break
+            chunk = fp.read(chunk_size)
+            if not chunk:
+                break
+            buf += chunk
+        if buf[pos : pos + 1] != "[":
+            return json.loads(buf + fp.read())
+        it = cls(fp, buf, pos + 1, chunk_size)
+        if validate:
+            it.validate()
+        return it
+
+    def validate(self):
+        """Decode all the elements once, discarding them, raising the
+        ValueError encountered if the file is invalid, so that none of the
+        elements of an invalid file are generated; the iteration then starts
+        from the first element.
+
+        The file must be seekable, and is decoded twice, memory remaining
+        bounded by the largest element.
+        """
+        offset, buf, pos = self.fp.tell(), self._buf, self._pos
+        for _ in self:
+            pass
+        if self.error is not None:
+            raise self.error
+        self.fp.seek(offset)
+        self._buf, self._pos, self._eof = buf, pos, False
+
+    def _fill(self):
+        """Read more of the file, at least as much as the unconsumed text held
+        so that re-decoding a large element remains linear, returning False at
+        the end of the file.
+        """
+        chunk = self.fp.read(max(self._chunk_size, len(self._buf) - self._pos))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def _next_char(self):
+        """Skip white space, returning the next character, or "" at the end of
+        the file.
+        """
+        while True:
+            self._pos = self._ws.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf) or not self._fill():
+                return self._buf[self._pos : self._pos + 1]
+
+    def _decode(self):
+        """Decode the element starting at the current position, making sure
+        it is not cut short by the end of the text read so far (e.g. a number
+        split across reads).
+        """
+        while True:
+            try:
+                element, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._eof or not self._fill():
+                    raise
+                continue
+            nxt = self._ws.match(self._buf, end).end()
+            if nxt < len(self._buf) and self._buf[nxt] in ",]":
+                self._pos = end
+                return element
+            if self._eof or not self._fill():
+                raise json.JSONDecodeError("Expecting ',' delimiter", self._buf, nxt)
+
+    def __iter__(self):
+        try:
+            if self._next_char() == "]":
+                self._pos += 1
+            else:
+                while True:
+                    yield self._decode()
+                    sep = self._next_char()
+                    self._pos += 1
+                    if sep == "]":
+                        break
+                    if self._next_char() == "]":
+                        raise json.JSONDecodeError(
+                            "Expecting value", self._buf, self._pos
+                        )
+            if self._next_char():
+                raise json.JSONDecodeError("Extra data", self._buf, self._pos)
+        except ValueError as exc:
+            self.error = exc
+
+
+class _ConstFragment(dict):
+    """A constant part of many documents, such as the run, iteration and
+    sample metadata of the documents of a ToolData object, encoded as JSON
+    once instead of with each document referring to it.
+
+    The encoding used for source IDs is made when the fragment is
+    constructed (see PbenchData.make_source_id()), the one used for bulk
+    requests when it is first serialized (see _BulkSerializer).  A fragment
+    must not be modified once constructed.
+    """
+
+    __slots__ = ("id_json", "bulk_json")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.id_json = PbenchData._source_id_encode(self)
+        self.bulk_json = None
 
 
 class PbenchData:
@@ -574,6 +1393,11 @@ class PbenchData:
         * get_samples(iteration)
     """
 
+    # JSON files holding an array are decoded an element at a time instead of
+    # all at once (see JsonArrayIterator), once to validate them, so that no
+    # document of an invalid file is generated, and once to generate them.
+    incremental_json = True
+
     def __init__(self, ptb):
         self.year, self.month, self.day = (
             "{:04d}".format(ptb.start_run_ts.year),
@@ -606,13 +1430,44 @@ class PbenchData:
             pass
         self.counters = Counter()
 
+    # Calling json.dumps() with any non-default argument constructs a new
+    # encoder each time, which costs as much as encoding a small document, so
+    # we keep one around for constructing source IDs.
+    _source_id_encode = json.JSONEncoder(sort_keys=True).encode
+
+    @staticmethod
+    def _source_id_json(source):
+        """Return the JSON of json.dumps(source, sort_keys=True), splicing in
+        the encoding of the _ConstFragment values of the source.
+        """
+        encode = PbenchData._source_id_encode
+        if not isinstance(source, dict) or not any(
+            type(val) is _ConstFragment for val in source.values()
+        ):
+            return encode(source)
+        return "{%s}" % ", ".join(
+            "%s: %s"
+            % (encode(key), val.id_json if type(val) is _ConstFragment else encode(val))
+            for key, val in sorted(source.items())
+        )
+
     @staticmethod
     def make_source_id(source):
         """Construct a source ID (MD5 value) by first converting the python object to
         JSON, and then computing the hash of the resulting string.
+
+        The JSON is the same as that of json.dumps(source, sort_keys=True).
         """
-        the_bytes = json.dumps(source, sort_keys=True).encode("utf-8")
-        return hashlib.md5(the_bytes).hexdigest()
+        stats = IndexingStats.active
+        if stats is None:
+            the_bytes = PbenchData._source_id_json(source).encode("utf-8")
+            return hashlib.md5(the_bytes).hexdigest()
+        beg = perf_counter()
+        the_bytes = PbenchData._source_id_json(source).encode("utf-8")
+        source_id = hashlib.md5(the_bytes).hexdigest()
+        stats.hashing["seconds"] += perf_counter() - beg
+        stats.hashing["documents"] += 1
+        return source_id
 
     def mk_abs_timestamp_millis(self, orig_ts):
         """Convert the given millis since the epoch relative or absolute
@@ -621,7 +1476,13 @@ class PbenchData:
 
         It is assumed the given timestamp is a float in milliseconds since
         the epoch and is in UTC.
+
+        Valid timestamps are handled by the tar ball's timestamp formatter,
+        the rest are reported here.
         """
+        ts_val = self.ptb.ts_formatter.format(orig_ts, self.counters)
+        if ts_val is not None:
+            return ts_val
         try:
             orig_ts_float = float(orig_ts)
         except Exception as e:
@@ -740,7 +1601,11 @@ class ResultData(PbenchData):
     def _get_result_json_dirs(ptb):
         """
         Fetch the list of directories containing result.json files for this
-        experiment; return a list directory path names.
+        experiment; return a sorted list directory path names.
+
+        The directories are sorted so that the result data documents are
+        generated in the same order whatever the source of the tar ball's
+        members (see IndexingCheckpoint).
         """
         paths = [
             x.name
@@ -750,7 +1615,7 @@ class ResultData(PbenchData):
         dirnames = []
         for p in paths:
             dirnames.append(os.path.dirname(p))
-        return dirnames
+        return sorted(dirnames)
 
     def make_source(self):
         """
@@ -762,11 +1627,13 @@ class ResultData(PbenchData):
         """
         gen = None
         if self.json_dirs:
-            gen = self._make_source_json()
+            gen = self.ptb.stats.timed("result_json", self._make_source_json())
         if gen is None and self.user_benchmark:
             # We do not have any JSON files for this experiment, but we do
             # have "known" user benchmark files we can index.
-            gen = self._make_user_benchmark_json()
+            gen = self.ptb.stats.timed(
+                "user_benchmark", self._make_user_benchmark_json()
+            )
         return gen
 
     known_user_benchmarks = {
@@ -1280,103 +2147,129 @@ class ResultData(PbenchData):
 
             result_json = os.path.join(self.ptb.extracted_root, dirname, "result.json")
             try:
-                # Read the file and interpret it as a JSON document.
-                with open(result_json) as fp:
-                    results = json.load(fp)
+                # Read the file and interpret it as a JSON document, an
+                # iteration at a time.
+                fp = open(result_json)
             except Exception as e:
                 self.logger.warning(
                     "result-data-indexing: encountered invalid JSON file,"
-                    " {}: {:r} ({})",
+                    " {}: {!r} ({})",
                     result_json,
                     e,
                     self.ptb._tbctx,
                 )
                 self.counters["not_valid_json_file"] += 1
                 continue
+            with fp:
+                yield from self._make_source_result_json(dirname, result_json, fp)
+        return
+
+    def _make_source_result_json(self, dirname, result_json, fp):
+        """Generate the source documents of the top-level result.json file."""
+        try:
+            if self.incremental_json:
+                results = JsonArrayIterator.load(fp, validate=True)
+            else:
+                results = json.load(fp)
+        except Exception as e:
+            self.logger.warning(
+                "result-data-indexing: encountered invalid JSON file, {}: {!r} ({})",
+                result_json,
+                e,
+                self.ptb._tbctx,
+            )
+            self.counters["not_valid_json_file"] += 1
+            return
 
-            # The outer results object should be an array of iterations. Probe
-            # to see if that is true.
-            if not isinstance(results, list):
+        # The outer results object should be an array of iterations. Probe
+        # to see if that is true.
+        if not isinstance(results, (list, JsonArrayIterator)):
+            self.logger.warning(
+                "result-data-indexing: encountered unexpected"
+                " JSON file format, %s ({})",
+                result_json,
+                self.ptb._tbctx,
+            )
+            return
+
+        for iteration in results:
+            try:
+                iter_number = iteration["iteration_number"]
+                iter_name = iteration["iteration_name"]
+                iter_data = iteration["iteration_data"]
+            except KeyError:
                 self.logger.warning(
-                    "result-data-indexing: encountered unexpected"
-                    " JSON file format, %s ({})",
+                    "result-data-indexing: could not find"
+                    " iteration data in JSON file, {} ({})",
                     result_json,
                     self.ptb._tbctx,
                 )
+                self.counters["missing_iteration"] += 1
                 continue
-
-            for iteration in results:
+            try:
+                iter_name_fmt = iteration["iteration_name_format"]
+            except KeyError:
+                iter_name_fmt = None
+            # Validate the iteration name by looking for the iteration
+            # directory on disk.
+            if iter_name_fmt:
                 try:
-                    iter_number = iteration["iteration_number"]
-                    iter_name = iteration["iteration_name"]
-                    iter_data = iteration["iteration_data"]
-                except KeyError:
+                    iter_name = iter_name_fmt % (int(iter_number), iter_name)
+                except (ValueError, TypeError) as exc:
                     self.logger.warning(
-                        "result-data-indexing: could not find"
-                        " iteration data in JSON file, {} ({})",
+                        "result-data-indexing: encountered bad"
+                        " iteration name format '{}' in JSON file,"
+                        " {}: {} ({})",
+                        iteration["iteration_name_format"],
                         result_json,
+                        exc,
                         self.ptb._tbctx,
                     )
-                    self.counters["missing_iteration"] += 1
+                    self.counters["bad_iteration_name_fmt"] += 1
                     continue
-                try:
-                    iter_name_fmt = iteration["iteration_name_format"]
-                except KeyError:
-                    iter_name_fmt = None
-                # Validate the iteration name by looking for the iteration
-                # directory on disk.
-                if iter_name_fmt:
-                    try:
-                        iter_name = iter_name_fmt % (int(iter_number), iter_name)
-                    except (ValueError, TypeError) as exc:
-                        self.logger.warning(
-                            "result-data-indexing: encountered bad"
-                            " iteration name format '{}' in JSON file,"
-                            " {}: {} ({})",
-                            iteration["iteration_name_format"],
-                            result_json,
-                            exc,
-                            self.ptb._tbctx,
-                        )
-                        self.counters["bad_iteration_name_fmt"] += 1
-                        continue
+                iter_dir = os.path.join(self.ptb.extracted_root, dirname, iter_name)
+                if not os.path.isdir(iter_dir):
+                    self.logger.warning(
+                        "result-data-indexing: formatted iteration"
+                        " name '{}' in JSON file, {}, does not"
+                        " exist as a directory ({})",
+                        iter_name,
+                        result_json,
+                        self.ptb._tbctx,
+                    )
+                    self.counters["bad_iteration_name"] += 1
+                    continue
+            else:
+                iter_dir = os.path.join(self.ptb.extracted_root, dirname, iter_name)
+                if not os.path.isdir(iter_dir):
+                    iter_name = "{:d}-{}".format(iter_number, iter_name)
                     iter_dir = os.path.join(self.ptb.extracted_root, dirname, iter_name)
                     if not os.path.isdir(iter_dir):
                         self.logger.warning(
-                            "result-data-indexing: formatted iteration"
-                            " name '{}' in JSON file, {}, does not"
-                            " exist as a directory ({})",
-                            iter_name,
+                            "result-data-indexing: encountered bad"
+                            " iteration name '{}' in JSON file, {},"
+                            " does not exist as a directory ({})",
+                            iteration["iteration_name"],
                             result_json,
                             self.ptb._tbctx,
                         )
                         self.counters["bad_iteration_name"] += 1
                         continue
-                else:
-                    iter_dir = os.path.join(self.ptb.extracted_root, dirname, iter_name)
-                    if not os.path.isdir(iter_dir):
-                        iter_name = "{:d}-{}".format(iter_number, iter_name)
-                        iter_dir = os.path.join(
-                            self.ptb.extracted_root, dirname, iter_name
-                        )
-                        if not os.path.isdir(iter_dir):
-                            self.logger.warning(
-                                "result-data-indexing: encountered bad"
-                                " iteration name '{}' in JSON file, {},"
-                                " does not exist as a directory ({})",
-                                iteration["iteration_name"],
-                                result_json,
-                                self.ptb._tbctx,
-                            )
-                            self.counters["bad_iteration_name"] += 1
-                            continue
-                # Generate JSON documents for each iteration using the
-                # iteration metadata name and number.
-                for src, _id, _parent, _type in self._handle_iteration(
-                    iter_data, iter_name, iter_number, result_json
-                ):
-                    yield src, _id, _parent, _type
-        return
+            # Generate JSON documents for each iteration using the
+            # iteration metadata name and number.
+            for src, _id, _parent, _type in self._handle_iteration(
+                iter_data, iter_name, iter_number, result_json
+            ):
+                yield src, _id, _parent, _type
+        if getattr(results, "error", None) is not None:
+            # The file was modified since it was validated.
+            self.logger.warning(
+                "result-data-indexing: encountered invalid JSON file, {}: {!r} ({})",
+                result_json,
+                results.error,
+                self.ptb._tbctx,
+            )
+            self.counters["not_valid_json_file"] += 1
 
     def _handle_iteration(self, iter_data, iter_name, iter_number, result_json):
         """Generate source documents for iteration data.
@@ -2170,50 +3063,260 @@ _aliases = {
 }
 
 
-def _noop(arg):
-    return arg
+class ToolHandlerResolver:
+    """Resolve the handler record of each tool data file name.
 
+    The patterns of the handler of a tool are compiled into a single
+    alternation, so that a file name is matched once instead of against each
+    pattern in turn, and the handler record resolved for a tool's file name,
+    after considering its alias (see _aliases), is remembered for the rest
+    of the indexing run, since the same file names are found in every sample
+    of every iteration for every host.
 
-class ToolData(PbenchData):
-    def __init__(self, ptb, iteration, sample, host, tool):
-        super().__init__(ptb)
-        self.toolname = tool
-        self.idxctx.opctx.append(
-            _dict_const(
-                tbname=ptb.tbname,
-                object="ToolData-%s-%s-%s-%s" % (iteration, sample, host, tool),
-                counters=self.counters,
+    A tool's patterns are compiled on first use, and again whenever its
+    handler's list of patterns changes, forgetting the file names resolved
+    with the previous ones.
+    """
+
+    # Named groups of the handler patterns become non-capturing groups of the
+    # alternation, as different patterns may use the same group names.
+    _named_group_pat = re.compile(r"\(\?P<\w+>")
+
+    def __init__(self, aliases):
+        self.aliases = aliases
+        self._matchers = {}
+        self._resolved = {}
+        self.hits = 0
+        self.misses = 0
+        self.compiles = 0
+
+    @classmethod
+    def _compile(cls, patterns):
+        """Return a function returning the first handler record of the given
+        list whose pattern matches a file name, or None.
+        """
+
+        def match_each(fname):
+            for rec in patterns:
+                if rec["pattern"].match(fname):
+                    return rec
+            return None
+
+        alternatives = []
+        for idx, rec in enumerate(patterns):
+            pattern = rec["pattern"]
+            if pattern.flags != re.compile("").flags or re.search(
+                r"\(\?P=|\\[0-9]", pattern.pattern
+            ):
+                # Flags and back references don't survive being combined.
+                return match_each
+            alternatives.append(
+                "(?P<_{:d}>{})".format(
+                    idx, cls._named_group_pat.sub("(?:", pattern.pattern)
+                )
             )
-        )
         try:
-            iterseqno = int(iteration.split("-", 1)[0])
-        except ValueError:
-            iterseqno = -1
-        itername = iteration
+            combined = re.compile("|".join(alternatives))
+        except re.error:
+            return match_each
+
+        def match_combined(fname):
+            m = combined.match(fname)
+            if m is None:
+                return None
+            return patterns[int(m.lastgroup[1:])]
 
-        self.iteration_metadata = _dict_const(name=itername, number=iterseqno,)
-        self.sample_metadata = _dict_const(name=sample, hostname=host)
+        return match_combined
 
+    def _matcher(self, tool, patterns):
+        # The matcher is kept with a copy of the records it was compiled from,
+        # so that any change to the list, made in place or not, is noticed.
+        patterns = tuple(patterns)
         try:
-            self.handler = _known_tool_handlers[tool]
+            cached_patterns, matcher = self._matchers[tool]
         except KeyError:
-            self.handler = None
-            self.files = None
-            self.basepath = None
+            pass
         else:
-            toolsgroup = ptb.run_metadata["toolsgroup"]
-            self.run_metadata["toolsgroup"] = toolsgroup
-            # Impedance match between host names used when registering tools
-            # and <label>:<hostname_s> convention used when collecting the
-            # results. Usually when labels are found the on-disk directory
-            # name where tool data is stored is <label>:<hostname_s>. But when
-            # a full hostname was used to register the tool, that can be used
-            # for the on-disk directory name instead of the short
-            # hostname. And it seems there were different versions of the
-            # agent that behaved in reverse.  So instead of just guessing at
-            # which one to use, we try all three combinations.
-            files = None
-            try:
+            if cached_patterns == patterns:
+                return matcher
+            for key in [key for key in self._resolved if key[0] == tool]:
+                del self._resolved[key]
+        matcher = self._compile(patterns)
+        self._matchers[tool] = (patterns, matcher)
+        self.compiles += 1
+        return matcher
+
+    def resolve(self, tool, handler, fname, use_aliases=True):
+        """Return the record of the given tool's handler for the file name,
+        trying the name's alias when it has no record of its own (unless
+        use_aliases is False), or None if there is none.
+        """
+        matcher = self._matcher(tool, handler["patterns"])
+        key = (tool, fname, use_aliases)
+        try:
+            handler_rec = self._resolved[key]
+        except KeyError:
+            self.misses += 1
+        else:
+            self.hits += 1
+            return handler_rec
+        handler_rec = matcher(fname)
+        if handler_rec is None and use_aliases:
+            try:
+                alias_name = self.aliases[fname]
+            except KeyError:
+                pass
+            else:
+                handler_rec = matcher(alias_name)
+        self._resolved[key] = handler_rec
+        return handler_rec
+
+    def cache_info(self):
+        """Return the statistics of the resolutions made so far."""
+        return _dict_const(
+            hits=self.hits,
+            misses=self.misses,
+            size=len(self._resolved),
+            compiles=self.compiles,
+        )
+
+
+# The resolution of the handler records of tool data files, shared by the
+# whole indexing run.
+_tool_handler_resolver = ToolHandlerResolver(_aliases)
+
+
+def _noop(arg):
+    return arg
+
+
+class OpenFileBudget:
+    """Bound the number of tool data files held open at once, by all the
+    ToolData units being generated, including those of the processes of the
+    tool data pool (see PbenchTarBall.mk_tool_data_actions()), which inherit
+    the budget of the process which created it.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._slots = multiprocessing.BoundedSemaphore(limit)
+
+    @contextmanager
+    def slots(self, wanted=1):
+        """Take between one and `wanted` slots of the budget, yielding the
+        number taken, releasing them on exit.
+
+        Only the first slot is waited for, the others are taken if they are
+        available, so that a process never waits for a slot while holding
+        others, which could leave processes waiting on each other forever.
+        """
+        self._slots.acquire()
+        taken = 1
+        try:
+            while taken < wanted and self._slots.acquire(False):
+                taken += 1
+            yield taken
+        finally:
+            for _ in range(taken):
+                self._slots.release()
+
+
+class CsvDataFile(dict):
+    """A .csv tool data file, described by its "path" (in the tar ball),
+    "basename", "handler_rec", and "header" (its first row).
+
+    Only the header is read when the object is constructed, through a small
+    buffered read, the file being closed right after.  The rows are read by
+    opening the file again, when the documents are generated (see rows()).
+    """
+
+    # The size of the reads of the header row.
+    header_peek_size = 1024
+
+    def __init__(self, extracted_root, budget, **kwargs):
+        super().__init__(**kwargs)
+        self.fullpath = os.path.join(extracted_root, self["path"])
+        self.budget = budget
+        with self.budget.slots(), open(
+            self.fullpath, "rb", buffering=self.header_peek_size
+        ) as fp:
+            line = fp.readline()
+        self["header"] = next(
+            csv.reader([line.decode(locale.getpreferredencoding(False))])
+        )
+
+    @contextmanager
+    def open_rows(self):
+        """Open the file, yielding an iterator over its rows after the header,
+        and close it on exit.
+
+        The caller is expected to hold a slot of the open file budget.
+        """
+        with open(self.fullpath, "r") as fp:
+            reader = csv.reader(fp)
+            next(reader, None)
+            yield reader
+
+    def rows(self):
+        """Generate the rows of the file after the header, holding a slot of
+        the open file budget while the file is open.
+        """
+        with self.budget.slots(), self.open_rows() as reader:
+            yield from reader
+
+
+def _tool_data_unit_name(iteration, sample, host, tool):
+    """The name of a unit of tool data, the data of one tool of one host in
+    one sample of one iteration.
+    """
+    return "ToolData-%s-%s-%s-%s" % (iteration, sample, host, tool)
+
+
+class ToolData(PbenchData):
+    # Unified .csv file data is converted a column at a time when possible,
+    # instead of a row at a time (see _make_source_unified()).
+    unified_columnar = True
+
+    def __init__(self, ptb, iteration, sample, host, tool):
+        super().__init__(ptb)
+        self.toolname = tool
+        self.unit_name = _tool_data_unit_name(iteration, sample, host, tool)
+        self.idxctx.opctx.append(
+            _dict_const(
+                tbname=ptb.tbname, object=self.unit_name, counters=self.counters,
+            )
+        )
+        try:
+            iterseqno = int(iteration.split("-", 1)[0])
+        except ValueError:
+            iterseqno = -1
+        itername = iteration
+
+        # The run, iteration and sample metadata are shared by all the
+        # documents of the tool data, and only encoded once.
+        self.iteration_metadata = _ConstFragment(name=itername, number=iterseqno)
+        self.sample_metadata = _ConstFragment(name=sample, hostname=host)
+
+        try:
+            self.handler = _known_tool_handlers[tool]
+        except KeyError:
+            self.handler = None
+            self.files = None
+            self.basepath = None
+        else:
+            toolsgroup = ptb.run_metadata["toolsgroup"]
+            self.run_metadata = _ConstFragment(self.run_metadata, toolsgroup=toolsgroup)
+            # Impedance match between host names used when registering tools
+            # and <label>:<hostname_s> convention used when collecting the
+            # results. Usually when labels are found the on-disk directory
+            # name where tool data is stored is <label>:<hostname_s>. But when
+            # a full hostname was used to register the tool, that can be used
+            # for the on-disk directory name instead of the short
+            # hostname. And it seems there were different versions of the
+            # agent that behaved in reverse.  So instead of just guessing at
+            # which one to use, we try all three combinations.
+            files = None
+            try:
                 label = ptb.mdconf.get("tools/{}".format(host), "label")
             except Exception:
                 label = ""
@@ -2287,6 +3390,12 @@ class ToolData(PbenchData):
             { "@timestamp": 00001, "id": "id0", "foo": 1.1, "bar": 4.1 },
             { "@timestamp": 00001, "id": "id1", "foo": 2.1, "bar": 5.1 },
             { "@timestamp": 00001, "id": "id2", "foo": 3.1, "bar": 6.1 } ]
+
+        When the .csv files are regular (same number of rows, each as wide
+        as its header, with the same timestamps), all their rows are read
+        at once and converted a column at a time, and the documents are
+        then emitted from those columns.  Otherwise, the rows are processed
+        in lock step, one row from each .csv file at a time.
         """
         # Class list is generated from the handler data
         class_list = _dict_const()
@@ -2367,8 +3476,8 @@ class ToolData(PbenchData):
                     if subfield not in handler_rec["subfields"]:
                         self.logger.warning(
                             "tool-data-indexing: column header,"
-                            " {:r}, has an unexpected subfield, {:r},"
-                            " expected {:r} subfields, for .csv {} ({})",
+                            " {!r}, has an unexpected subfield, {!r},"
+                            " expected {!r} subfields, for .csv {} ({})",
                             col,
                             subfield,
                             handler_rec["subfields"],
@@ -2407,8 +3516,8 @@ class ToolData(PbenchData):
                             except IndexError:
                                 self.logger.warning(
                                     "tool-data-indexing: handler"
-                                    " metadata, {:r}, not found in column"
-                                    " {:r} using pattern {:r}, for .csv"
+                                    " metadata, {!r}, not found in column"
+                                    " {!r} using pattern {!r}, for .csv"
                                     " '{}' ({})",
                                     handler_rec["metadata"],
                                     col,
@@ -2427,6 +3536,76 @@ class ToolData(PbenchData):
         # At this point, we have processed all the data about csv files
         # and are ready to start reading the contents of all the csv
         # files and building the unified records.
+        self.logger.info(
+            "tool-data-indexing: tool {}, gen unified begin for {}",
+            self.toolname,
+            self.basepath,
+        )
+        tables = columns = None
+        if self.unified_columnar:
+            # Each .csv file is read in full, one at a time.
+            tables = [(csvf["basename"], list(csvf.rows())) for csvf in self.files]
+            columns = self._read_unified_columns(tables, metric_mapping, field_mapping)
+        with ExitStack() as stack:
+            if columns is not None:
+                gen = self._gen_unified_columnar(
+                    columns, identifiers, metadata, class_list
+                )
+            else:
+                if tables is not None:
+                    # The rows we have already read have to be processed in
+                    # lock step instead.
+                    readers = [(fname, iter(rows)) for fname, rows in tables]
+                else:
+                    readers = stack.enter_context(self._open_csv_readers())
+                gen = self._gen_unified_rows(
+                    readers,
+                    identifiers,
+                    metadata,
+                    class_list,
+                    metric_mapping,
+                    field_mapping,
+                )
+            for source, source_id in gen:
+                yield source, source_id
+        self.logger.info(
+            "tool-data-indexing: tool {}, end unified for {}",
+            self.toolname,
+            self.basepath,
+        )
+        return
+
+    @contextmanager
+    def _open_csv_readers(self):
+        """Open the .csv files of this tool to read their rows in lock step,
+        yielding a list of (basename, rows iterator) tuples, and close them
+        on exit.
+
+        When fewer slots of the open file budget than there are files are
+        available, the files beyond those which can be kept open are read in
+        full up front instead, one at a time.
+        """
+        budget = self.idxctx.tool_data_open_files
+        with budget.slots(len(self.files)) as taken, ExitStack() as stack:
+            # One of the slots is kept for the files read up front.
+            kept_open = taken if taken == len(self.files) else taken - 1
+            readers = []
+            for idx, csvf in enumerate(self.files):
+                if idx < kept_open:
+                    rows = stack.enter_context(csvf.open_rows())
+                else:
+                    with csvf.open_rows() as reader:
+                        rows = iter(list(reader))
+                readers.append((csvf["basename"], rows))
+            yield readers
+
+    def _gen_unified_rows(
+        self, readers, identifiers, metadata, class_list, metric_mapping, field_mapping
+    ):
+        """Generate the unified documents by reading one row at a time from
+        each of the given .csv file readers in lock step.
+        """
+
         def rows_generator():
             # We use this generator to highlight the process of reading from
             # all the csv files, reading one row from each of the csv files,
@@ -2436,9 +3615,9 @@ class ToolData(PbenchData):
             while True:
                 # Read a row from each .csv file
                 rows = _dict_const()
-                for csvf in self.files:
+                for fname, reader in readers:
                     try:
-                        rows[csvf["basename"]] = next(csvf["reader"])
+                        rows[fname] = next(reader)
                     except StopIteration:
                         # This should handle the case of mismatched number of
                         # rows across all .csv files. All readers which have
@@ -2453,11 +3632,6 @@ class ToolData(PbenchData):
                 yield idx, rows
                 idx += 1
 
-        self.logger.info(
-            "tool-data-indexing: tool {}, gen unified begin for {}",
-            self.toolname,
-            self.basepath,
-        )
         prev_first = None
         prev_ts_val = None
         for idx, rows in rows_generator():
@@ -2568,13 +3742,132 @@ class ToolData(PbenchData):
             for _id, source in datum.items():
                 source_id = PbenchData.make_source_id(source)
                 yield source, source_id
-        self.logger.info(
-            "tool-data-indexing: tool {}, end unified for {}",
-            self.toolname,
-            self.basepath,
-        )
         return
 
+    def _read_unified_columns(self, tables, metric_mapping, field_mapping):
+        """Convert the rows read from each of the .csv files into columns of
+        converted values, and the timestamp column into absolute timestamps,
+        in one pass each.
+
+        Returns a tuple of the original timestamp column, the absolute
+        timestamp column, and a dictionary mapping each identifier to the
+        list of (klass, metric, subfield, values) tuples of its columns, in
+        .csv file and column order.
+
+        Returns None if the rows have to be processed in lock step instead,
+        because the .csv files have mismatched row counts, row lengths, or
+        timestamps, or because any value or timestamp fails to convert.  The
+        lock step processing handles (and reports) those cases row by row.
+        """
+        nrows = None
+        ts_col = None
+        fields = _dict_const()
+        for fname, rows in tables:
+            try:
+                klass, metric, converter = metric_mapping[fname]
+            except KeyError:
+                return None
+            mapping = field_mapping[fname]
+            ncols = len(mapping)
+            if nrows is None:
+                nrows = len(rows)
+            elif len(rows) != nrows:
+                return None
+            if any(len(row) != ncols for row in rows):
+                return None
+            cols = list(zip(*rows)) if rows else [()] * ncols
+            if ts_col is None:
+                ts_col = cols[0]
+            elif cols[0] != ts_col:
+                return None
+            for idx in range(1, ncols):
+                identifier, subfield = mapping[idx]
+                try:
+                    values = list(map(converter, cols[idx]))
+                except Exception:
+                    return None
+                fields.setdefault(identifier, []).append(
+                    (klass, metric, subfield, values)
+                )
+        if ts_col is None:
+            return None
+        # A metric with sub-fields in one column and without in another can't
+        # be represented in one document.
+        for id_fields in fields.values():
+            has_subfields = {}
+            for klass, metric, subfield, _ in id_fields:
+                key = (klass, metric)
+                if has_subfields.setdefault(key, bool(subfield)) != bool(subfield):
+                    return None
+        ts_vals = self._unified_timestamps(ts_col)
+        if ts_vals is None:
+            return None
+        return ts_col, ts_vals, fields
+
+    def _unified_timestamps(self, ts_col):
+        """Convert a column of millis since the epoch timestamps into absolute
+        ISO string timestamps, as mk_abs_timestamp_millis() does for each of
+        them, returning None if any of them is invalid, out of the range of
+        the run, or earlier than the one before it.
+        """
+        ts_formatter = self.ptb.ts_formatter
+        ts_vals = []
+        prev_ts_val = None
+        for orig_ts in ts_col:
+            ts_val = ts_formatter.format(orig_ts, self.counters)
+            if ts_val is None:
+                return None
+            if prev_ts_val is not None and prev_ts_val > ts_val:
+                return None
+            ts_vals.append(ts_val)
+            prev_ts_val = ts_val
+        return ts_vals
+
+    def _gen_unified_columnar(self, columns, identifiers, metadata, class_list):
+        """Generate the unified documents from the columns constructed by
+        _read_unified_columns(), yielding exactly the documents, in the same
+        order, that _gen_unified_rows() would.
+        """
+        ts_col, ts_vals, fields = columns
+        for idx, ts_val in enumerate(ts_vals):
+            first = ts_col[idx]
+            for identifier in identifiers.keys():
+                tool_source = _dict_const()
+                if identifier != "__none__":
+                    tool_source["id"] = identifier
+                tool_source["@idx"] = idx
+                try:
+                    md = metadata[identifier]
+                except KeyError:
+                    pass
+                else:
+                    tool_source.update(md)
+                for klass in class_list.keys():
+                    tool_source[klass] = _dict_const()
+                for klass, metric, subfield, values in fields.get(identifier, ()):
+                    if klass is not None:
+                        _d = tool_source[klass]
+                    else:
+                        _d = tool_source
+                    if subfield:
+                        if metric not in _d:
+                            _d[metric] = _dict_const()
+                        _d[metric][subfield] = values[idx]
+                    else:
+                        _d[metric] = values[idx]
+                source = _dict_const(
+                    [
+                        ("@timestamp", ts_val),
+                        ("@timestamp_original", str(first)),
+                        ("run", self.run_metadata),
+                        ("iteration", self.iteration_metadata),
+                        ("sample", self.sample_metadata),
+                        (self.toolname, tool_source),
+                    ]
+                )
+                source_id = PbenchData.make_source_id(source)
+                yield source, source_id
+
     def _make_source_individual(self):
         """Read .csv files individually, emitting records for each row and
         column coordinate."""
@@ -2590,7 +3883,6 @@ class ToolData(PbenchData):
                 converter = handler_rec["converter"]
             except KeyError:
                 converter = _noop
-            reader = csvf["reader"]
 
             if "pattern" not in handler_rec:
                 # No pattern to consider to find matching files.
@@ -2613,38 +3905,39 @@ class ToolData(PbenchData):
                 self.toolname,
                 csvf["path"],
             )
-            for row in reader:
-                for col, val in enumerate(row):
-                    # The timestamp column is index zero.
-                    if col == 0:
-                        ts_val = self.mk_abs_timestamp_millis(val)
-                        if prev_ts_val is not None:
-                            assert prev_ts_val <= ts_val, (
-                                "prev_ts_val (%r, %r) > ts_val (%r, %r)"
-                                % (prev_ts_val, prev_val, ts_val, val)
-                            )
-                        prev_val = val
-                        prev_ts_val = ts_val
-                        datum = _dict_const()
-                        datum["@timestamp"] = ts_val
-                        datum["@timestamp_original"] = str(val)
-                        datum["run"] = self.run_metadata
-                        datum["iteration"] = self.iteration_metadata
-                        datum["sample"] = self.sample_metadata
-                        datum[self.toolname] = _dict_const([("id", datum_id)])
-                        datum[self.toolname]["@idx"] = idx
-                        if klass is not None:
-                            _d = datum[self.toolname][klass] = _dict_const()
+            with closing(csvf.rows()) as reader:
+                for row in reader:
+                    for col, val in enumerate(row):
+                        # The timestamp column is index zero.
+                        if col == 0:
+                            ts_val = self.mk_abs_timestamp_millis(val)
+                            if prev_ts_val is not None:
+                                assert prev_ts_val <= ts_val, (
+                                    "prev_ts_val (%r, %r) > ts_val (%r, %r)"
+                                    % (prev_ts_val, prev_val, ts_val, val)
+                                )
+                            prev_val = val
+                            prev_ts_val = ts_val
+                            datum = _dict_const()
+                            datum["@timestamp"] = ts_val
+                            datum["@timestamp_original"] = str(val)
+                            datum["run"] = self.run_metadata
+                            datum["iteration"] = self.iteration_metadata
+                            datum["sample"] = self.sample_metadata
+                            datum[self.toolname] = _dict_const([("id", datum_id)])
+                            datum[self.toolname]["@idx"] = idx
+                            if klass is not None:
+                                _d = datum[self.toolname][klass] = _dict_const()
+                            else:
+                                _d = datum[self.toolname]
+                            _d[metric] = _dict_const()
                         else:
-                            _d = datum[self.toolname]
-                        _d[metric] = _dict_const()
-                    else:
-                        column = header[col]
-                        _d[metric][column] = converter(val)
+                            column = header[col]
+                            _d[metric][column] = converter(val)
 
-                source_id = PbenchData.make_source_id(datum)
-                yield datum, source_id
-                idx += 1
+                    source_id = PbenchData.make_source_id(datum)
+                    yield datum, source_id
+                    idx += 1
             self.logger.info(
                 "tool-data-indexing: tool {}, individual end {}",
                 self.toolname,
@@ -2978,108 +4271,135 @@ class ToolData(PbenchData):
         """
         for df in self.files:
             try:
-                with open(os.path.join(self.ptb.extracted_root, df["path"])) as fp:
-                    payload = json.load(fp)
+                fp = open(os.path.join(self.ptb.extracted_root, df["path"]))
             except Exception as e:
                 self.logger.warning(
-                    "tool-data-indexing: encountered bad JSON file, {}: {:r} ({})",
+                    "tool-data-indexing: encountered bad JSON file, {}: {!r} ({})",
                     df["path"],
                     e,
                     self.ptb._tbctx,
                 )
                 self.counters["bad_json_file"] += 1
                 continue
+            with fp:
+                yield from self._make_source_json_file(df, fp)
+        return
 
-            missing_ts = False
-            invalid_ts = False
-            badrange_ts = False
-            idx = 0
-            self.logger.info(
-                "tool-data-indexing: tool {}, json start {}", self.toolname, df["path"]
+    def _make_source_json_file(self, df, fp):
+        """Generate the source documents of one JSON file of tool data."""
+        try:
+            if self.incremental_json:
+                payload = JsonArrayIterator.load(fp, validate=True)
+            else:
+                payload = json.load(fp)
+        except Exception as e:
+            self.logger.warning(
+                "tool-data-indexing: encountered bad JSON file, {}: {!r} ({})",
+                df["path"],
+                e,
+                self.ptb._tbctx,
             )
-            for payload_source in payload:
-                try:
-                    ts_val = payload_source["@timestamp"]
-                except KeyError:
-                    # Missing timestamps
-                    if not missing_ts:
-                        # Log the first record with missing timestamps we
-                        # encounter for this file, and then count the rest and
-                        # report the count with the summary of how the
-                        # indexing went.
-                        missing_ts = True
-                        self.logger.warning(
-                            "tool-data-indexing: encountered JSON"
-                            " file, {}, with missing @timestamp fields ({})",
-                            df["path"],
-                            self.ptb._tbctx,
-                        )
-                    self.counters["json_doc_missing_timestamp"] += 1
-                    idx += 1
-                    continue
-                else:
-                    del payload_source["@timestamp"]
+            self.counters["bad_json_file"] += 1
+            return
+
+        missing_ts = False
+        invalid_ts = False
+        badrange_ts = False
+        idx = 0
+        self.logger.info(
+            "tool-data-indexing: tool {}, json start {}", self.toolname, df["path"]
+        )
+        for payload_source in payload:
+            try:
+                ts_val = payload_source["@timestamp"]
+            except KeyError:
+                # Missing timestamps
+                if not missing_ts:
+                    # Log the first record with missing timestamps we
+                    # encounter for this file, and then count the rest and
+                    # report the count with the summary of how the
+                    # indexing went.
+                    missing_ts = True
+                    self.logger.warning(
+                        "tool-data-indexing: encountered JSON"
+                        " file, {}, with missing @timestamp fields ({})",
+                        df["path"],
+                        self.ptb._tbctx,
+                    )
+                self.counters["json_doc_missing_timestamp"] += 1
+                idx += 1
+                continue
+            else:
+                del payload_source["@timestamp"]
 
-                # Further timestamp handling
+            # Further timestamp handling
+            try:
+                # Unix seconds since epoch timestamp as an absolute time
+                # value.
+                ts = datetime.utcfromtimestamp(ts_val)
+            except TypeError:
+                # The timestamp value is not in seconds since the epoch,
+                # so assume that payload_source[@timestamp] is already in
+                # the expected format; validate it.
                 try:
-                    # Unix seconds since epoch timestamp as an absolute time
-                    # value.
-                    ts = datetime.utcfromtimestamp(ts_val)
-                except TypeError:
-                    # The timestamp value is not in seconds since the epoch,
-                    # so assume that payload_source[@timestamp] is already in
-                    # the expected format; validate it.
-                    try:
-                        ts = datetime.strptime(ts_val, _STD_DATETIME_FMT)
-                    except ValueError:
-                        if not invalid_ts:
-                            invalid_ts = True
-                            self.logger.warning(
-                                "tool-data-indexing: encountered"
-                                " JSON file, {}, with invalid @timestamp"
-                                " fields ('{:r}') ({})",
-                                df["path"],
-                                ts_val,
-                                self.ptb._tbctx,
-                            )
-                        self.counters["json_doc_timestamp_not_valid"] += 1
-                        idx += 1
-                        continue
-                if ts < self.ptb.start_run_ts or ts > self.ptb.end_run_ts:
-                    if not badrange_ts:
-                        badrange_ts = True
+                    ts = datetime.strptime(ts_val, _STD_DATETIME_FMT)
+                except ValueError:
+                    if not invalid_ts:
+                        invalid_ts = True
                         self.logger.warning(
-                            "tool-data-indexing: encountered JSON"
-                            " file, {}, with @timestamp fields out side"
-                            " start/end run time range ({:r}) ({})",
+                            "tool-data-indexing: encountered"
+                            " JSON file, {}, with invalid @timestamp"
+                            " fields ('{!r}') ({})",
                             df["path"],
                             ts_val,
                             self.ptb._tbctx,
                         )
-                    self.counters["json_doc_timestamp_out_of_range"] += 1
+                    self.counters["json_doc_timestamp_not_valid"] += 1
                     idx += 1
                     continue
-
-                source = _dict_const()
-                # Convert the validated timestamp into ISO format.
-                source["@timestamp"] = ts.strftime(_STD_DATETIME_FMT)
-                source["@timestamp_original"] = str(ts_val)
-                # Add the run metadata
-                source["run"] = self.run_metadata
-                source["iteration"] = self.iteration_metadata
-                source["sample"] = self.sample_metadata
-                source[self.toolname] = payload_source
-                source[self.toolname]["@idx"] = idx
-
-                # Any further transformations needed should be done here.
-
-                source_id = PbenchData.make_source_id(source)
-                yield source, source_id
+            if ts < self.ptb.start_run_ts or ts > self.ptb.end_run_ts:
+                if not badrange_ts:
+                    badrange_ts = True
+                    self.logger.warning(
+                        "tool-data-indexing: encountered JSON"
+                        " file, {}, with @timestamp fields out side"
+                        " start/end run time range ({!r}) ({})",
+                        df["path"],
+                        ts_val,
+                        self.ptb._tbctx,
+                    )
+                self.counters["json_doc_timestamp_out_of_range"] += 1
                 idx += 1
-            self.logger.info(
-                "tool-data-indexing: tool {}, json end {}", self.toolname, df["path"]
+                continue
+
+            source = _dict_const()
+            # Convert the validated timestamp into ISO format.
+            source["@timestamp"] = ts.strftime(_STD_DATETIME_FMT)
+            source["@timestamp_original"] = str(ts_val)
+            # Add the run metadata
+            source["run"] = self.run_metadata
+            source["iteration"] = self.iteration_metadata
+            source["sample"] = self.sample_metadata
+            source[self.toolname] = payload_source
+            source[self.toolname]["@idx"] = idx
+
+            # Any further transformations needed should be done here.
+
+            source_id = PbenchData.make_source_id(source)
+            yield source, source_id
+            idx += 1
+        if getattr(payload, "error", None) is not None:
+            # The file was modified since it was validated.
+            self.logger.warning(
+                "tool-data-indexing: encountered bad JSON file, {}: {!r} ({})",
+                df["path"],
+                payload.error,
+                self.ptb._tbctx,
             )
-        return
+            self.counters["bad_json_file"] += 1
+        self.logger.info(
+            "tool-data-indexing: tool {}, json end {}", self.toolname, df["path"]
+        )
 
     def make_source(self):
         """Simple jump method to pick the correct source generator based on the
@@ -3088,59 +4408,41 @@ class ToolData(PbenchData):
             # If we do not have any data files for this tool, ignore it.
             return
         if self.handler["@prospectus"]["method"] == "unify":
-            gen = self._make_source_unified()
+            gen, phase = self._make_source_unified(), "tool_csv"
         elif self.handler["@prospectus"]["method"] == "individual":
-            gen = self._make_source_individual()
+            gen, phase = self._make_source_individual(), "tool_csv"
         elif self.handler["@prospectus"]["method"] == "json":
-            gen = self._make_source_json()
+            gen, phase = self._make_source_json(), "tool_json"
         elif self.handler["@prospectus"]["method"] == "periodic_timestamp":
-            gen = self._make_source_stdout()
+            gen, phase = self._make_source_stdout(), "tool_stdout"
         else:
             raise Exception("Logic bomb!")
-        return gen
+        return self.ptb.stats.timed(phase, gen, tool=self.toolname)
 
     @staticmethod
     def get_csv_files(handler, basepath, toolsgroup, tool, ptb):
         """
         Fetch the list of .csv files for this tool, fetch their headers, and
-        return a dictionary mapping their column headers to their field names.
+        return a list of CsvDataFile objects, one for each, which are only
+        opened again when their rows are read.
         """
         path = os.path.join(basepath, "csv")
         paths = ptb.gen_files_by_partial_path(path)
         datafiles = []
         for p in paths:
             fname = os.path.basename(p)
-            for rec in handler["patterns"]:
-                if rec["pattern"].match(fname):
-                    handler_rec = rec
-                    break
-            else:
-                # Try an alias
-                try:
-                    alias_name = _aliases[fname]
-                except KeyError:
-                    # Ignore .csv files for which we don't have a handler,
-                    # after checking to see if they might have an alias
-                    # name.
-                    # self.logger.warning("no .csv handler for '{}' ({})\n",
-                    #        fname, p)
-                    continue
-                else:
-                    for rec in handler["patterns"]:
-                        if rec["pattern"].match(alias_name):
-                            handler_rec = rec
-                            break
-                    else:
-                        # Ignore .csv files for which we don't have a handler
-                        # self.logger.warning("no .csv handler for '{}' ({}, {})\n",
-                        #        alias_name, fname, p)
-                        continue
-            assert handler_rec is not None, "Logic bomb! handler_rec is None"
-            datafile = _dict_const(path=p, basename=fname, handler_rec=handler_rec)
-            datafile["reader"] = reader = csv.reader(
-                open(os.path.join(ptb.extracted_root, p))
+            handler_rec = _tool_handler_resolver.resolve(tool, handler, fname)
+            if handler_rec is None:
+                # Ignore .csv files for which we don't have a handler, after
+                # checking to see if they might have an alias name.
+                continue
+            datafile = CsvDataFile(
+                ptb.extracted_root,
+                ptb.idxctx.tool_data_open_files,
+                path=p,
+                basename=fname,
+                handler_rec=handler_rec,
             )
-            datafile["header"] = next(reader)
             datafiles.append(datafile)
         return datafiles
 
@@ -3171,11 +4473,9 @@ class ToolData(PbenchData):
         datafiles = []
         for p in paths:
             fname = os.path.basename(p)
-            handler_rec = None
-            for rec in handler["patterns"]:
-                if rec["pattern"].match(fname):
-                    handler_rec = rec
-                    break
+            handler_rec = _tool_handler_resolver.resolve(
+                tool, handler, fname, use_aliases=False
+            )
             if handler_rec is not None:
                 datafile = _dict_const(
                     path=p, basename=stdout_file, handler_rec=handler_rec
@@ -3199,7 +4499,8 @@ class ToolData(PbenchData):
             )
         else:
             raise Exception("Logic bomb! %s" % (handler["@prospectus"]["handling"]))
-        datafiles.sort(key=itemgetter("path", "basename"))
+        # N.B. the data files are already sorted by path, the tar ball's files
+        # being generated in sorted order.
         return datafiles
 
 
@@ -3209,6 +4510,9 @@ class ToolData(PbenchData):
 
 def get_md5sum_of_dir(dir, parentid):
     """Calculate the md5 sum of all the names in the toc"""
+    stats = IndexingStats.active
+    if stats is not None:
+        beg = perf_counter()
     h = hashlib.md5()
     h.update(parentid.encode("utf-8"))
     h.update(dir["directory"].encode("utf-8"))
@@ -3216,6 +4520,9 @@ def get_md5sum_of_dir(dir, parentid):
         for f in dir["files"]:
             for k in sorted(f.keys()):
                 h.update(repr(f[k]).encode("utf-8"))
+    if stats is not None:
+        stats.hashing["seconds"] += perf_counter() - beg
+        stats.hashing["documents"] += 1
     return h.hexdigest()
 
 
@@ -3361,35 +4668,88 @@ def find_hostname(a_string):
     return ret_val
 
 
+# The sosreport files we need, and the first of each we find is used:
+#   * "hostname-f": the output of "hostname -f"
+#   * "hostname": the output of "hostname"
+#   * "ip_-o_addr": the output of "ip -o addr", preferred over ...
+#   * "ip_address": ... the output of "ip address"
+_sos_files_needed = frozenset(("hostname-f", "hostname", "ip_-o_addr"))
+
+
+def _sos_file_keys(name):
+    """Return the keys of the sosreport files the given member name is a
+    candidate for.
+    """
+    keys = []
+    if find_hostname(name) >= 0:
+        if name.endswith("hostname_-f"):
+            keys.append("hostname-f")
+        if name.endswith("hostname"):
+            keys.append("hostname")
+    if name.find("sos_commands/networking/ip_-o_addr") >= 0:
+        keys.append("ip_-o_addr")
+    elif name.find("sos_commands/networking/ip_address") >= 0:
+        keys.append("ip_address")
+    return keys
+
+
+def _read_sos_files(sos_file_name):
+    """Read the files we need from the given sosreport, returning a dict
+    mapping the keys of the files found to their contents, or to the IOError
+    encountered reading them.
+
+    The sosreport is decompressed as a stream, and only up to the point where
+    the first of each needed file has been seen, instead of listing all of
+    its members first.  Links can't be extracted from a stream, so those are
+    extracted afterwards by name.
+    """
+    found = _dict_const()
+    links = _dict_const()
+    with tarfile.open(sos_file_name, "r|*") as sostb:
+        for m in sostb:
+            for key in _sos_file_keys(m.name):
+                if key in found or key in links:
+                    continue
+                if m.islnk() or m.issym():
+                    links[key] = m.name
+                    continue
+                try:
+                    found[key] = sostb.extractfile(m).read()
+                except IOError as e:
+                    found[key] = e
+            if _sos_files_needed.issubset(found.keys() | links.keys()):
+                break
+    if links:
+        with tarfile.open(sos_file_name) as sostb:
+            for key, name in links.items():
+                try:
+                    found[key] = sostb.extractfile(name).read()
+                except IOError as e:
+                    found[key] = e
+    return found
+
+
 def hostnames_if_ip_from_sosreport(sos_file_name):
     """Return a dict with hostname info (both short and fqdn) and
     ip addresses of all the network interfaces we find at sosreport time."""
 
-    sostb = tarfile.open(sos_file_name)
-    names = sostb.getnames()
-    hostname_files = [name for name in names if find_hostname(name) >= 0]
+    sos_files = _read_sos_files(sos_file_name)
 
     # Fetch the hostname -f and hostname file contents
-    hostname_f_file = [x for x in hostname_files if x.endswith("hostname_-f")]
-    if hostname_f_file:
-        try:
-            hostname_f = str(sostb.extractfile(hostname_f_file[0]).read(), "iso8859-1")[
-                :-1
-            ]
-        except IOError:
+    hostname_f = sos_files.get("hostname-f")
+    if hostname_f is not None:
+        if isinstance(hostname_f, IOError):
             return (1, "Failure to fetch a hostname-f from the sosreport")
+        hostname_f = str(hostname_f, "iso8859-1")[:-1]
         if hostname_f == "hostname: Name or service not known":
             hostname_f = ""
     else:
         hostname_f = ""
-    hostname_s_file = [x for x in hostname_files if x.endswith("hostname")]
-    if hostname_s_file:
-        try:
-            hostname_s = str(sostb.extractfile(hostname_s_file[0]).read(), "iso8859-1")[
-                :-1
-            ]
-        except IOError:
+    hostname_s = sos_files.get("hostname")
+    if hostname_s is not None:
+        if isinstance(hostname_s, IOError):
             return (1, "Failure to fetch a hostname from the sosreport")
+        hostname_s = str(hostname_s, "iso8859-1")[:-1]
     else:
         hostname_s = ""
 
@@ -3441,33 +4801,57 @@ def hostnames_if_ip_from_sosreport(sos_file_name):
 
     d = _dict_const([("hostname-f", hostname_f), ("hostname-s", hostname_s)])
 
-    # get the ip addresses for all interfaces
-    ipfiles = [name for name in names if name.find("sos_commands/networking/ip_") >= 0]
-    ip_files = [x for x in ipfiles if x.find("sos_commands/networking/ip_-o_addr") >= 0]
-    if ip_files:
-        d.update(if_ip_from_sosreport(sostb.extractfile(ip_files[0])))
-    else:
-        # try the ip_address file instead
-        ip_files = [
-            x for x in ipfiles if x.find("sos_commands/networking/ip_address") >= 0
-        ]
-        if ip_files:
-            d.update(if_ip_from_sosreport(sostb.extractfile(ip_files[0])))
+    # get the ip addresses for all interfaces, trying the ip_address file
+    # when there is no ip_-o_addr file
+    ip_addr = sos_files.get("ip_-o_addr", sos_files.get("ip_address"))
+    if isinstance(ip_addr, IOError):
+        raise ip_addr
+    if ip_addr is not None:
+        d.update(if_ip_from_sosreport(io.BytesIO(ip_addr)))
     return (0, d)
 
 
-class Iteration:
-    """Encapsulation of all iteration information pulled from a pbench result
-    tar ball's metadata.log file, cross-referenced with the tar ball contents.
-
-    Note that the "name" field is always the on-disk directory name for the
-    iteration.
+class _SosreportCache:
+    """The results of hostnames_if_ip_from_sosreport() for the most recently
+    seen sosreports, keyed by their MD5, shared by the threads scanning them.
     """
 
-    def __init__(self, ptb, name):
-        self._ptb = ptb
-        iter_dict = dict()
-        try:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, md5):
+        with self._lock:
+            try:
+                ret_val = self._cache[md5]
+            except KeyError:
+                return None
+            self._cache.move_to_end(md5)
+            return ret_val
+
+    def put(self, md5, ret_val):
+        with self._lock:
+            self._cache[md5] = ret_val
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+
+_sosreport_cache = _SosreportCache()
+
+
+class Iteration:
+    """Encapsulation of all iteration information pulled from a pbench result
+    tar ball's metadata.log file, cross-referenced with the tar ball contents.
+
+    Note that the "name" field is always the on-disk directory name for the
+    iteration.
+    """
+
+    def __init__(self, ptb, name):
+        self._ptb = ptb
+        iter_dict = dict()
+        try:
             items = ptb.mdconf.items(f"iterations/{name}")
         except NoSectionError:
             if name == "1":
@@ -3531,12 +4915,877 @@ class Sample:
         self.path = os.path.join(iteration.path, name)
 
 
+class _Member:
+    """A tar ball member not obtained from the tar ball itself, providing the
+    subset of the tarfile.TarInfo interface used here.
+    """
+
+    __slots__ = ("name", "type", "size", "mode", "mtime", "linkname")
+
+    def isdir(self):
+        return self.type == tarfile.DIRTYPE
+
+    def isfile(self):
+        return self.type == tarfile.REGTYPE
+
+    def issym(self):
+        return self.type == tarfile.SYMTYPE
+
+    @property
+    def linkpath(self):
+        return self.linkname
+
+
+class UnpackedMember(_Member):
+    """A tar ball member found in the unpacked directory tree of the tar ball.
+
+    Note that the mode and modification time are those of the unpacked file
+    system object, and not those recorded in the tar ball.
+    """
+
+    __slots__ = ()
+
+    _type_table = (
+        (stat.S_ISDIR, tarfile.DIRTYPE),
+        (stat.S_ISREG, tarfile.REGTYPE),
+        (stat.S_ISLNK, tarfile.SYMTYPE),
+        (stat.S_ISFIFO, tarfile.FIFOTYPE),
+        (stat.S_ISCHR, tarfile.CHRTYPE),
+        (stat.S_ISBLK, tarfile.BLKTYPE),
+    )
+
+    def __init__(self, name, st, linkname=""):
+        self.name = name
+        for test, mtype in self._type_table:
+            if test(st.st_mode):
+                self.type = mtype
+                break
+        else:
+            self.type = None
+        self.size = st.st_size if self.type == tarfile.REGTYPE else 0
+        self.mode = stat.S_IMODE(st.st_mode)
+        self.mtime = int(st.st_mtime)
+        self.linkname = linkname
+
+
+class ManifestMember(_Member):
+    """A tar ball member as recorded in the tar ball's manifest, which is
+    exactly as recorded in the tar ball itself.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, name, mtype, size, mode, mtime, linkname):
+        self.name = name
+        self.type = mtype
+        self.size = size
+        self.mode = mode
+        self.mtime = mtime
+        self.linkname = linkname
+
+
+def _scan_unpacked_members(extracted_root, dirname):
+    """Construct the list of members of a tar ball from its unpacked directory
+    tree, found under extracted_root/dirname.  Each directory always precedes
+    its contents in the list.
+
+    Returns None if the tree holds a hard link: only the tar ball records
+    which of the links to a file is the file itself, the others being hard
+    link members.
+    """
+    top = os.path.join(extracted_root, dirname)
+    members = [UnpackedMember(dirname, os.lstat(top))]
+    stack = [(top, dirname)]
+    while stack:
+        path, name = stack.pop()
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        subdirs = []
+        for entry in entries:
+            st = entry.stat(follow_symlinks=False)
+            if st.st_nlink > 1 and not stat.S_ISDIR(st.st_mode):
+                return None
+            mname = f"{name}/{entry.name}"
+            if stat.S_ISLNK(st.st_mode):
+                members.append(UnpackedMember(mname, st, os.readlink(entry.path)))
+            else:
+                members.append(UnpackedMember(mname, st))
+                if stat.S_ISDIR(st.st_mode):
+                    subdirs.append((entry.path, mname))
+        stack.extend(reversed(subdirs))
+    return members
+
+
+class _MemberIndex:
+    """Indexes over the members of a tar ball so that looking them up by
+    directory or by path prefix does not require a scan of all the members.
+
+    Three indexes are constructed:
+
+        * dirs: directory name -> member
+        * dir_entries: directory name -> list of the members it contains
+          (in member list order)
+        * file_names: sorted list of the names of all regular files, along
+          with file_positions, the position of each in the member list
+
+    Directory names never have a trailing "/", even though some tar ball
+    members for directories do.
+    """
+
+    def __init__(self, members):
+        self.dirs = _dict_const()
+        self.dir_entries = _dict_const()
+        files = []
+        for pos, m in enumerate(members):
+            name = m.name.rstrip("/")
+            if m.isdir():
+                self.dirs[name] = m
+            elif m.isfile():
+                files.append((name, pos))
+            self.dir_entries.setdefault(os.path.dirname(name), []).append(m)
+        files.sort()
+        self.file_names = [name for name, _ in files]
+        self.file_positions = [pos for _, pos in files]
+
+
+def _toc_dir(m):
+    """The name of the directory whose table-of-contents document lists the
+    given member: the member itself for a directory, its parent otherwise.
+    """
+    name = m.name.rstrip("/")
+    return name if m.isdir() else os.path.dirname(name)
+
+
+def _toc_order_key(m):
+    return (_toc_dir(m), not m.isdir())
+
+
+def _in_toc_order(members):
+    """Determine if the given members are in table-of-contents order: sorted
+    by the directory listing them, each directory preceding its entries.
+    """
+    prev = None
+    for m in members:
+        key = _toc_order_key(m)
+        if prev is not None and key < prev:
+            return False
+        prev = key
+    return True
+
+
+def _gen_toc_groups(members):
+    """Generate a (directory name, directory members, entries) tuple for each
+    directory of the given members, which must be in table-of-contents order,
+    as soon as all of its members have been seen.
+
+    The directory members are the members for the directory itself (more
+    than one when it is duplicated, none when it is missing), and the entries
+    are the non-directory members it contains.
+    """
+    dname = None
+    dirs = []
+    entries = []
+    for m in members:
+        key = _toc_dir(m)
+        if key != dname:
+            if dname is not None:
+                yield dname, dirs, entries
+            dname, dirs, entries = key, [], []
+        if m.isdir():
+            dirs.append(m)
+        else:
+            entries.append(m)
+    if dname is not None:
+        yield dname, dirs, entries
+
+
+class TarBallManifest:
+    """The persisted manifest of a pbench tar ball, recording what we need to
+    know about the tar ball so that later indexing passes do not have to list
+    its members again (which requires decompressing all of it):
+
+        * members: the members of the tar ball as recorded in the tar ball
+          itself, from which the table-of-contents is generated
+        * metadata: the sections of the tar ball's metadata.log file
+        * layout: the names of the iterations of the run, of the samples of
+          each iteration, and of the hosts tools were run on
+
+    A manifest is stored as a JSON document next to the tar ball's .md5 file,
+    "<tar ball>.manifest", and is only valid for the tar ball whose MD5 is
+    recorded in it, and for the format VERSION with which it was written.
+    """
+
+    VERSION = 1
+
+    def __init__(self, md5, dirname, members, metadata, layout):
+        self.md5 = md5
+        self.dirname = dirname
+        self.members = members
+        self.metadata = metadata
+        self.layout = layout
+
+    @staticmethod
+    def path_for(tbname):
+        return f"{tbname}.manifest"
+
+    @classmethod
+    def load(cls, tbname, md5, dirname):
+        """Load the manifest of the given tar ball, returning None if it does
+        not have one, and raising BadManifest if the manifest it has cannot be
+        used.
+        """
+        mpath = cls.path_for(tbname)
+        try:
+            with open(mpath, "r") as fp:
+                doc = json.load(fp)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as exc:
+            raise BadManifest(f"{mpath} - unreadable manifest, {exc}")
+        try:
+            if doc["version"] != cls.VERSION:
+                raise BadManifest(
+                    f"{mpath} - unsupported manifest version, {doc['version']!r}"
+                )
+            if doc["md5"] != md5:
+                raise BadManifest(
+                    f"{mpath} - manifest is for MD5 {doc['md5']}, not {md5}"
+                )
+            if doc["dirname"] != dirname:
+                raise BadManifest(
+                    f"{mpath} - manifest is for {doc['dirname']}, not {dirname}"
+                )
+            members = [
+                ManifestMember(name, mtype.encode("ascii"), size, mode, mtime, lname)
+                for name, mtype, size, mode, mtime, lname in doc["members"]
+            ]
+            metadata = doc["metadata"]
+            layout = doc["layout"]
+            if not all(key in layout for key in ("iterations", "samples", "hosts")):
+                raise BadManifest(f"{mpath} - manifest layout is incomplete")
+        except (KeyError, TypeError, ValueError, AttributeError) as exc:
+            raise BadManifest(f"{mpath} - malformed manifest, {exc!r}")
+        return cls(md5, dirname, members, metadata, layout)
+
+    def save(self, tbname):
+        """Write the manifest for the given tar ball, replacing any existing
+        one atomically, and return its path.
+        """
+        doc = dict(
+            version=self.VERSION,
+            md5=self.md5,
+            dirname=self.dirname,
+            members=[
+                (m.name, m.type.decode("ascii"), m.size, m.mode, m.mtime, m.linkname)
+                for m in self.members
+            ],
+            metadata=self.metadata,
+            layout=self.layout,
+        )
+        mpath = self.path_for(tbname)
+        tmp_mpath = f"{mpath}.{os.getpid():d}"
+        try:
+            with open(tmp_mpath, "w") as fp:
+                json.dump(doc, fp, separators=(",", ":"))
+            os.replace(tmp_mpath, mpath)
+        except Exception:
+            try:
+                os.remove(tmp_mpath)
+            except OSError:
+                pass
+            raise
+        return mpath
+
+
+def tarball_script(tb, extracted_root):
+    """Return the benchmark script of the given tar ball, its metadata.log
+    "pbench.script", or None if it is not known.
+
+    The script is read from the tar ball's unpacked metadata.log, or from
+    its manifest when it has one, without validating either: it is only
+    used to estimate the cost of indexing the tar ball.
+    """
+    dirname = os.path.basename(tb)[: -len(".tar.xz")]
+    mdconf = ConfigParser(interpolation=None)
+    try:
+        mdconf.read(os.path.join(extracted_root, dirname, "metadata.log"))
+        return mdconf.get("pbench", "script")
+    except (ConfigParserError, OSError, UnicodeDecodeError):
+        pass
+    try:
+        with open(TarBallManifest.path_for(os.path.realpath(tb)), "r") as fp:
+            return json.load(fp)["metadata"]["pbench"]["script"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+class BacklogEntry:
+    """A tar ball to be indexed, with the estimated number of its documents
+    and of the seconds it takes to index them.
+    """
+
+    __slots__ = ("size", "controller", "tb", "script", "documents", "seconds")
+
+    def __init__(self, size, controller, tb, script, documents, seconds):
+        self.size = size
+        self.controller = controller
+        self.tb = tb
+        self.script = script
+        self.documents = documents
+        self.seconds = seconds
+
+    def __repr__(self):
+        return (
+            f"BacklogEntry({self.tb!r}, size={self.size:d}, seconds={self.seconds:.1f})"
+        )
+
+
+class IndexingHistory:
+    """The cost of indexing the tar balls of each benchmark script, learned
+    from the tar balls indexed by earlier passes, from which the number of
+    documents of a tar ball, and the time it takes to index them, are
+    estimated from its size.
+
+    For each script, the bytes, documents and seconds of the tar balls
+    indexed are totaled, the totals decaying by `decay` with each new tar
+    ball, so that the estimates follow changes in the results of a script,
+    or in the performance of the indexer and Elasticsearch.  The tar balls
+    of a script without a history are estimated from the totals of all the
+    scripts, or from `default_bytes_per_sec` when there are none.
+
+    The history is stored as a JSON document, replaced atomically when
+    saved, and is only valid for the format VERSION with which it was
+    written.
+    """
+
+    VERSION = 1
+
+    # The weight the totals of a script retain with each new tar ball.
+    decay = 0.9
+
+    # The indexing throughput assumed when there is no history at all.
+    default_bytes_per_sec = 1024 * 1024
+
+    def __init__(self, path=None, scripts=None):
+        self.path = path
+        self.scripts = scripts if scripts is not None else {}
+
+    @classmethod
+    def load(cls, path):
+        """Load the history stored at the given path, returning an empty
+        history if there is none, and raising JsonFileError if the history
+        stored cannot be used.
+        """
+        try:
+            with open(path, "r") as fp:
+                doc = json.load(fp)
+        except FileNotFoundError:
+            return cls(path)
+        except (OSError, ValueError) as exc:
+            raise JsonFileError(f"{path} - unreadable indexing history, {exc}")
+        try:
+            if doc["version"] != cls.VERSION:
+                raise JsonFileError(
+                    f"{path} - unsupported indexing history version,"
+                    f" {doc['version']!r}"
+                )
+            scripts = {
+                script: dict(
+                    bytes=float(totals["bytes"]),
+                    documents=float(totals["documents"]),
+                    seconds=float(totals["seconds"]),
+                )
+                for script, totals in doc["scripts"].items()
+            }
+        except (KeyError, TypeError, ValueError, AttributeError) as exc:
+            raise JsonFileError(f"{path} - malformed indexing history, {exc!r}")
+        return cls(path, scripts)
+
+    def record(self, script, size, documents, seconds):
+        """Record the indexing of a tar ball of the given script and size."""
+        if size <= 0 or seconds <= 0:
+            return
+        totals = self.scripts.setdefault(
+            script or "", dict(bytes=0.0, documents=0.0, seconds=0.0)
+        )
+        for key, val in (
+            ("bytes", size),
+            ("documents", documents),
+            ("seconds", seconds),
+        ):
+            totals[key] = totals[key] * self.decay + val
+
+    def _totals(self, script):
+        totals = self.scripts.get(script or "")
+        if totals is None and self.scripts:
+            totals = dict(
+                (key, sum(t[key] for t in self.scripts.values()))
+                for key in ("bytes", "documents", "seconds")
+            )
+        return totals
+
+    def estimate(self, script, size):
+        """Return the estimated number of documents of a tar ball of the
+        given script and size, and the seconds it takes to index them.
+        """
+        totals = self._totals(script)
+        if totals is None:
+            return 0, size / self.default_bytes_per_sec
+        return (
+            int(size * totals["documents"] / totals["bytes"]),
+            size * totals["seconds"] / totals["bytes"],
+        )
+
+    def save(self):
+        """Write the history to its path, replacing any existing one
+        atomically.
+        """
+        doc = dict(version=self.VERSION, scripts=self.scripts)
+        tmp_path = f"{self.path}.{os.getpid():d}"
+        try:
+            with open(tmp_path, "w") as fp:
+                json.dump(doc, fp, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+class IndexingBacklog:
+    """The tar balls to be indexed by a pass of pbench-index, scheduled by
+    their estimated cost (see IndexingHistory).
+
+    The tar balls estimated to take `large_seconds` or more are in the
+    "large" lane, the others in the "small" lane, when there are
+    `large_workers` dedicated to the large lane.  Otherwise all of them are
+    in the "small" lane.  The small lane is taken cheapest first, so that
+    many small tar balls are not held up by a few large ones, and the large
+    lane most expensive first, so that the largest tar balls are not put off
+    pass after pass.  A lane whose tar balls are all taken takes those of
+    the other lane, to keep its workers busy.
+
+    Given a `max_runtime`, a tar ball is only taken if it is estimated to
+    complete within that many seconds of the start of the pass, except for
+    the first one taken by each lane, so that every pass makes progress; the
+    tar balls left are deferred to the next pass (see `over_budget`).
+    """
+
+    def __init__(
+        self, entries, max_runtime=None, large_seconds=None, large_workers=0, clock=None
+    ):
+        self.max_runtime = max_runtime
+        self.large_workers = large_workers if large_seconds is not None else 0
+        self._clock = clock if clock is not None else monotonic
+        self._start = self._clock()
+        small, large = [], []
+        for entry in entries:
+            if self.large_workers and entry.seconds >= large_seconds:
+                large.append(entry)
+            else:
+                small.append(entry)
+        key = lambda e: (e.seconds, e.size, e.controller, e.tb)  # noqa: E731
+        self._queues = dict(
+            small=sorted(small, key=key), large=sorted(large, key=key, reverse=True)
+        )
+        self._taken = Counter()
+        self._over_budget = False
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def __iter__(self):
+        """Iterate over the tar balls left, in the order of their lane."""
+        for lane in ("large", "small"):
+            yield from self._queues[lane]
+
+    def lanes(self, workers):
+        """Return the number of workers of each lane, given the total."""
+        if self.large_workers:
+            return dict(large=self.large_workers, small=workers - self.large_workers)
+        return dict(small=workers)
+
+    def _fits(self, entry):
+        if self.max_runtime is None:
+            return True
+        return self._clock() - self._start + entry.seconds <= self.max_runtime
+
+    def take(self, lane="small"):
+        """Take the next tar ball of the given lane, or of the other lane
+        when it has none left, returning None when there is none to take.
+        """
+        other = "large" if lane == "small" else "small"
+        for queue in (self._queues[lane], self._queues[other]):
+            for idx, entry in enumerate(queue):
+                if not self._taken[lane] or self._fits(entry):
+                    self._taken[lane] += 1
+                    return queue.pop(idx)
+        if self._queues[lane] or self._queues[other]:
+            self._over_budget = True
+        return None
+
+    @property
+    def over_budget(self):
+        """Whether tar balls are left because they did not fit in the
+        `max_runtime` of the pass."""
+        return self._over_budget and len(self) > 0
+
+
+class _UnitProgress:
+    """The progress of indexing the actions of one unit of an
+    IndexingCheckpoint.
+    """
+
+    def __init__(self, acked=0, beyond=(), sent=(), total=None):
+        # The number of actions, from the first, all acknowledged.
+        self.acked = acked
+        # The positions of the actions acknowledged after those.
+        self.beyond = set(beyond)
+        # The positions of the actions sent, but not yet acknowledged.
+        self.sent = set(sent)
+        # The positions of the actions sent but not acknowledged by an
+        # earlier pass.
+        self.resent = set(sent)
+        # The number of actions of the unit, once they have all been
+        # generated.
+        self.total = total
+
+    def skip(self, pos):
+        return pos < self.acked or pos in self.beyond
+
+    def done(self):
+        return self.total is not None and self.acked == self.total
+
+    def ack(self, pos):
+        self.sent.discard(pos)
+        if pos != self.acked:
+            self.beyond.add(pos)
+            return
+        self.acked += 1
+        while self.acked in self.beyond:
+            self.beyond.remove(self.acked)
+            self.acked += 1
+
+    def to_dict(self):
+        return dict(
+            acked=self.acked,
+            beyond=sorted(self.beyond),
+            sent=sorted(self.sent | self.resent),
+            total=self.total,
+        )
+
+
+class IndexingCheckpoint:
+    """The progress of indexing a tar ball, persisted so that the next pass
+    over a tar ball whose indexing was interrupted (SIGINT, SIGTERM, or an
+    Elasticsearch instance which stalled) does not generate and send again
+    the actions Elasticsearch has already acknowledged.
+
+    The actions of a tar ball are generated by units: the run document
+    ("run"), the table-of-contents ("toc"), the result data ("result"), and
+    each unit of tool data ("ToolData-<iteration>-<sample>-<host>-<tool>").
+    For each unit, the checkpoint records the number of its actions, from
+    the first, which have all been acknowledged (indexed, found to already
+    exist, or failed for good), the positions of those acknowledged beyond
+    them, and of those sent but not yet acknowledged, and once all of them
+    have been generated, the number of its actions.  The number of
+    successes, duplicates and failures among the acknowledged actions is
+    recorded as well.
+
+    When resuming, units whose actions were all acknowledged are skipped
+    entirely, the acknowledged actions of the others are not sent again,
+    and the counts of the earlier passes are added to the result of
+    es_index().  An action which was sent but not acknowledged by an
+    earlier pass, and which is now reported as a duplicate, is counted as
+    indexed, the way pyesbulk counts the duplicates of the actions it
+    retries.
+
+    A checkpoint is stored as a JSON document next to the tar ball's symlink
+    in the state directory being processed, "<symlink>.checkpoint", written
+    as bulk requests are acknowledged (see es_index()), and is only valid
+    for the tar ball whose MD5 is recorded in it, and for the format VERSION
+    with which it was written.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, md5, units=None, counts=None):
+        self.path = path
+        self.md5 = md5
+        self.units = units if units is not None else _dict_const()
+        # The counts of all the actions acknowledged, and of those
+        # acknowledged by earlier passes.
+        self.counts = Counter(counts)
+        self.resumed = Counter(counts)
+        # The number of actions acknowledged by earlier passes, which are not
+        # sent again.
+        self.skipped = sum(
+            unit.acked + len(unit.beyond) for unit in self.units.values()
+        )
+        # The number of duplicates reported for actions sent but not
+        # acknowledged by an earlier pass, which pyesbulk counted as such.
+        self.reclaimed = 0
+        # The unit and position of the actions sent but not acknowledged,
+        # by their index and ID.
+        self._pending = _dict_const()
+        # The actions which had to be retried.
+        self._retried = set()
+        self._dirty = False
+        # The bulk requests of the "parallel" engine are sent from their own
+        # threads.
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, md5):
+        """Load the checkpoint at the given path, returning a new, empty, one
+        if there is none, and raising BadCheckpoint if the one there cannot
+        be used.
+        """
+        try:
+            with open(path, "r") as fp:
+                doc = json.load(fp)
+        except FileNotFoundError:
+            return cls(path, md5)
+        except (OSError, ValueError) as exc:
+            raise BadCheckpoint(f"{path} - unreadable checkpoint, {exc}")
+        try:
+            if doc["version"] != cls.VERSION:
+                raise BadCheckpoint(
+                    f"{path} - unsupported checkpoint version, {doc['version']!r}"
+                )
+            if doc["md5"] != md5:
+                raise BadCheckpoint(
+                    f"{path} - checkpoint is for MD5 {doc['md5']}, not {md5}"
+                )
+            units = _dict_const(
+                (name, _UnitProgress(**unit)) for name, unit in doc["units"].items()
+            )
+            counts = {
+                key: int(doc["counts"][key])
+                for key in ("successes", "duplicates", "failures")
+            }
+        except (KeyError, TypeError, ValueError, AttributeError) as exc:
+            raise BadCheckpoint(f"{path} - malformed checkpoint, {exc!r}")
+        return cls(path, md5, units, counts)
+
+    def resuming(self):
+        """Return True if an earlier pass left progress to resume from."""
+        return bool(self.units)
+
+    def done(self, name):
+        """Return True if all the actions of the named unit were
+        acknowledged.
+        """
+        unit = self.units.get(name)
+        return unit is not None and unit.done()
+
+    def unit(self, name, actions):
+        """Generate the given actions of the named unit which have not yet
+        been acknowledged, tracking them until they are.
+        """
+        with self._lock:
+            unit = self.units.get(name)
+            if unit is None:
+                unit = self.units[name] = _UnitProgress()
+        pos = -1
+        for pos, action in enumerate(actions):
+            if unit.skip(pos):
+                continue
+            with self._lock:
+                unit.sent.add(pos)
+                self._pending.setdefault((action["_index"], action["_id"]), []).append(
+                    (unit, pos)
+                )
+            yield action
+        with self._lock:
+            unit.total = pos + 1
+
+    # pyesbulk does not retry the actions failing with these statuses.
+    _failed_statuses = frozenset((400, 403))
+
+    def record_bulk(self, resp):
+        """Record the outcome of the actions of a bulk request from its
+        response, and persist the checkpoint.
+        """
+        with self._lock:
+            for item in resp.get("items", ()):
+                for result in item.values():
+                    self._record_item(result)
+            if self._dirty:
+                self.save()
+
+    def _record_item(self, result):
+        try:
+            key = (result["_index"], result["_id"])
+            status = result["status"]
+        except (KeyError, TypeError):
+            return
+        try:
+            queue = self._pending[key]
+        except KeyError:
+            return
+        unit, pos = queue[0]
+        if 200 <= status < 300:
+            outcome = "successes"
+        elif status == 409:
+            if (unit, pos) in self._retried:
+                outcome = "successes"
+            elif pos in unit.resent:
+                outcome = "successes"
+                self.reclaimed += 1
+            else:
+                outcome = "duplicates"
+        elif status == 400 or (
+            status == 403
+            and str(result.get("error", "")).startswith("IndexClosedException")
+        ):
+            outcome = "failures"
+        else:
+            # The action will be sent again.
+            self._retried.add((unit, pos))
+            return
+        queue.pop(0)
+        if not queue:
+            del self._pending[key]
+        self._retried.discard((unit, pos))
+        unit.resent.discard(pos)
+        unit.ack(pos)
+        self.counts[outcome] += 1
+        self._dirty = True
+
+    def adjust_result(self, res):
+        """Adjust the counts of an es_index() result tuple to account for the
+        actions acknowledged by earlier passes, and for those reclaimed from
+        the duplicates.
+        """
+        beg, end, successes, duplicates, failures, retries = res
+        return (
+            beg,
+            end,
+            successes + self.resumed["successes"] + self.reclaimed,
+            duplicates + self.resumed["duplicates"] - self.reclaimed,
+            failures + self.resumed["failures"],
+            retries,
+        )
+
+    def save(self):
+        """Write the checkpoint, replacing any existing one atomically."""
+        doc = dict(
+            version=self.VERSION,
+            md5=self.md5,
+            units={name: unit.to_dict() for name, unit in self.units.items()},
+            counts={
+                key: self.counts[key] for key in ("successes", "duplicates", "failures")
+            },
+        )
+        tmp_path = f"{self.path}.{os.getpid():d}"
+        try:
+            with open(tmp_path, "w") as fp:
+                json.dump(doc, fp, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._dirty = False
+
+    def remove(self):
+        """Remove the persisted checkpoint, if any."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+# The tar ball whose tool data is generated by the worker processes of the
+# tool data pool, established by _tool_data_pool_init().
+_tool_data_ptb = None
+
+# The number of tool data actions a worker process writes to its spool file
+# at a time.
+_tool_data_spool_chunk = 1000
+
+
+def _tool_data_pool_init(ptb):
+    """Initialize a forked worker process of the tool data pool.
+
+    Workers exit immediately on SIGTERM, and ignore SIGINT, which is handled
+    by the parent process.
+    """
+    global _tool_data_ptb
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _tool_data_ptb = ptb
+
+
+def _tool_data_unit(key):
+    """Generate the actions of one unit of tool data, the data of one tool of
+    one host in one sample of one iteration, in a worker process of the tool
+    data pool.
+
+    The actions are spooled to a file rather than returned, so that a large
+    unit is never held in memory in full, by either process.  Returns a tuple
+    of the key of the unit, the path of the spool file, the number of actions
+    written to it, the operational context gathered while generating them,
+    and the IndexingStats of the unit.
+    """
+    ptb = _tool_data_ptb
+    ptb.idxctx.opctx = []
+    ptb.stats = IndexingStats()
+    if ptb.idxctx.collect_stats:
+        IndexingStats.active = ptb.stats
+    count = 0
+    fd, spool = tempfile.mkstemp(prefix="tool-data.", dir=ptb.tmpdir)
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            chunk = []
+            for action in ptb._mk_tool_data_unit_actions(ToolData(ptb, *key)):
+                chunk.append(action)
+                if len(chunk) == _tool_data_spool_chunk:
+                    pickle.dump(chunk, fp, pickle.HIGHEST_PROTOCOL)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                pickle.dump(chunk, fp, pickle.HIGHEST_PROTOCOL)
+                count += len(chunk)
+    except Exception:
+        os.remove(spool)
+        raise
+    return key, spool, count, ptb.idxctx.opctx, ptb.stats
+
+
+def _read_tool_data_spool(spool):
+    """Yield the actions of a tool data spool file, removing it once read."""
+    try:
+        with open(spool, "rb") as fp:
+            while True:
+                try:
+                    chunk = pickle.load(fp)
+                except EOFError:
+                    break
+                yield from chunk
+    finally:
+        os.remove(spool)
+
+
 class PbenchTarBall:
     """Encapsulation of the data structures representing the contents of a
     pbench tar ball.
     """
 
-    def __init__(self, idxctx, tbarg, tmpdir, extracted_root):
+    def __init__(self, idxctx, tbarg, tmpdir, extracted_root, use_manifest=True):
+        # The performance statistics of indexing this tar ball, to which the
+        # document IDs computed from now on are charged, when they are
+        # collected; the caller is responsible for clearing the "active"
+        # statistics once it is done with the tar ball.
+        self.stats = IndexingStats()
+        if idxctx.collect_stats:
+            IndexingStats.active = self.stats
+        self.stats.begin("open")
         self.idxctx = idxctx
         self.tbname = tbarg
         self.controller_dir = os.path.basename(os.path.dirname(self.tbname))
@@ -3547,38 +5796,71 @@ class PbenchTarBall:
             self.controller_name = self.controller_dir
         tb_stat = os.stat(self.tbname)
         mtime = datetime.utcfromtimestamp(tb_stat.st_mtime)
-        self.tb = tarfile.open(self.tbname)
 
         # This is the top-level name of the run - it should be the common
         # first component of every member of the tar ball.
         dirname = os.path.basename(self.tbname)
         self.dirname = dirname[: dirname.rfind(".tar.xz")]
-        # ... but let's make sure ...
-        #
-        # ... while we are at it, we verify we have a metadata.log file in the
-        # tar ball before we start extracting.
+        self.extracted_root = extracted_root
+        self.tmpdir = tmpdir
+        # The sosreports of the tar ball, constructed on first use.
+        self._sosreports = None
+        # The checkpoint tracking the progress of indexing this tar ball, if
+        # any (see open_checkpoint()).
+        self.checkpoint = None
+        # Open the MD5 file of the tar ball and read the MD5 sum from it.
+        md5sum = open("%s.md5" % (self.tbname)).read().split()[0]
+
+        # A valid manifest persisted by a previous pass over this tar ball
+        # gives us its members, metadata.log contents, and layout directly.
+        self.manifest = None
+        self.stats.begin("members")
+        if use_manifest and idxctx.manifests:
+            try:
+                self.manifest = TarBallManifest.load(self.tbname, md5sum, self.dirname)
+            except BadManifest as e:
+                idxctx.logger.warning("Ignoring tar ball manifest: {}", e)
+
+        # Listing the members of a tar ball requires decompressing all of it,
+        # so when we know the unpacked directory tree was extracted from this
+        # tar ball we build the member list from that instead, unless it holds
+        # hard links.  Only the table-of-contents needs the members as
+        # recorded in the tar ball itself (modes and modification times are
+        # not preserved by the unpacking), and those are read on first use.
+        members = None
+        if self.manifest is None and self._is_unpacked():
+            members = _scan_unpacked_members(self.extracted_root, self.dirname)
+        if self.manifest is not None:
+            idxctx.logger.debug(
+                "Listing the members of {} from its manifest", self.tbname
+            )
+            self.members_source = "manifest"
+            self.members = self.manifest.members
+            self._tar_members = self.members
+        elif members is not None:
+            self.members_source = "unpacked"
+            self.members = members
+            self._tar_members = None
+        else:
+            self.members_source = "tarfile"
+            self.members = self._read_tar_members()
+            self._tar_members = self.members
+        self.stats.end()
+
+        # We verify we have a metadata.log file in the tar ball before we
+        # start extracting.
         metadata_log_path = "%s/metadata.log" % (self.dirname)
         metadata_log_found = False
-        self.members = self.tb.getmembers()
         for m in self.members:
             if m.name == metadata_log_path:
                 metadata_log_found = True
-            sampled_prefix = m.name.split(os.path.sep)[0]
-            if sampled_prefix != self.dirname:
-                # All members of the tar ball should have self.dirname as its
-                # prefix.
-                raise UnsupportedTarballFormat(
-                    '{} - directory prefix should be "{}", but is'
-                    ' "{}" instead, for tar ball member "{}"'.format(
-                        self.tbname, self.dirname, sampled_prefix, m.name
-                    )
-                )
+                break
         if not metadata_log_found:
             raise UnsupportedTarballFormat(
                 '{} - tar ball is missing "{}".'.format(self.tbname, metadata_log_path)
             )
+        self._idx = _MemberIndex(self.members)
 
-        self.extracted_root = extracted_root
         if not os.path.isdir(os.path.join(self.extracted_root, self.dirname)):
             raise UnsupportedTarballFormat(
                 '{} - extracted tar ball directory "{}" does not'
@@ -3586,15 +5868,16 @@ class PbenchTarBall:
                     self.tbname, os.path.join(self.extracted_root, self.dirname)
                 )
             )
-        # Open the MD5 file of the tar ball and read the MD5 sum from it.
-        md5sum = open("%s.md5" % (self.tbname)).read().split()[0]
         # Construct the @metadata and run metadata dictionaries from the
         # metadata.log file.
         self.mdconf = ConfigParser()
         mdf = os.path.join(self.extracted_root, metadata_log_path)
         try:
             # Read and parse the metadata.log file.
-            self.mdconf.read(mdf)
+            if self.manifest is not None:
+                self.mdconf.read_dict(self.manifest.metadata)
+            else:
+                self.mdconf.read(mdf)
             controller = self.mdconf.get("run", "controller")
             if not controller:
                 raise Exception("empty run.controller")
@@ -3631,6 +5914,7 @@ class PbenchTarBall:
         # Normalize all the timestamps
         self.start_run_ts, self.start_run = PbenchTarBall.convert_to_dt(start_run_orig)
         self.end_run_ts, self.end_run = PbenchTarBall.convert_to_dt(end_run_orig)
+        self.ts_formatter = TimestampFormatter(self.start_run_ts, self.end_run_ts)
         date_ts, date = PbenchTarBall.convert_to_dt(date_orig)
         # At this point, date is a local time value, while start_ and
         # end_run are UTC.  We figure out what the UTC offset is by
@@ -3743,14 +6027,69 @@ class PbenchTarBall:
         # MD5 value so that warnings, errors, and exceptions can have
         # additional context to add.
         self._tbctx = f"{self.controller_dir}/{os.path.basename(tbarg)}({md5sum})"
+        self.stats.end()
+
+    def _is_unpacked(self):
+        """Determine if the unpacked directory tree of the tar ball can be
+        used in place of the tar ball's members.
+
+        pbench-dispatch verifies the tar ball against its MD5 before handing
+        it to pbench-unpack-tarballs, which only creates the tar ball's
+        UNPACKED symlink once the tar ball has been successfully extracted.
+        So that symlink tells us the unpacked tree is consistent with the
+        tar ball.
+        """
+        if not os.path.isdir(os.path.join(self.extracted_root, self.dirname)):
+            return False
+        unpacked_link = os.path.join(
+            os.path.dirname(self.tbname), "UNPACKED", os.path.basename(self.tbname)
+        )
+        try:
+            return os.path.samefile(unpacked_link, self.tbname)
+        except OSError:
+            return False
+
+    def _read_tar_members(self):
+        """Read the list of members from the tar ball itself, verifying that
+        they all live under the tar ball's top-level directory.
+        """
+        with self.stats.phase("members"), tarfile.open(self.tbname) as tb:
+            members = tb.getmembers()
+        for m in members:
+            sampled_prefix = m.name.split(os.path.sep)[0]
+            if sampled_prefix != self.dirname:
+                # All members of the tar ball should have self.dirname as its
+                # prefix.
+                raise UnsupportedTarballFormat(
+                    '{} - directory prefix should be "{}", but is'
+                    ' "{}" instead, for tar ball member "{}"'.format(
+                        self.tbname, self.dirname, sampled_prefix, m.name
+                    )
+                )
+        return members
 
     def gen_files_by_partial_path(self, path):
-        """Generator for all files in the tar ball which match the given path
-        pattern.
+        """Generator for all files in the tar ball whose names begin with the
+        given path (which always begins with the tar ball's directory name),
+        in the order of the members of the tar ball.
+        """
+        names = self._idx.file_names
+        lo = hi = bisect.bisect_left(names, path)
+        while hi < len(names) and names[hi].startswith(path):
+            hi += 1
+        positions = self._idx.file_positions
+        for _, name in sorted(zip(positions[lo:hi], names[lo:hi])):
+            yield name
+
+    def get_subdirs(self, path):
+        """Return the sorted list of the names (not the paths) of the
+        directories found directly under the given path of the tar ball.
         """
-        for member in self.members:
-            if member.isfile() and member.name.find(path) >= 0:
-                yield member.name
+        return sorted(
+            os.path.basename(m.name.rstrip("/"))
+            for m in self._idx.dir_entries.get(path, [])
+            if m.isdir()
+        )
 
     _iter_num_pat = re.compile(r"(?P<num>^[1-9][0-9]*)-")
 
@@ -3772,6 +6111,14 @@ class PbenchTarBall:
         -user-benchmark) do not record the iteration number separately from
         the on-disk name.
         """
+        return [Iteration(self, iteration) for iteration in self._iteration_names()]
+
+    def _iteration_names(self):
+        """Get the sorted list of the names from which this tar ball's
+        Iteration objects are constructed.
+        """
+        if self.manifest is not None:
+            return self.manifest.layout["iterations"]
         try:
             # N.B. Comma-separated list
             iterations_str = self.run_metadata["iterations"]
@@ -3780,16 +6127,9 @@ class PbenchTarBall:
             # through the tar ball members looking for directories that are
             # most likely iterations.
             iterations = []
-            for member in self.members:
-                if not member.isdir():
-                    # We are only looking for directories
-                    continue
-                path_els = member.name.split("/")
-                if len(path_els) != 2:
-                    # Iteration directory names always have 2 path elements,
-                    # [ '/', '<iteration name>' ].
-                    continue
-                itername = path_els[1]
+            # Iteration directories are always found directly under the
+            # top-level directory.
+            for itername in self.get_subdirs(self.dirname):
                 if self._iter_num_pat.match(itername):
                     # We only recognize iteration names that match this
                     # pattern, as later versions of the pbench-agent have
@@ -3801,28 +6141,26 @@ class PbenchTarBall:
         iterations_set = set(iterations)
         iterations = list(iterations_set)
         iterations.sort()
-
-        iter_objs = []
-        for iteration in iterations:
-            iter_objs.append(Iteration(self, iteration))
-        return iter_objs
+        return iterations
 
     def get_samples(self, iteration):
         """Get the list of Sample objects for a given iteration object.
         """
+        return [Sample(iteration, sample) for sample in self._sample_names(iteration)]
+
+    def _sample_names(self, iteration):
+        """Get the sorted list of the (on-disk) names of the samples of the
+        given iteration object.
+        """
+        if self.manifest is not None:
+            try:
+                return self.manifest.layout["samples"][iteration.name]
+            except KeyError:
+                pass
         samples = []
-        for member in self.members:
-            if not member.isdir():
-                # We are only looking for directories
-                continue
-            if member.name.find(f"{iteration.name}/") < 0:
-                continue
-            path_els = member.name.split("/")
-            if len(path_els) != 3:
-                # Sample directory names always have 3 path elements,
-                # [ '/', '<iteration name>', 'sample<number>' ].
-                continue
-            sample = path_els[2]
+        # Sample directories are always found directly under the iteration
+        # directory.
+        for sample in self.get_subdirs(f"{self.dirname}/{iteration.name}"):
             if sample.startswith("sample"):
                 # Sample directories always begin with 'sample'.
                 samples.append(sample)
@@ -3831,11 +6169,7 @@ class PbenchTarBall:
         samples_set = set(samples)
         samples = list(samples_set)
         samples.sort()
-
-        sample_objs = []
-        for sample in samples:
-            sample_objs.append(Sample(iteration, sample))
-        return sample_objs
+        return samples
 
     def get_section_items(self, section):
         try:
@@ -3860,6 +6194,8 @@ class PbenchTarBall:
         return section_items
 
     def get_hosts(self):
+        if self.manifest is not None and self.manifest.layout["hosts"]:
+            return list(self.manifest.layout["hosts"])
         try:
             # N.B. Space-separated list
             hosts = self.mdconf.get("tools", "hosts")
@@ -3890,6 +6226,52 @@ class PbenchTarBall:
         hosts.sort()
         return hosts
 
+    def save_manifest(self):
+        """Persist the manifest of this tar ball next to its .md5 file,
+        reading the members recorded in the tar ball first if need be, and
+        return the manifest's path.
+        """
+        if self._tar_members is None:
+            self._tar_members = self._read_tar_members()
+        metadata = _dict_const()
+        for section in self.mdconf.sections():
+            metadata[section] = _dict_const(self.mdconf.items(section, raw=True))
+        samples = _dict_const()
+        for iteration in self.get_iterations():
+            samples[iteration.name] = self._sample_names(iteration)
+        try:
+            hosts = sorted(set(self.mdconf.get("tools", "hosts").split()))
+        except ConfigParserError:
+            hosts = []
+        layout = _dict_const(
+            iterations=self._iteration_names(), samples=samples, hosts=hosts
+        )
+        # Members are persisted in table-of-contents order so that gen_toc()
+        # does not have to sort the members of a loaded manifest.
+        members = self._toc_members()
+        manifest = TarBallManifest(
+            self.run_metadata["id"], self.dirname, members, metadata, layout
+        )
+        return manifest.save(self.tbname)
+
+    def _toc_members(self):
+        """Return the members recorded in the tar ball, reading them first if
+        need be, in table-of-contents order.
+
+        Members persisted in a manifest are already in that order; others
+        are sorted into a new list, as the order of self.members is relied
+        upon by the other generators of actions, and must be the same on
+        every pass over the tar ball (see IndexingCheckpoint).  The whole
+        list of members is held either way, so memory is bounded by the
+        number of members rather than by the directory depth.
+        """
+        if self._tar_members is None:
+            self._tar_members = self._read_tar_members()
+        members = self._tar_members
+        if not _in_toc_order(members):
+            members = sorted(members, key=_toc_order_key)
+        return members
+
     # We'll accept dates that match any of the following:
     #  * 2019-01-10_12:12:12
     #  * 2019-01-10T12:12:12
@@ -3935,14 +6317,49 @@ class PbenchTarBall:
         result data.
         """
         self.idxctx.logger.debug("start")
-        yield self.mk_run_action()
-        for action in self.mk_toc_actions():
-            yield action
-        for action in self.mk_result_data_actions():
-            yield action
+        if not self._unit_done("run"):
+            with self.stats.phase("run"):
+                action = self.mk_run_action()
+            yield from self._unit_actions("run", [action])
+        if not self._unit_done("toc"):
+            yield from self._unit_actions(
+                "toc", self.stats.timed("toc", self.mk_toc_actions())
+            )
+        if not self._unit_done("result"):
+            yield from self._unit_actions(
+                "result",
+                self.stats.timed("result_data", self.mk_result_data_actions()),
+            )
         self.idxctx.logger.debug("end")
         return
 
+    def open_checkpoint(self, path):
+        """Track the progress of indexing this tar ball in the checkpoint at
+        the given path, resuming from the progress recorded there by an
+        earlier pass, if any, and return it.
+        """
+        md5 = self.run_metadata["id"]
+        try:
+            self.checkpoint = IndexingCheckpoint.load(path, md5)
+        except BadCheckpoint as e:
+            self.idxctx.logger.warning("Ignoring indexing checkpoint: {}", e)
+            self.checkpoint = IndexingCheckpoint(path, md5)
+        return self.checkpoint
+
+    def _unit_done(self, name):
+        """Return True if all the actions of the named unit were indexed by
+        an earlier pass.
+        """
+        return self.checkpoint is not None and self.checkpoint.done(name)
+
+    def _unit_actions(self, name, actions):
+        """Return the given actions of the named unit, leaving out those
+        indexed by an earlier pass.
+        """
+        if self.checkpoint is None:
+            return actions
+        return self.checkpoint.unit(name, actions)
+
     def mk_run_action(self):
         """Extract metadata from the named tar ball and create an indexing
         action out of them.
@@ -3978,16 +6395,25 @@ class PbenchTarBall:
         return action
 
     def mk_sosreports(self):
+        """Return the list of the sosreports of this tar ball, with the host
+        names and IP addresses found in each.
+
+        The list is only constructed once per tar ball, the sosreports being
+        scanned concurrently, and the scan results are remembered by MD5 so
+        that the same sosreport is not scanned again.
+        """
+        if self._sosreports is not None:
+            return self._sosreports
         self.idxctx.logger.debug("start")
 
+        # N.B. the list of file names is already sorted.
         sosreports = [
-            x.name
-            for x in self.members
-            if x.name.find("sosreport") >= 0 and x.name.endswith(".md5")
+            x
+            for x in self._idx.file_names
+            if x.endswith(".md5") and x.find("sosreport") >= 0
         ]
-        sosreports.sort()
 
-        sosreportlist = []
+        sos_md5s = []
         for x in sosreports:
             # x is the *sosreport*.tar.xz.md5 filename
             sos = x[: x.rfind(".md5")]
@@ -4003,9 +6429,29 @@ class PbenchTarBall:
                     self._tbctx,
                 )
                 continue
-            ret_val = hostnames_if_ip_from_sosreport(
-                os.path.join(self.extracted_root, sos)
-            )
+            sos_md5s.append((sos, md5_val))
+
+        def scan(sos_md5):
+            sos, md5_val = sos_md5
+            ret_val = _sosreport_cache.get(md5_val) if md5_val else None
+            if ret_val is None:
+                ret_val = hostnames_if_ip_from_sosreport(
+                    os.path.join(self.extracted_root, sos)
+                )
+                if md5_val:
+                    _sosreport_cache.put(md5_val, ret_val)
+            return ret_val
+
+        workers = min(self.idxctx.sosreport_workers, len(sos_md5s))
+        with self.stats.phase("sosreports"):
+            if workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    ret_vals = list(executor.map(scan, sos_md5s))
+            else:
+                ret_vals = [scan(sos_md5) for sos_md5 in sos_md5s]
+
+        sosreportlist = []
+        for (sos, md5_val), ret_val in zip(sos_md5s, ret_vals):
             # get hostname (short and FQDN) from sosreport
             d = _dict_const()
             d["name"] = sos
@@ -4015,6 +6461,7 @@ class PbenchTarBall:
             else:
                 d["sosreport-error"] = ret_val[1]
             sosreportlist.append(d)
+        self._sosreports = sosreportlist
         self.idxctx.logger.debug("end [{:d} sosreports processed]", len(sosreportlist))
         return sosreportlist
 
@@ -4170,69 +6617,70 @@ class PbenchTarBall:
             ] }
         """
         prefix_l = len(self.dirname)
-        # Note we have to fully populate the dictionary by processing all the
-        # members before we can yield the generated sources for each
-        # directory.
-        toc_dirs = _dict_const()
-        for m in self.members:
+        members = self._toc_members()
+        # The members are checked for duplicate and missing directories before
+        # any document is generated, as the documents of a tar ball failing
+        # those checks are not indexed at all, which takes a second pass over
+        # them.
+        dup_dirs = False
+        missing = None
+        for dname, dirs, entries in _gen_toc_groups(members):
+            if len(dirs) > 1:
+                dup_dirs = True
+            elif not dirs and missing is None:
+                # Every non-directory entry must belong to a directory entry
+                # of the tar ball.
+                missing = dname
+        if dup_dirs:
+            raise Exception("Logic bomb! Found a directory entry that already exists!")
+        if missing is not None:
+            dpath = missing[prefix_l:]
+            raise KeyError(dpath if dpath else "/")
+        # The directories are emitted in the sorted order of their names,
+        # which is the same as the sorted order of their paths relative to
+        # the top-level directory.
+        for _, dirs, entries in _gen_toc_groups(members):
+            m = dirs[0]
             # Always strip the prefix
             path = m.name[prefix_l:]
-            if m.isdir():
-                if path == "/" or path == "":
-                    dpath = "/"
-                    name = None
-                    parent = "/"
-                    path_els = []
-                else:
-                    dpath = path[:-1] if path.endswith(os.path.sep) else path
-                    name = os.path.basename(dpath)
-                    parent = os.path.dirname(dpath)
-                    path_els = dpath.split(os.path.sep)[1:-1]
-                if dpath in toc_dirs:
-                    raise Exception(
-                        "Logic bomb! Found a directory entry that already exists!"
-                    )
-                toc_dirs[dpath] = _dict_const(
-                    parent=parent,
-                    directory=dpath,
-                    mtime=datetime.utcfromtimestamp(float(m.mtime)).isoformat(),
-                    mode=oct(m.mode),
-                )
-                if name:
-                    toc_dirs[dpath]["name"] = name
-                if len(path_els) > 0:
-                    toc_dirs[dpath]["ancestor_path_elements"] = path_els
+            if path == "/" or path == "":
+                dpath = "/"
+                name = None
+                parent = "/"
+                path_els = []
             else:
+                dpath = path[:-1] if path.endswith(os.path.sep) else path
+                name = os.path.basename(dpath)
+                parent = os.path.dirname(dpath)
+                path_els = dpath.split(os.path.sep)[1:-1]
+            source = _dict_const(
+                parent=parent,
+                directory=dpath,
+                mtime=datetime.utcfromtimestamp(float(m.mtime)).isoformat(),
+                mode=oct(m.mode),
+            )
+            if name:
+                source["name"] = name
+            if len(path_els) > 0:
+                source["ancestor_path_elements"] = path_els
+            files = []
+            for fm in entries:
                 fentry = _dict_const(
-                    name=os.path.basename(path),
-                    mtime=datetime.utcfromtimestamp(float(m.mtime)).isoformat(),
-                    size=m.size,
-                    mode=oct(m.mode),
+                    name=os.path.basename(fm.name),
+                    mtime=datetime.utcfromtimestamp(float(fm.mtime)).isoformat(),
+                    size=fm.size,
+                    mode=oct(fm.mode),
                 )
                 try:
-                    ftype = self._mode_table[m.type]
+                    ftype = self._mode_table[fm.type]
                 except KeyError:
                     ftype = "unk"
                 fentry["type"] = ftype
-                if m.issym():
-                    fentry["linkpath"] = m.linkpath
-                dpath = os.path.dirname(path)
-                # we may have created an empty dir entry already without a
-                # 'files' entry, so we now make sure that there is an
-                # empty 'files' entry that we can populate.
-                if "files" not in toc_dirs[dpath]:
-                    toc_dirs[dpath]["files"] = []
-                toc_dirs[dpath]["files"].append(fentry)
-        for key in sorted(toc_dirs.keys()):
-            source = toc_dirs[key]
-            try:
-                sorted_file_list = sorted(
-                    source["files"], key=itemgetter("name", "mtime")
-                )
-            except KeyError:
-                pass
-            else:
-                source["files"] = sorted_file_list
+                if fm.issym():
+                    fentry["linkpath"] = fm.linkpath
+                files.append(fentry)
+            if files:
+                source["files"] = sorted(files, key=itemgetter("name", "mtime"))
 
             # Add "join" metadata to connect TOC doc to parent run doc
             source["run_data_parent"] = self.run_metadata["id"]
@@ -4253,6 +6701,15 @@ class PbenchTarBall:
 
         We leverage helper methods to walk this hierarchy.
         """
+        for key in self._tool_data_keys():
+            if not self._unit_done(_tool_data_unit_name(*key)):
+                yield ToolData(self, *key)
+        return
+
+    def _tool_data_keys(self):
+        """Yield the (iteration, sample, host, tool) tuple of each unit of
+        tool data, from which its ToolData() object is constructed.
+        """
         # Process the sosreports to ensure we get all the information about the
         # host names for the tools.
         sos_d = self.mk_sosreports()
@@ -4271,47 +6728,109 @@ class PbenchTarBall:
                     tool_names = list(tools_data.keys())
                     tool_names.sort()
                     for tool in tool_names:
-                        yield ToolData(
-                            self, iteration.name, sample.name, hostname, tool
-                        )
+                        yield iteration.name, sample.name, hostname, tool
         return
 
     def mk_tool_data_actions(self):
-        """Generate all the tool data actions from the entire run hierarchy.
+        """Return a generator of all the tool data actions from the entire
+        run hierarchy.
+
+        When the indexing context has more than one tool data worker, the
+        units of tool data are handed to a pool of that many processes, and
+        their actions are generated in the order the units complete.  The
+        pool is created right away, so that its processes are forked by the
+        calling thread: the generator may be consumed by a thread of the
+        "parallel" bulk engine, while the other threads of the engine hold
+        locks (e.g. of the logging handlers) which a process forked then
+        would inherit held.
         """
+        workers = self.idxctx.tool_data_workers
+        if workers > 1 and multiprocessing.current_process().daemon:
+            # Daemonic processes, like the workers of the tar ball indexing
+            # pool, can't have children of their own.
+            workers = 1
+        if workers > 1:
+            keys = [
+                key
+                for key in self._tool_data_keys()
+                if not self._unit_done(_tool_data_unit_name(*key))
+            ]
+            pool = multiprocessing.get_context("fork").Pool(
+                min(workers, len(keys)) or 1,
+                initializer=_tool_data_pool_init,
+                initargs=(self,),
+            )
+            return self._mk_tool_data_actions(
+                self._mk_tool_data_actions_w_pool(pool, keys)
+            )
+        return self._mk_tool_data_actions(
+            action
+            for td in self.mk_tool_data()
+            for action in self._unit_actions(
+                td.unit_name, self._mk_tool_data_unit_actions(td)
+            )
+        )
+
+    def _mk_tool_data_actions(self, actions):
+        """Generate the given tool data actions, counting them."""
         self.idxctx.logger.debug("start")
         count = 0
-        for td in self.mk_tool_data():
-            # Each ToolData object, td, that is returned here represents how
-            # data collected for that tool across all hosts is to be returned.
-            # The make_source method returns a generator that will emit each
-            # source document for the appropriate unit of tool data.  Each has
-            # the option of constructing that data as best fits its tool data.
-            # The tool data for each tool is kept in its own index to allow
-            # for different curation policies for each tool.
-            asource = td.make_source()
-            if not asource:
-                continue
-            for source, source_id in asource:
-                try:
-                    idx_name = td.generate_index_name(
-                        "tool-data", source, toolname=td.toolname
-                    )
-                except BadDate:
-                    pass
-                else:
-                    source["@generated-by"] = self.idxctx.get_tracking_id()
-                    action = _dict_const(
-                        _op_type=_op_type,
-                        _index=idx_name,
-                        _id=source_id,
-                        _source=source,
-                    )
-                    count += 1
-                    yield action
+        for action in actions:
+            count += 1
+            yield action
         self.idxctx.logger.debug("end [{:d} tool data documents]", count)
         return
 
+    def _mk_tool_data_unit_actions(self, td):
+        """Generate the actions of the given ToolData object."""
+        # Each ToolData object, td, represents how data collected for that
+        # tool across all hosts is to be returned.  The make_source method
+        # returns a generator that will emit each source document for the
+        # appropriate unit of tool data.  Each has the option of constructing
+        # that data as best fits its tool data.  The tool data for each tool
+        # is kept in its own index to allow for different curation policies
+        # for each tool.
+        asource = td.make_source()
+        if not asource:
+            return
+        for source, source_id in asource:
+            try:
+                idx_name = td.generate_index_name(
+                    "tool-data", source, toolname=td.toolname
+                )
+            except BadDate:
+                pass
+            else:
+                source["@generated-by"] = self.idxctx.get_tracking_id()
+                action = _dict_const(
+                    _op_type=_op_type, _index=idx_name, _id=source_id, _source=source,
+                )
+                yield action
+
+    def _mk_tool_data_actions_w_pool(self, pool, keys):
+        """Generate the tool data actions of the units with the given keys,
+        handed to the given pool of worker processes.
+
+        The operational context and statistics gathered by the workers for
+        each unit are added to those of this process as each unit completes.
+        """
+        try:
+            for key, spool, _, opctx, unit_stats in pool.imap_unordered(
+                _tool_data_unit, keys
+            ):
+                self.idxctx.opctx.extend(opctx)
+                self.stats.merge(unit_stats)
+                yield from self._unit_actions(
+                    _tool_data_unit_name(*key), _read_tool_data_spool(spool)
+                )
+        except BaseException:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+
     def mk_result_data_actions(self):
         """Generate all the result data actions.
         """
@@ -4410,6 +6929,69 @@ class IdxContext:
             self.getpid = os.getpid
             self.getgid = os.getgid
             self.getuid = os.getuid
+        try:
+            self.manifests = self.config.conf.getboolean(
+                "Indexing", "manifests", fallback=False
+            )
+            self.sosreport_workers = self.config.conf.getint(
+                "Indexing", "sosreport_workers", fallback=4
+            )
+            self.tool_data_workers = self.config.conf.getint(
+                "Indexing", "tool_data_workers", fallback=1
+            )
+            tool_data_open_files = self.config.conf.getint(
+                "Indexing", "tool_data_open_files", fallback=64
+            )
+            self.stats_report = self.config.conf.getboolean(
+                "Indexing", "stats_report", fallback=False
+            )
+            self.checkpoints = self.config.conf.getboolean(
+                "Indexing", "checkpoints", fallback=False
+            )
+            self.large_tarball_seconds = self.config.conf.getint(
+                "Indexing", "large_tarball_seconds", fallback=1800
+            )
+            self.large_lane_workers = self.config.conf.getint(
+                "Indexing", "large_lane_workers", fallback=1
+            )
+        except ValueError as e:
+            raise ConfigFileError(str(e))
+        if self.sosreport_workers < 1:
+            raise ConfigFileError(
+                f"Invalid sosreport_workers, {self.sosreport_workers!r}, must be"
+                " greater than zero"
+            )
+        if self.tool_data_workers < 1:
+            raise ConfigFileError(
+                f"Invalid tool_data_workers, {self.tool_data_workers!r}, must be"
+                " greater than zero"
+            )
+        if tool_data_open_files < 1:
+            raise ConfigFileError(
+                f"Invalid tool_data_open_files, {tool_data_open_files!r}, must be"
+                " greater than zero"
+            )
+        if self.large_tarball_seconds < 1:
+            raise ConfigFileError(
+                f"Invalid large_tarball_seconds, {self.large_tarball_seconds!r},"
+                " must be greater than zero"
+            )
+        if self.large_lane_workers < 1:
+            raise ConfigFileError(
+                f"Invalid large_lane_workers, {self.large_lane_workers!r}, must be"
+                " greater than zero"
+            )
+        self.tool_data_open_files = OpenFileBudget(tool_data_open_files)
+        self.stats_prometheus_file = self.config.conf.get(
+            "Indexing", "stats_prometheus_file", fallback=None
+        )
+        # The costs of generating each document are only measured when the
+        # statistics are reported.
+        self.collect_stats = bool(self.stats_report or self.stats_prometheus_file)
+        self.backlog_history = self.config.conf.get(
+            "Indexing", "backlog_history", fallback=None
+        )
+        self.bulk_engine = BulkEngine(self.config)
         self.TS = self.config.TS
 
         self.logger = get_pbench_logger(self.name, self.config)
@@ -4426,8 +7008,16 @@ class IdxContext:
     def dump_opctx(self):
         counters_list = []
         for ctx in self.opctx:
-            if ctx["counters"]:
-                counters_list.append(ctx)
+            # Only error counters are reported.
+            counters = _dict_const(
+                (name, cnt)
+                for name, cnt in ctx["counters"].items()
+                if name not in _stats_counters
+            )
+            if counters:
+                err_ctx = _dict_const(ctx)
+                err_ctx["counters"] = counters
+                counters_list.append(err_ctx)
         if counters_list:
             self.logger.warning(
                 "** Errors encountered while indexing: {}",
@@ -8,6 +8,18 @@ import json
 from collections import Counter
 
 
+def _write_report(lines):
+    """Write the given report lines to stdout with a single write, so that
+    the reports of concurrent indexing processes sharing stdout are not
+    interleaved.
+    """
+    if not lines:
+        return
+    sys.stdout.flush()
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
 class MockElasticsearch:
     """A simple mock for the V1 Elasticsearch client object. We really just
     duck-type it, only providing names for attributes we use.  It is not complete
@@ -32,7 +44,10 @@ class MockElasticsearch:
         self.indices = _MockObject(
             put_template=self.mpt.put_template, get_template=self.mpt.get_template
         )
-        self.mockstrm = _MockObject(streaming_bulk=self.msb.streaming_bulk)
+        self.mockstrm = _MockObject(
+            streaming_bulk=self.msb.streaming_bulk,
+            parallel_bulk=self.msb.parallel_bulk,
+        )
 
 
 class _MockObject:
@@ -69,15 +84,16 @@ class _MockPutTemplate:
         # single document; we map the document name to the body here.
         names = [name for name in self.mock_collected_templates.keys()]
         names.sort()
+        lines = []
         for name in names:
-            print("Template: ", name)
+            lines.append(f"Template:  {name}")
             body = self.mock_collected_templates[name]
             assert name not in self.mock_mappings, (
                 "Duplicate mapping name encountered:"
                 " {} ({!r})".format(name, self.mock_mappings.keys())
             )
             self.mock_mappings[name] = body
-        sys.stdout.flush()
+        _write_report(lines)
 
 
 class _MockStreamingBulk:
@@ -130,6 +146,24 @@ class _MockStreamingBulk:
             yield ok, resp
         msb.report()
 
+    @staticmethod
+    def parallel_bulk(
+        es,
+        actions,
+        chunk_size=500,
+        max_chunk_bytes=104857600,
+        thread_count=4,
+        queue_size=4,
+        **kwargs,
+    ):
+        """Mock out helpers.parallel_bulk: the actions are handled one at a
+        time, in order, exactly as streaming_bulk() does, so that the results
+        don't depend on the bulk engine used.
+        """
+        for arg in (chunk_size, max_chunk_bytes, thread_count, queue_size):
+            assert isinstance(arg, int) and arg > 0, f"Unexpected argument: {arg!r}"
+        return _MockStreamingBulk.streaming_bulk(es, actions, **kwargs)
+
     def validate_type(self, action):
         """Pbench no longer uses the '_type' ES Action field. This field was
         deprecated in ES6, and will no longer be allowed in ES8.
@@ -306,8 +340,9 @@ class _MockStreamingBulk:
         return ret_val
 
     def report(self):
+        lines = []
         for idx in sorted(self.index_tracker.keys()):
-            print("Index: ", idx, self.index_tracker[idx])
+            lines.append(f"Index:  {idx} {self.index_tracker[idx]}")
         total_dupes = 0
         total_multi_dupes = 0
         for docid in self.duplicates_tracker:
@@ -319,10 +354,12 @@ class _MockStreamingBulk:
             if self.duplicates_tracker[docid] >= 2:
                 total_multi_dupes += 1
         if total_dupes > 0:
-            print("Duplicates: ", total_dupes, "Multiple dupes: ", total_multi_dupes)
+            lines.append(
+                f"Duplicates:  {total_dupes} Multiple dupes:  {total_multi_dupes}"
+            )
         for idx in sorted(self.dupes_by_index_tracker.keys()):
-            print("Index dupes: ", idx, self.dupes_by_index_tracker[idx])
-        print("len(actions) = {}".format(len(self.actions_l)))
-        print(json.dumps(self.actions_l, indent=4, sort_keys=True))
-        sys.stdout.flush()
+            lines.append(f"Index dupes:  {idx} {self.dupes_by_index_tracker[idx]}")
+        lines.append("len(actions) = {}".format(len(self.actions_l)))
+        lines.append(json.dumps(self.actions_l, indent=4, sort_keys=True))
+        _write_report(lines)
         self.reset()
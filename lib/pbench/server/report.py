@@ -5,7 +5,6 @@ import sys
 import os
 import lzma
 import math
-import json
 import hashlib
 import socket
 
@@ -14,7 +13,13 @@ from pathlib import Path
 
 from pbench.common.logger import get_pbench_logger
 from pbench.server import tstos
-from pbench.server.indexer import PbenchTemplates, get_es, es_index, _op_type
+from pbench.server.indexer import (
+    PbenchData,
+    PbenchTemplates,
+    get_es,
+    es_index,
+    _op_type,
+)
 
 
 class Report:
@@ -110,10 +115,13 @@ class Report:
     def _make_json_payload(source):
         """Given a source dictionary, return its ID, and a formatted JSON
         payload.
+
+        The payload is the same as json.dumps(source, sort_keys=True), made
+        with the encoder kept for source IDs (see PbenchData.make_source_id()).
         """
-        the_bytes = json.dumps(source, sort_keys=True).encode("utf-8")
-        source_id = hashlib.md5(the_bytes).hexdigest()
-        return source, source_id, the_bytes.decode("utf-8")
+        payload = PbenchData._source_id_encode(source)
+        source_id = hashlib.md5(payload.encode("utf-8")).hexdigest()
+        return source, source_id, payload
 
     def _gen_json_payload(self, base_source, file_to_index):
         """Generate a series of JSON documents to be indexed, where the text
@@ -0,0 +1,93 @@
+"""Common support for the pbench server benchmarks.
+
+The benchmarks are not unit tests, they are run by hand, e.g.:
+
+    python3 -m pbench.test.benchmark.server.bench_unified_csv
+
+By default they use the result tar balls found in the server unit test state
+tar balls, server/bin/state/test-7.*.tar.xz, except for bench_indexing, which
+generates a synthetic result tar ball of a given shape (see synthetic.py).
+"""
+
+import glob
+import logging
+import os
+import tarfile
+from pathlib import Path
+
+from pbench.common.logger import _StyleAdapter
+from pbench.server.indexer import (
+    OpenFileBudget,
+    PbenchTarBall,
+    PbenchTemplates,
+    _known_tool_handlers,
+)
+
+
+# The server unit test state tar balls, and the index mappings and settings,
+# live in the source tree.
+SERVER_DIR = Path(__file__).resolve().parents[5] / "server"
+STATE_DIR = SERVER_DIR / "bin" / "state"
+
+
+def state_tarballs():
+    """Return the sorted list of the indexing unit test state tar balls."""
+    return sorted(glob.glob(str(STATE_DIR / "test-7.*.tar.xz")))
+
+
+class BenchContext:
+    """The subset of the indexing context, IdxContext, needed to open result
+    tar balls and generate documents and indexing actions from them, without
+    any configuration or Elasticsearch instance.
+    """
+
+    def __init__(
+        self,
+        name="pbench-bench",
+        manifests=False,
+        sosreport_workers=4,
+        tool_data_workers=1,
+        tool_data_open_files=64,
+        collect_stats=True,
+    ):
+        self.name = name
+        self.manifests = manifests
+        self.sosreport_workers = sosreport_workers
+        self.tool_data_workers = tool_data_workers
+        self.tool_data_open_files = OpenFileBudget(tool_data_open_files)
+        self.collect_stats = collect_stats
+        self.opctx = []
+        logger = logging.getLogger(name)
+        if not logger.handlers:
+            logger.addHandler(logging.NullHandler())
+        logger.propagate = False
+        self.logger = _StyleAdapter(logger)
+        self.templates = PbenchTemplates(
+            str(SERVER_DIR / "bin"), "bench", self.logger, _known_tool_handlers
+        )
+        self.tracking_id = name
+
+    def get_tracking_id(self):
+        return self.tracking_id
+
+
+def open_result_tarballs(ctx, state_tb, workdir):
+    """Unpack the given unit test state tar ball into `workdir`, unpack each
+    result tar ball found in its archive hierarchy into the corresponding
+    incoming hierarchy, and yield a PbenchTarBall object for each.
+
+    Result tar balls that can't be opened are skipped.
+    """
+    with tarfile.open(state_tb) as tf:
+        tf.extractall(workdir)
+    archive = os.path.join(workdir, "pbench", "archive", "fs-version-001")
+    incoming = os.path.join(workdir, "pbench", "public_html", "incoming")
+    for tb in sorted(glob.glob(os.path.join(archive, "*", "*.tar.xz"))):
+        extracted_root = os.path.join(incoming, os.path.basename(os.path.dirname(tb)))
+        os.makedirs(extracted_root, exist_ok=True)
+        with tarfile.open(tb) as tf:
+            tf.extractall(extracted_root)
+        try:
+            yield PbenchTarBall(ctx, tb, workdir, extracted_root)
+        except Exception as exc:
+            ctx.logger.warning("Skipping {}: {}", tb, exc)
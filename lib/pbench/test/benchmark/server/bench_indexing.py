@@ -0,0 +1,275 @@
+"""Benchmark the generation of the indexing actions of a synthetic result tar
+ball of a given shape (see synthetic.TarBallShape), reporting the documents
+per second, MB per second and peak RSS of each indexing phase.
+
+The actions are sent to a no-op sink which only serializes them the way a
+bulk request would, so what is measured is the work of the indexer alone.
+Each phase is run in its own (forked) process, after opening the tar ball
+there, since the peak RSS of a process can't be reset: "open" is the construction
+of the PbenchTarBall object, "run", "toc" and "result_data" are the parts of
+PbenchTarBall.make_all_actions(), and "tool_data" is
+PbenchTarBall.mk_tool_data_actions().  The "total" entry is both of those
+run back to back in one process, the way pbench-index does, broken down by
+the phase timings of its IndexingStats.  With --tool-data-workers, the tool
+data is generated by that many processes, whose memory is not included.
+
+The results can be recorded as JSON, along with the shape of the tar ball
+and the git commit of the tree, to compare runs across commits.
+"""
+
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from argparse import ArgumentParser
+
+from elasticsearch.serializer import JSONSerializer
+
+from pbench.server.indexer import PbenchTarBall, _BulkSerializer, _tool_handler_resolver
+from pbench.test.benchmark.server import BenchContext
+from pbench.test.benchmark.server.synthetic import TOOLS, TarBallShape, make_tarball
+
+
+class NullSink:
+    """Consume indexing actions, serializing each one as the action and
+    source lines of a bulk request, counting the documents and bytes.
+    """
+
+    def __init__(self):
+        self.serializer = _BulkSerializer(JSONSerializer())
+        self.documents = 0
+        self.bytes = 0
+
+    def consume(self, actions):
+        for action in actions:
+            header = {
+                action["_op_type"]: dict(_index=action["_index"], _id=action["_id"])
+            }
+            body = "{}\n{}\n".format(
+                self.serializer.dumps(header), self.serializer.dumps(action["_source"])
+            )
+            self.documents += 1
+            self.bytes += len(body.encode("utf-8"))
+
+
+def _phase_actions(ptb, phase):
+    """Return the actions generated by the given phase of the tar ball."""
+    if phase == "open":
+        return ()
+    elif phase == "run":
+        with ptb.stats.phase("run"):
+            return [ptb.mk_run_action()]
+    elif phase == "toc":
+        return ptb.stats.timed("toc", ptb.mk_toc_actions())
+    elif phase == "result_data":
+        return ptb.stats.timed("result_data", ptb.mk_result_data_actions())
+    elif phase == "tool_data":
+        return ptb.stats.timed("tool_data", ptb.mk_tool_data_actions())
+    else:
+        assert phase == "total", f"Logic bomb! unexpected phase {phase!r}"
+        return _total_actions(ptb)
+
+
+def _total_actions(ptb):
+    yield from ptb.make_all_actions()
+    yield from ptb.stats.timed("tool_data", ptb.mk_tool_data_actions())
+
+
+def _maxrss_kib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run_phase(phase, tb, extracted_root, workdir, options):
+    """Run one phase, returning its measurements."""
+    ctx = BenchContext(
+        sosreport_workers=options.sosreport_workers,
+        tool_data_workers=options.tool_data_workers,
+        tool_data_open_files=options.tool_data_open_files,
+    )
+    base_rss = _maxrss_kib()
+    beg = time.perf_counter()
+    ptb = PbenchTarBall(ctx, tb, workdir, extracted_root)
+    if phase != "open":
+        beg = time.perf_counter()
+    sink = NullSink()
+    sink.consume(_phase_actions(ptb, phase))
+    elapsed = time.perf_counter() - beg
+    return dict(
+        seconds=round(elapsed, 6),
+        documents=sink.documents,
+        bytes=sink.bytes,
+        docs_per_sec=round(sink.documents / elapsed, 1) if elapsed else None,
+        mb_per_sec=round(sink.bytes / elapsed / 1e6, 3) if elapsed else None,
+        peak_rss_kib=_maxrss_kib(),
+        peak_rss_delta_kib=_maxrss_kib() - base_rss,
+        stats=ptb.stats.to_dict(),
+        handler_cache=_tool_handler_resolver.cache_info(),
+    )
+
+
+def _run_in_child(func, *args):
+    """Run func(*args) in a forked child process, returning its result.
+
+    The child is not a daemon, unlike the workers of a multiprocessing pool,
+    so that it can have a pool of its own for the tool data.
+    """
+    recv, send = multiprocessing.Pipe(duplex=False)
+
+    def target():
+        try:
+            res = (True, func(*args))
+        except Exception:
+            res = (False, traceback.format_exc())
+        send.send(res)
+
+    proc = multiprocessing.get_context("fork").Process(target=target)
+    proc.start()
+    send.close()
+    try:
+        ok, res = recv.recv()
+    except EOFError:
+        ok, res = False, "the child process died"
+    proc.join()
+    if not ok:
+        raise RuntimeError(f"{func.__name__}{args!r} failed: {res}")
+    return res
+
+
+def _git_describe():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(options):
+    shape = TarBallShape(
+        iterations=options.iterations,
+        samples=options.samples,
+        hosts=options.hosts,
+        tools=options.tools.split(",") if options.tools else (),
+        csv_columns=options.csv_columns,
+        csv_rows=options.csv_rows,
+        sosreports=options.sosreports,
+        files=options.files,
+        seed=options.seed,
+    )
+    phases = ("open", "run", "toc", "result_data", "tool_data", "total")
+    results = dict(
+        commit=_git_describe(),
+        python=platform.python_version(),
+        shape=shape.to_dict(),
+        tool_data_workers=options.tool_data_workers,
+        tool_data_open_files=options.tool_data_open_files,
+        phases={},
+    )
+    with tempfile.TemporaryDirectory(prefix="bench-indexing.") as workdir:
+        beg = time.perf_counter()
+        tb, extracted_root = make_tarball(shape, workdir)
+        results["tarball"] = dict(
+            name=os.path.basename(tb),
+            size=os.path.getsize(tb),
+            generate_seconds=round(time.perf_counter() - beg, 3),
+        )
+        print(
+            f"{os.path.basename(tb)}: {results['tarball']['size'] / 1e6:.1f} MB"
+            f" (generated in {results['tarball']['generate_seconds']:.1f}s)"
+        )
+        for phase in phases:
+            # A fresh process for each phase, so that its peak RSS is its own.
+            res = _run_in_child(_run_phase, phase, tb, extracted_root, workdir, options)
+            if phase != "total":
+                del res["stats"], res["handler_cache"]
+            results["phases"][phase] = res
+            print(
+                f"{phase:>12}: {res['documents']:8d} docs {res['seconds']:8.3f}s"
+                f" {res['docs_per_sec'] or 0:10.1f} docs/s"
+                f" {res['mb_per_sec'] or 0:8.3f} MB/s"
+                f" peak RSS {res['peak_rss_kib'] / 1024:7.1f} MiB"
+                f" (+{res['peak_rss_delta_kib'] / 1024:.1f})"
+            )
+    if options.json:
+        with open(options.json, "w") as fp:
+            json.dump(results, fp, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    defaults = TarBallShape()
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "-j", "--json", default=None, help="Also record the results in this JSON file",
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=defaults.iterations, help="Iterations"
+    )
+    parser.add_argument(
+        "--samples", type=int, default=defaults.samples, help="Samples per iteration"
+    )
+    parser.add_argument(
+        "--hosts", type=int, default=defaults.hosts, help="Hosts with tool data"
+    )
+    parser.add_argument(
+        "--tools",
+        default=",".join(defaults.tools),
+        help=f"Comma separated list of tools, from {', '.join(TOOLS)}",
+    )
+    parser.add_argument(
+        "--csv-columns",
+        type=int,
+        default=defaults.csv_columns,
+        help="Data columns of each tool data file",
+    )
+    parser.add_argument(
+        "--csv-rows",
+        type=int,
+        default=defaults.csv_rows,
+        help="Rows of each tool data file",
+    )
+    parser.add_argument(
+        "--sosreports",
+        type=int,
+        default=defaults.sosreports,
+        help="Sosreports, spread over the hosts",
+    )
+    parser.add_argument(
+        "--files",
+        type=int,
+        default=defaults.files,
+        help="Additional files for the table-of-contents",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=defaults.seed, help="Seed of the generated values"
+    )
+    parser.add_argument(
+        "--sosreport-workers",
+        type=int,
+        default=4,
+        help="Threads scanning the sosreports",
+    )
+    parser.add_argument(
+        "--tool-data-workers",
+        type=int,
+        default=1,
+        help="Processes generating the tool data",
+    )
+    parser.add_argument(
+        "--tool-data-open-files",
+        type=int,
+        default=64,
+        help="Tool data .csv files open at once, across all the processes",
+    )
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,115 @@
+"""Benchmark the peak memory used to generate documents from the JSON files
+of result tar balls, the tool data json/*.json files and the top-level
+result.json, when they are loaded in full, and when they are decoded an
+element at a time (see JsonArrayIterator).
+
+For each result tar ball, the documents generated both ways are compared
+(they must be identical, sources and IDs, which is checked by way of a
+digest so that the documents don't have to be kept around), and the peak
+memory allocated while generating them, as traced by tracemalloc, is
+reported.
+"""
+
+import hashlib
+import json
+import sys
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+
+from pbench.server.indexer import PbenchData, ResultData
+from pbench.test.benchmark.server import (
+    BenchContext,
+    open_result_tarballs,
+    state_tarballs,
+)
+
+
+def _json_sources(ptb):
+    """Return the document generators of the given tar ball which read JSON
+    files.
+    """
+    gens = [
+        td.make_source
+        for td in ptb.mk_tool_data()
+        if td.files and td.handler["@prospectus"]["method"] == "json"
+    ]
+    rd = ResultData(ptb)
+    if rd:
+        gens.append(rd.make_source)
+    return gens
+
+
+def _run(ptb, incremental):
+    """Generate all the JSON based documents of the tar ball, returning the
+    peak memory traced, the number of documents generated, and the digest of
+    their JSON sources and IDs.
+    """
+    gens = _json_sources(ptb)
+    PbenchData.incremental_json = incremental
+    count = 0
+    digest = hashlib.sha256()
+    tracemalloc.start()
+    try:
+        for gen in gens:
+            sources = gen()
+            if not sources:
+                continue
+            for doc in sources:
+                digest.update(json.dumps(doc[0]).encode("utf-8"))
+                digest.update(doc[1].encode("utf-8"))
+                count += 1
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, count, digest.hexdigest()
+
+
+def main(options):
+    ctx = BenchContext()
+    results = []
+    mismatches = 0
+    for state_tb in options.tarballs:
+        with tempfile.TemporaryDirectory(prefix="bench-json-memory.") as workdir:
+            for ptb in open_result_tarballs(ctx, state_tb, workdir):
+                full_peak, count, full_digest = _run(ptb, False)
+                if not count:
+                    continue
+                incr_peak, _, incr_digest = _run(ptb, True)
+                identical = full_digest == incr_digest
+                if not identical:
+                    mismatches += 1
+                results.append(
+                    dict(
+                        tarball=ptb.dirname,
+                        documents=count,
+                        full_peak_bytes=full_peak,
+                        incremental_peak_bytes=incr_peak,
+                        identical=identical,
+                    )
+                )
+                print(
+                    f"{ptb.dirname}: {count:d} docs, peak full"
+                    f" {full_peak / 1024:.0f} KiB, incremental"
+                    f" {incr_peak / 1024:.0f} KiB,"
+                    f" {'identical' if identical else 'MISMATCHED'}"
+                )
+    PbenchData.incremental_json = True
+    if options.json:
+        with open(options.json, "w") as fp:
+            json.dump(results, fp, indent=4)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "-j", "--json", default=None, help="Also record the results in this JSON file",
+    )
+    parser.add_argument(
+        "tarballs",
+        nargs="*",
+        default=state_tarballs(),
+        help="Unit test state tar balls to use (default: server/bin/state/test-7.*)",
+    )
+    sys.exit(main(parser.parse_args()))
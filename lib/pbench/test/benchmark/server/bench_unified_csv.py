@@ -0,0 +1,109 @@
+"""Benchmark the two ways ToolData._make_source_unified() processes unified
+.csv tool data: a row at a time from each .csv file in lock step, and a
+column at a time.
+
+For each result tar ball, the documents generated by both are compared (they
+must be identical, sources and IDs), and the time taken by each is reported.
+"""
+
+import json
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from pbench.server.indexer import ToolData
+from pbench.test.benchmark.server import (
+    BenchContext,
+    open_result_tarballs,
+    state_tarballs,
+)
+
+
+def _unified_tool_data(ptb):
+    """Return the ToolData objects of the given tar ball which have unified
+    .csv data.
+    """
+    return [
+        td
+        for td in ptb.mk_tool_data()
+        if td.files and td.handler["@prospectus"]["method"] == "unify"
+    ]
+
+
+def _run(ptb, columnar):
+    """Generate all the unified tool data documents of the tar ball, returning
+    the elapsed time and the list of the JSON sources and IDs generated.
+    """
+    # Opening the .csv files is not part of what is measured.
+    tds = _unified_tool_data(ptb)
+    ToolData.unified_columnar = columnar
+    docs = []
+    beg = time.perf_counter()
+    for td in tds:
+        docs.extend(td.make_source())
+    elapsed = time.perf_counter() - beg
+    return elapsed, [(json.dumps(source), source_id) for source, source_id in docs]
+
+
+def main(options):
+    ctx = BenchContext()
+    results = []
+    mismatches = 0
+    for state_tb in options.tarballs:
+        with tempfile.TemporaryDirectory(prefix="bench-unified-csv.") as workdir:
+            for ptb in open_result_tarballs(ctx, state_tb, workdir):
+                rows_t, rows_docs = min(
+                    (_run(ptb, False) for _ in range(options.repeat)),
+                    key=lambda res: res[0],
+                )
+                if not rows_docs:
+                    continue
+                cols_t, cols_docs = min(
+                    (_run(ptb, True) for _ in range(options.repeat)),
+                    key=lambda res: res[0],
+                )
+                identical = rows_docs == cols_docs
+                if not identical:
+                    mismatches += 1
+                results.append(
+                    dict(
+                        tarball=ptb.dirname,
+                        documents=len(rows_docs),
+                        rows_secs=rows_t,
+                        columnar_secs=cols_t,
+                        speedup=rows_t / cols_t if cols_t else None,
+                        identical=identical,
+                    )
+                )
+                print(
+                    f"{ptb.dirname}: {len(rows_docs):d} docs, rows {rows_t:.3f}s,"
+                    f" columnar {cols_t:.3f}s ({rows_t / cols_t:.2f}x),"
+                    f" {'identical' if identical else 'MISMATCHED'}"
+                )
+    ToolData.unified_columnar = True
+    if options.json:
+        with open(options.json, "w") as fp:
+            json.dump(results, fp, indent=4)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of runs of each method, the fastest is reported (default 3)",
+    )
+    parser.add_argument(
+        "-j", "--json", default=None, help="Also record the results in this JSON file",
+    )
+    parser.add_argument(
+        "tarballs",
+        nargs="*",
+        default=state_tarballs(),
+        help="Unit test state tar balls to use (default: server/bin/state/test-7.*)",
+    )
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,430 @@
+"""Generate synthetic pbench result tar balls of a given shape for the
+indexing benchmarks.
+
+The tar balls follow the layout of those created by the pbench-agent, and
+the tool data files follow the formats of the tools the indexer knows how to
+handle, with deterministic (seeded) values, so that two runs with the same
+shape index the same documents.
+"""
+
+import hashlib
+import io
+import json
+import os
+import random
+import tarfile
+from datetime import datetime, timedelta, timezone
+
+
+# The tools for which tool data files are generated, all of them by default.
+TOOLS = (
+    "iostat",
+    "mpstat",
+    "pidstat",
+    "proc-vmstat",
+    "prometheus-metrics",
+    "vmstat",
+)
+
+# The .csv files of the unified .csv tools, with whether each column of the
+# file is split into "read" and "write" columns.
+_iostat_csvs = (
+    ("disk_IOPS.csv", True),
+    ("disk_Queue_Size.csv", False),
+    ("disk_Request_Merges_per_sec.csv", True),
+    ("disk_Request_Size_in_512_byte_sectors.csv", False),
+    ("disk_Throughput_MB_per_sec.csv", True),
+    ("disk_Utilization_percent.csv", False),
+    ("disk_Wait_Time_msec.csv", True),
+)
+# The pidstat .csv files, with whether their values are integers.
+_pidstat_csvs = (
+    ("context_switches_nonvoluntary_switches_sec.csv", False),
+    ("context_switches_voluntary_switches_sec.csv", False),
+    ("cpu_usage_percent_cpu.csv", False),
+    ("file_io_io_reads_KB_sec.csv", False),
+    ("file_io_io_writes_KB_sec.csv", False),
+    ("memory_faults_major_faults_sec.csv", False),
+    ("memory_faults_minor_faults_sec.csv", False),
+    ("memory_usage_resident_set_size.csv", True),
+    ("memory_usage_virtual_size.csv", True),
+)
+# The vmstat .csv files have a fixed set of columns, of integer values.
+_vmstat_csvs = (
+    ("vmstat_block.csv", ("in_KiB", "out_KiB")),
+    ("vmstat_cpu.csv", ("idle", "steal", "sys", "user", "wait")),
+    ("vmstat_memory.csv", ("active_KiB", "free_KiB", "inactive_KiB", "swapped_KiB"),),
+    ("vmstat_procs.csv", ("blocked", "running")),
+    ("vmstat_swap.csv", ("in_KiB", "out_KiB")),
+    ("vmstat_system.csv", ("cntx_switches", "interrupts")),
+)
+_mpstat_columns = (
+    "guest",
+    "idle",
+    "iowait",
+    "irq",
+    "nice",
+    "softirq",
+    "steal",
+    "sys",
+    "usr",
+)
+
+# The date of all synthetic runs, and the interval between two samples of
+# tool data.
+_START_RUN = datetime(2020, 5, 1, 12, 0, 0)
+_START_TS = _START_RUN.replace(tzinfo=timezone.utc).timestamp()
+_INTERVAL = 3
+
+
+class TarBallShape:
+    """The shape of a synthetic result tar ball:
+
+        iterations, samples - the number of iteration directories, and of
+            sample directories in each iteration
+        hosts - the number of hosts tool data is collected from
+        tools - the names of the tools for which tool data is generated, from
+            TOOLS
+        csv_columns - the number of data columns (devices, processes, CPUs,
+            or metrics) of each tool data file
+        csv_rows - the number of rows (samples of tool data) of each tool
+            data file, and the number of timeseries entries of each sample
+            of the result data
+        sosreports - the number of sosreports, spread over the hosts
+        files - the number of additional small files, to inflate the table
+            of contents
+        seed - the seed of the generated values
+    """
+
+    def __init__(
+        self,
+        iterations=2,
+        samples=2,
+        hosts=2,
+        tools=TOOLS,
+        csv_columns=8,
+        csv_rows=100,
+        sosreports=2,
+        files=100,
+        seed=0,
+    ):
+        unknown = set(tools) - set(TOOLS)
+        if unknown:
+            raise ValueError(f"Unsupported tools: {', '.join(sorted(unknown))}")
+        self.iterations = iterations
+        self.samples = samples
+        self.hosts = hosts
+        self.tools = tuple(tools)
+        self.csv_columns = csv_columns
+        self.csv_rows = csv_rows
+        self.sosreports = sosreports
+        self.files = files
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self), tools=list(self.tools))
+
+    @property
+    def name(self):
+        """The name of the result, which encodes its shape."""
+        return (
+            f"synthetic_i{self.iterations}s{self.samples}h{self.hosts}"
+            f"t{len(self.tools)}c{self.csv_columns}r{self.csv_rows}"
+            f"_{_START_RUN.strftime('%Y.%m.%dT%H.%M.%S')}"
+        )
+
+    @property
+    def host_names(self):
+        return [f"host-{h:d}" for h in range(self.hosts)]
+
+    @property
+    def iteration_names(self):
+        return [f"{i:d}-synthetic" for i in range(1, self.iterations + 1)]
+
+    @property
+    def sample_names(self):
+        return [f"sample{s:d}" for s in range(1, self.samples + 1)]
+
+    def sample_window(self, iteration, sample):
+        """Return the epoch timestamps, in seconds, of the rows of tool data
+        of the given iteration and sample (both 0-based), samples not
+        overlapping each other.
+        """
+        beg = _START_TS + (
+            (iteration * self.samples + sample) * (self.csv_rows + 1) * _INTERVAL
+        )
+        return [beg + row * _INTERVAL for row in range(self.csv_rows)]
+
+    @property
+    def end_run(self):
+        windows = self.iterations * self.samples * (self.csv_rows + 1)
+        return _START_RUN + timedelta(seconds=windows * _INTERVAL + 1)
+
+
+def _write(path, contents):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fp:
+        fp.write(contents)
+
+
+def _write_csv(path, columns, timestamps, rng, integers=False):
+    lines = [",".join(["timestamp_ms"] + list(columns))]
+    for ts in timestamps:
+        if integers:
+            values = (f"{rng.randrange(100000):d}" for _ in columns)
+        else:
+            values = (f"{rng.uniform(0, 100):.2f}" for _ in columns)
+        lines.append(",".join([f"{ts * 1000:.0f}"] + list(values)))
+    _write(path, "\n".join(lines) + "\n")
+
+
+def _gen_iostat(tool_dir, shape, timestamps, rng):
+    devices = [f"dev{d:d}" for d in range(max(shape.csv_columns // 2, 1))]
+    for fname, read_write in _iostat_csvs:
+        if read_write:
+            columns = [f"{dev}-{rw}" for dev in devices for rw in ("read", "write")]
+        else:
+            columns = devices
+        _write_csv(os.path.join(tool_dir, "csv", fname), columns, timestamps, rng)
+
+
+def _gen_mpstat(tool_dir, shape, timestamps, rng):
+    for cpu in ["all"] + list(range(shape.csv_columns)):
+        fname = f"cpu{cpu}_cpu{cpu}.csv"
+        _write_csv(
+            os.path.join(tool_dir, "csv", fname), _mpstat_columns, timestamps, rng
+        )
+
+
+def _gen_pidstat(tool_dir, shape, timestamps, rng):
+    columns = [f"{1000 + p:d}-/usr/bin/proc_{p:d}" for p in range(shape.csv_columns)]
+    for fname, integers in _pidstat_csvs:
+        _write_csv(
+            os.path.join(tool_dir, "csv", fname), columns, timestamps, rng, integers
+        )
+
+
+def _gen_vmstat(tool_dir, shape, timestamps, rng):
+    for fname, columns in _vmstat_csvs:
+        _write_csv(os.path.join(tool_dir, "csv", fname), columns, timestamps, rng, True)
+
+
+def _gen_proc_vmstat(tool_dir, shape, timestamps, rng):
+    lines = []
+    counters = [0] * shape.csv_columns
+    for ts in timestamps:
+        lines.append(f"timestamp: {ts:.9f}")
+        for col in range(shape.csv_columns):
+            counters[col] += rng.randrange(1000)
+            lines.append(f"nr_synthetic_{col:d} {counters[col]:d}")
+    _write(os.path.join(tool_dir, "proc-vmstat-stdout.txt"), "\n".join(lines) + "\n")
+
+
+def _gen_prometheus_metrics(tool_dir, shape, timestamps, rng):
+    docs = []
+    for ts in timestamps:
+        doc = {"@timestamp": ts}
+        for col in range(shape.csv_columns):
+            doc[f"metric_{col:d}"] = round(rng.uniform(0, 100), 2)
+        docs.append(doc)
+    _write(os.path.join(tool_dir, "json", "metrics.json"), json.dumps(docs))
+
+
+_tool_generators = {
+    "iostat": _gen_iostat,
+    "mpstat": _gen_mpstat,
+    "pidstat": _gen_pidstat,
+    "proc-vmstat": _gen_proc_vmstat,
+    "prometheus-metrics": _gen_prometheus_metrics,
+    "vmstat": _gen_vmstat,
+}
+
+
+def _metadata_log(shape, controller):
+    hosts = shape.host_names
+    lines = [
+        "[pbench]",
+        f"name = {shape.name}",
+        "script = fio",
+        "config = synthetic",
+        f"date = {_START_RUN.strftime('%Y-%m-%dT%H:%M:%S')}",
+        "rpm-version = 0.69.0-1",
+        f"iterations = {', '.join(shape.iteration_names)}",
+        "",
+        "[tools]",
+        f"hosts = {' '.join(hosts)}",
+        "group = default",
+        "",
+    ]
+    for host in hosts:
+        lines.append(f"[tools/{host}]")
+        lines.extend(f"{tool} = --interval={_INTERVAL:d}" for tool in shape.tools)
+        lines.append("")
+    lines.extend(
+        [
+            "[run]",
+            f"controller = {controller}.example.com",
+            f"start_run = {_START_RUN.strftime('%Y-%m-%dT%H:%M:%S.%f')}",
+            f"end_run = {shape.end_run.strftime('%Y-%m-%dT%H:%M:%S.%f')}",
+            "",
+        ]
+    )
+    return "\n".join(lines)
+
+
+def _result_json(shape, rng):
+    """Return the top-level result.json of the run, with the throughput of
+    each host for each sample of each iteration.
+    """
+    results = []
+    for i in range(shape.iterations):
+        throughput = []
+        for host in shape.host_names:
+            samples = []
+            for s in range(shape.samples):
+                timeseries = [
+                    dict(date=int(ts * 1000), value=round(rng.uniform(0, 1e5), 2))
+                    for ts in shape.sample_window(i, s)
+                ]
+                samples.append(
+                    dict(
+                        value=round(
+                            sum(e["value"] for e in timeseries)
+                            / max(len(timeseries), 1),
+                            2,
+                        ),
+                        timeseries=timeseries,
+                    )
+                )
+            throughput.append(
+                {
+                    "client_hostname": host,
+                    "closest sample": 1,
+                    "description": "Synthetic I/O operations per second",
+                    "mean": samples[0]["value"] if samples else 0,
+                    "role": "client",
+                    "samples": samples,
+                    "stddev": 0,
+                    "stddevpct": 0,
+                    "uid": "client_hostname:%client_hostname%",
+                }
+            )
+        results.append(
+            dict(
+                iteration_name="synthetic",
+                iteration_number=i + 1,
+                iteration_data=dict(
+                    parameters=dict(
+                        benchmark=[
+                            dict(
+                                benchmark_name="fio",
+                                benchmark_version="3.19",
+                                primary_metric="iops_sec",
+                                uid=(
+                                    "benchmark_name:%benchmark_name%"
+                                    "-controller_host:%controller_host%"
+                                ),
+                            )
+                        ]
+                    ),
+                    throughput=dict(iops_sec=throughput),
+                ),
+            )
+        )
+    return json.dumps(results, indent=4)
+
+
+def _sosreport(path, host, index):
+    """Write a minimal sosreport of the given host, with the host name and IP
+    address files the indexer reads, and its .md5 file.
+    """
+    top = os.path.basename(path)[: -len(".tar.xz")]
+    contents = {
+        "sos_commands/general/hostname": f"{host}\n",
+        "sos_commands/general/hostname_-f": f"{host}.example.com\n",
+        "sos_commands/networking/ip_-o_addr": (
+            "1: lo    inet 127.0.0.1/8 scope host lo\\"
+            "       valid_lft forever preferred_lft forever\n"
+            f"2: eth0    inet 10.0.{index // 250:d}.{index % 250 + 1:d}/16"
+            " scope global eth0\\       valid_lft forever preferred_lft forever\n"
+        ),
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tarfile.open(path, "w:xz") as tf:
+        for name, data in sorted(contents.items()):
+            data = data.encode("utf-8")
+            info = tarfile.TarInfo(f"{top}/{name}")
+            info.size = len(data)
+            info.mtime = _START_TS
+            tf.addfile(info, io.BytesIO(data))
+    _write(f"{path}.md5", f"{_md5(path)}\n")
+
+
+def _md5(path):
+    md5 = hashlib.md5()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def make_tarball(shape, workdir, controller="bench-ctlr"):
+    """Generate a result tar ball of the given shape under `workdir`, the way
+    the server holds it once unpacked: the tar ball and its .md5 file in the
+    controller directory of the archive, with its UNPACKED link, and its
+    contents extracted in the incoming hierarchy.
+
+    Returns the path of the tar ball and of the directory where its contents
+    were extracted, as expected by the PbenchTarBall constructor.
+    """
+    rng = random.Random(shape.seed)
+    controller_dir = os.path.join(workdir, "archive", controller)
+    extracted_root = os.path.join(workdir, "incoming", controller)
+    top = os.path.join(extracted_root, shape.name)
+
+    _write(os.path.join(top, "metadata.log"), _metadata_log(shape, controller))
+    _write(os.path.join(top, "result.json"), _result_json(shape, rng))
+    for i, iteration in enumerate(shape.iteration_names):
+        for s, sample in enumerate(shape.sample_names):
+            sample_dir = os.path.join(top, iteration, sample)
+            timestamps = shape.sample_window(i, s)
+            for host in shape.host_names:
+                for tool in shape.tools:
+                    _tool_generators[tool](
+                        os.path.join(sample_dir, "tools-default", host, tool),
+                        shape,
+                        timestamps,
+                        rng,
+                    )
+    hosts = shape.host_names
+    for n in range(shape.sosreports):
+        host = hosts[n % len(hosts)] if hosts else f"host-{n:d}"
+        _sosreport(
+            os.path.join(
+                top,
+                "sysinfo",
+                "end",
+                host,
+                f"sosreport-{host}.example.com-pbench-{n:04d}.tar.xz",
+            ),
+            host,
+            n,
+        )
+    for n in range(shape.files):
+        _write(
+            os.path.join(top, "files", f"{n // 100:03d}", f"file-{n:05d}.txt"),
+            f"{n:d}\n",
+        )
+
+    os.makedirs(controller_dir)
+    tb = os.path.join(controller_dir, f"{shape.name}.tar.xz")
+    with tarfile.open(tb, "w:xz", preset=1) as tf:
+        tf.add(top, arcname=shape.name)
+    _write(f"{tb}.md5", f"{_md5(tb)}  {os.path.basename(tb)}\n")
+    unpacked = os.path.join(controller_dir, "UNPACKED")
+    os.makedirs(unpacked)
+    os.symlink(
+        os.path.join("..", os.path.basename(tb)),
+        os.path.join(unpacked, os.path.basename(tb)),
+    )
+    return tb, extracted_root
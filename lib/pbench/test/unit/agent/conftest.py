@@ -1,3 +1,4 @@
+import json
 import shutil
 import tempfile
 import pytest
@@ -75,3 +76,38 @@ def invalid_config(pytestconfig):
 def agent_config_env(pytestconfig, monkeypatch):
     cfg_file = pytestconfig.cache.get("_PBENCH_AGENT_CONFIG", None)
     monkeypatch.setenv("_PBENCH_AGENT_CONFIG", cfg_file)
+
+
+class FakePubSub:
+    def subscribe(self, channel):
+        self.channel = channel
+
+    def listen(self):
+        yield dict(
+            type="subscribe", pattern=None, channel=self.channel.encode("utf-8"), data=1
+        )
+
+
+class FakeRedis:
+    """Just enough of a Redis server for a Tool Data Sink or a Tool Meister,
+    holding the given keys, and recording the messages published.
+    """
+
+    def __init__(self, keys=None):
+        self.keys = {key: value.encode("utf-8") for key, value in (keys or {}).items()}
+        self.published = []
+
+    def get(self, key):
+        return self.keys.get(key)
+
+    def pubsub(self):
+        return FakePubSub()
+
+    def publish(self, channel, msg):
+        self.published.append((channel, json.loads(msg)))
+        return 1
+
+
+@pytest.fixture
+def make_redis():
+    return FakeRedis
@@ -0,0 +1,480 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import pytest
+import requests
+import shutil
+import socket
+
+from threading import BoundedSemaphore, Event, Thread
+from types import SimpleNamespace
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+import pbench.agent.tool_data_sink as tool_data_sink
+import pbench.agent.tool_meister as tool_meister
+from pbench.agent.tool_data_sink import (
+    _MAX_CHUNK_LINE,
+    ThreadingWSGIServer,
+    ToolDataSink,
+    _detect_compression,
+    _read_chunked,
+)
+from pbench.agent.tool_meister import TarStream, ToolMeister, client_channel
+
+
+def _chunked(body):
+    return b"".join(_read_chunked(io.BytesIO(body)))
+
+
+class TestReadChunked:
+    @staticmethod
+    def test_chunks():
+        body = b"5\r\nhello\r\n7;ext=1\r\n, world\r\n0\r\n\r\n"
+        assert _chunked(body) == b"hello, world"
+
+    @staticmethod
+    def test_large_chunk():
+        data = bytes(range(256)) * 1024
+        body = b"%x\r\n%s\r\n0\r\n\r\n" % (len(data), data)
+        assert _chunked(body) == data
+
+    @staticmethod
+    def test_trailers():
+        body = b"3\r\nabc\r\n0\r\nExpires: never\r\nX-Extra: 1\r\n\r\n"
+        assert _chunked(body) == b"abc"
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "body",
+        [
+            b"\r\n",
+            b"xyz\r\n",
+            b"-5\r\nhello\r\n0\r\n\r\n",
+            b"0x5\r\nhello\r\n0\r\n\r\n",
+            b"+5\r\nhello\r\n0\r\n\r\n",
+            b";ext=1\r\n",
+        ],
+    )
+    def test_malformed_size(body):
+        with pytest.raises(ValueError, match="malformed chunk size line"):
+            _chunked(body)
+
+    @staticmethod
+    def test_missing_terminator():
+        with pytest.raises(ValueError, match="missing chunk terminator"):
+            _chunked(b"3\r\nabcdef\r\n0\r\n\r\n")
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "body, error",
+        [
+            (b"", "truncated chunk size line"),
+            (b"5", "truncated chunk size line"),
+            (b"5\r\nhel", "truncated chunk"),
+            (b"5\r\nhello\r\n", "truncated chunk size line"),
+            (b"5\r\nhello\r\n0\r\n", "truncated trailer"),
+            (b"5\r\nhello\r\n0\r\nExpires: never\r\n", "truncated trailer"),
+        ],
+    )
+    def test_truncated(body, error):
+        with pytest.raises(ValueError, match=error):
+            _chunked(body)
+
+    @staticmethod
+    def test_oversized_lines():
+        size_line = b"5;" + b"x" * _MAX_CHUNK_LINE + b"\r\nhello\r\n0\r\n\r\n"
+        with pytest.raises(ValueError, match="chunk size line too long"):
+            _chunked(size_line)
+        trailer = b"0\r\nX-Long: " + b"x" * _MAX_CHUNK_LINE + b"\r\n\r\n"
+        with pytest.raises(ValueError, match="trailer line too long"):
+            _chunked(trailer)
+
+
+class TestDetectCompression:
+    @staticmethod
+    @pytest.mark.parametrize(
+        "head, suffix, tar_opts",
+        [
+            (b"\xfd7zXZ\x00\x00\x04", ".tar.xz", ["-J"]),
+            (b"\x28\xb5\x2f\xfd\x04\x58", ".tar.zst", ["-I", "zstd"]),
+            (b"\x04\x22\x4d\x18\x64\x40", ".tar.lz4", ["-I", "lz4"]),
+            (b"\x1f\x8b\x08\x00", ".tar.gz", ["-z"]),
+            (b"BZh91AY&SY", ".tar.bz2", ["-j"]),
+            (b"tool-data/\x00\x00\x00", ".tar", []),
+            # Too short to hold any of the magic numbers.
+            (b"\xfd7z", ".tar", []),
+        ],
+    )
+    def test_magic(head, suffix, tar_opts):
+        assert _detect_compression(head) == (suffix, tar_opts)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class TestThreadingWSGIServer:
+    @staticmethod
+    def test_shutdown_with_busy_slots():
+        release = Event()
+        handled = []
+
+        def app(environ, start_response):
+            handled.append(environ["PATH_INFO"])
+            release.wait(10)
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return [b"done"]
+
+        server = make_server(
+            "localhost",
+            0,
+            app,
+            server_class=ThreadingWSGIServer,
+            handler_class=QuietHandler,
+        )
+        server.slots = BoundedSemaphore(1)
+        serving = Thread(target=server.serve_forever, kwargs=dict(poll_interval=0.05))
+        serving.start()
+        clients = []
+        try:
+            # The first request takes the only slot, the second one waits for
+            # it, and neither holds up the shutdown of the server.
+            for path in ("/first", "/second"):
+                client = socket.create_connection(server.server_address)
+                client.sendall(f"GET {path} HTTP/1.0\r\n\r\n".encode())
+                clients.append(client)
+            while not handled:
+                serving.join(0.01)
+            shutdown = Thread(target=server.shutdown)
+            shutdown.start()
+            shutdown.join(5)
+            assert not shutdown.is_alive(), "shutdown() blocked by busy slots"
+            assert handled == ["/first"]
+        finally:
+            release.set()
+            serving.join(5)
+            for client in clients:
+                client.close()
+            server.server_close()
+
+
+_tool_metadata = dict(
+    persistent={"node-exporter": dict(collector="prometheus")},
+    transient={"iostat": {}, "mpstat": {}},
+)
+
+
+def _redis_keys(hosts):
+    """The keys of the Redis server of a Tool Data Sink running on the
+    "controller" host, with a Tool Meister running iostat on each of the
+    given hosts.
+    """
+    pids = dict(
+        ds=dict(kind="ds", hostname="controller", pid=os.getpid()),
+        tm=[
+            dict(kind="tm", hostname=host, pid=1000 + i) for i, host in enumerate(hosts)
+        ],
+    )
+    keys = {"tool-metadata": json.dumps(_tool_metadata), "tm-pids": json.dumps(pids)}
+    for host in hosts:
+        keys[f"tm-default-{host}"] = json.dumps(dict(tools=dict(iostat="--interval=3")))
+    return keys
+
+
+@pytest.fixture
+def make_sink(tmp_path, monkeypatch, make_redis):
+    """Make a Tool Data Sink on the "controller" host, for the Tool Meisters
+    on the given hosts, serving its PUT requests one at a time on a free
+    port, to which the URLs of the Tool Meisters are redirected.
+    """
+    monkeypatch.setenv("_pbench_full_hostname", "controller")
+    monkeypatch.setattr(tool_data_sink, "tar_path", shutil.which("tar"))
+    run_dir = tmp_path / "run"
+    (run_dir / "tools-default").mkdir(parents=True)
+    servers = []
+
+    def make(hosts, concurrency=1):
+        sink = ToolDataSink(
+            "localhost",
+            make_redis(_redis_keys(hosts)),
+            "tool-data-sink",
+            run_dir,
+            "default",
+            logging.getLogger("test_tool_data_sink"),
+            concurrency=concurrency,
+        )
+        server = make_server("localhost", 0, sink, handler_class=QuietHandler)
+        serving = Thread(target=server.serve_forever, kwargs=dict(poll_interval=0.05))
+        serving.start()
+        servers.append((sink, server, serving))
+        port = server.server_address[1]
+
+        def put(url, **kwargs):
+            return requests.put(url.replace(":8080/", f":{port}/"), **kwargs)
+
+        monkeypatch.setattr(
+            tool_meister,
+            "requests",
+            SimpleNamespace(put=put, exceptions=requests.exceptions),
+        )
+        return sink, port
+
+    yield make
+    for sink, server, serving in servers:
+        server.shutdown()
+        serving.join()
+        server.server_close()
+        if sink._unpackers is not None:
+            sink._unpackers.shutdown()
+
+
+def _expect_data(sink, directory):
+    """Put the sink in the "send" state for the given directory, as
+    state_change() does, without waiting for the data.
+    """
+    with sink._lock:
+        sink.state = "send"
+        sink.directory = directory
+        sink.data_ctx = hashlib.md5(str(directory).encode("utf-8")).hexdigest()
+        sink._tm_tracking = sink._fetch_tms()
+        sink._change_tm_tracking("dormant", "waiting")
+
+
+def _served(port):
+    """Return once the requests sent before to the sink, served one at a
+    time, have been handled.
+    """
+    assert requests.get(f"http://localhost:{port}/").status_code == 404
+
+
+def _tool_meister(tmp_path, monkeypatch, make_redis, hostname, directory, **params):
+    """Make a Tool Meister on the given host, with the iostat data it
+    collected for the given directory ready to be sent.
+    """
+    monkeypatch.setenv("pbench_tmp", str(tmp_path))
+    params = dict(
+        benchmark_run_dir=str(tmp_path / "run"),
+        channel="tool-meister-chan",
+        controller="localhost",
+        group="default",
+        hostname=hostname,
+        tools=dict(iostat="--interval=3"),
+        **params,
+    )
+    tm = ToolMeister(
+        "/opt/pbench-agent",
+        shutil.which("tar"),
+        None,
+        params,
+        make_redis({"tool-metadata": json.dumps(_tool_metadata)}),
+        logging.getLogger("test_tool_meister"),
+    )
+    tool_dir = tmp_path / f"tm-{hostname}" / "tools-default" / hostname
+    (tool_dir / "iostat").mkdir(parents=True)
+    for n in range(3):
+        (tool_dir / "iostat" / f"iostat-{n}.txt").write_text(f"{hostname} {n}\n" * 1000)
+    tm.state = "idle"
+    tm.directories[str(directory)] = tool_dir
+    return tm, tool_dir
+
+
+def _tm_status(tm):
+    statuses = [
+        msg["status"] for channel, msg in tm._rs.published if channel == client_channel
+    ]
+    assert len(statuses) == 1
+    return statuses[0]
+
+
+def _staged(directory):
+    return sorted(p.name for p in directory.glob(".host-a.*"))
+
+
+class TestPutStream:
+    @staticmethod
+    def test_stream(tmp_path, monkeypatch, make_redis, make_sink):
+        sink, port = make_sink(["host-a"])
+        directory = tmp_path / "run" / "tools-default"
+        _expect_data(sink, directory)
+        tm, tool_dir = _tool_meister(
+            tmp_path, monkeypatch, make_redis, "host-a", directory, streaming=True
+        )
+        sent = tool_meister.requests.put
+        staged = []
+
+        def put(url, **kwargs):
+            if url.endswith("/md5sum"):
+                # The data streamed is only moved into place once its MD5 sum
+                # is verified.
+                staged.append((_staged(directory), (directory / "host-a").exists()))
+            return sent(url, **kwargs)
+
+        monkeypatch.setattr(tool_meister.requests, "put", put)
+        assert tm.send_tools(dict(directory=str(directory))) == 0
+        assert _tm_status(tm) == "success"
+        assert len(staged) == 1
+        staging_dirs, moved = staged[0]
+        assert len(staging_dirs) == 1 and not moved
+        assert _staged(directory) == []
+        assert sorted(p.name for p in (directory / "host-a" / "iostat").iterdir()) == [
+            "iostat-0.txt",
+            "iostat-1.txt",
+            "iostat-2.txt",
+        ]
+        assert not (directory / "host-a.tar.out").exists()
+        assert sink._streamed == {}
+        assert sink._tm_tracking["host-a"]["posted"] == "dormant"
+        # The Tool Meister removes its copy of the data sent.
+        assert not tool_dir.parent.exists()
+
+    @staticmethod
+    def test_md5_mismatch(tmp_path, monkeypatch, make_redis, make_sink):
+        sink, port = make_sink(["host-a"])
+        directory = tmp_path / "run" / "tools-default"
+        _expect_data(sink, directory)
+        tm, tool_dir = _tool_meister(
+            tmp_path, monkeypatch, make_redis, "host-a", directory, streaming=True
+        )
+        url = f"http://localhost:{port}/tool-data/{sink.data_ctx}/host-a"
+        with (tmp_path / "tar.err").open("w") as efp:
+            tar_stream = TarStream(tm._tar_command(tool_dir, "-"), tool_dir.parent, efp)
+            response = requests.put(url, data=tar_stream)
+        assert response.status_code == 200, response.text
+        assert len(_staged(directory)) == 1
+        assert sink._streamed["host-a"][1] == tar_stream.md5
+        response = requests.put(f"{url}/md5sum", headers={"md5sum": "0" * 32})
+        assert response.status_code == 400
+        assert "does not match its MD5SUM" in response.text
+        assert _staged(directory) == []
+        assert not (directory / "host-a").exists()
+        assert sink._streamed == {}
+        # The sink still waits for the data of that host.
+        assert sink._tm_tracking["host-a"]["posted"] == "waiting"
+
+    @staticmethod
+    def test_already_uploaded(tmp_path, monkeypatch, make_redis, make_sink):
+        sink, port = make_sink(["host-a"])
+        directory = tmp_path / "run" / "tools-default"
+        _expect_data(sink, directory)
+        (directory / "host-a").mkdir()
+        tm, tool_dir = _tool_meister(
+            tmp_path, monkeypatch, make_redis, "host-a", directory, streaming=True
+        )
+        assert tm.send_tools(dict(directory=str(directory))) == 1
+        assert _tm_status(tm) == "1 failures sending tool data"
+        assert list((directory / "host-a").iterdir()) == []
+        assert _staged(directory) == []
+        assert sink._tm_tracking["host-a"]["posted"] == "waiting"
+        # The Tool Meister keeps the data it failed to send.
+        assert tm.directories == {str(directory): tool_dir}
+        assert (tool_dir / "iostat" / "iostat-0.txt").exists()
+
+    @staticmethod
+    def test_tar_failure(tmp_path, monkeypatch, make_redis, make_sink):
+        sink, port = make_sink(["host-a"])
+        directory = tmp_path / "run" / "tools-default"
+        _expect_data(sink, directory)
+        tm, tool_dir = _tool_meister(
+            tmp_path, monkeypatch, make_redis, "host-a", directory, streaming=True
+        )
+        tar_command = tm._tar_command
+
+        def failing_tar_command(directory, archive):
+            # The tar command fails on a missing file after writing the
+            # directory to the stream.
+            return tar_command(directory, archive) + ["missing"]
+
+        monkeypatch.setattr(tm, "_tar_command", failing_tar_command)
+        assert tm.send_tools(dict(directory=str(directory))) == 1
+        assert _tm_status(tm) == "1 failures sending tool data"
+        _served(port)
+        assert _staged(directory) == []
+        assert not (directory / "host-a").exists()
+        assert sink._streamed == {}
+        assert sink._tm_tracking["host-a"]["posted"] == "waiting"
+        assert (tool_dir / "iostat" / "iostat-0.txt").exists()
+
+
+def _state_change(sink, action, directory):
+    """Run the state change of the sink in its own thread, as the "watcher"
+    thread does, returning that thread once the sink waits for the data of
+    the Tool Meisters.
+    """
+    changing = Thread(
+        target=sink.state_change,
+        args=(dict(action=action, group="default", directory=str(directory)),),
+        daemon=True,
+    )
+    changing.start()
+    for _ in range(1000):
+        with sink._lock:
+            if sink._tm_tracking is not None and all(
+                tm["posted"] in (None, "waiting") for tm in sink._tm_tracking.values()
+            ):
+                break
+        changing.join(0.01)
+    return changing
+
+
+def _ds_statuses(sink):
+    return [
+        msg["status"]
+        for channel, msg in sink.redis_server.published
+        if channel == tool_data_sink.client_channel
+    ]
+
+
+class TestStateChange:
+    @staticmethod
+    def test_stop_and_send(tmp_path, monkeypatch, make_redis, make_sink):
+        sink, port = make_sink(["controller", "host-a", "host-b"])
+        directory = tmp_path / "run" / "tools-default"
+        tms = [
+            _tool_meister(
+                tmp_path, monkeypatch, make_redis, "host-a", directory, streaming=True
+            )[0],
+            _tool_meister(tmp_path, monkeypatch, make_redis, "host-b", directory)[0],
+        ]
+        changing = _state_change(sink, "stop-and-send", directory)
+        try:
+            # The Tool Meister on the controller sends nothing.
+            assert sink._tm_tracking["controller"]["posted"] is None
+            assert tms[0].send_tools(dict(directory=str(directory))) == 0
+            changing.join(0.2)
+            assert changing.is_alive(), "state change did not wait for host-b"
+            assert _ds_statuses(sink) == []
+            assert tms[1].send_tools(dict(directory=str(directory))) == 0
+        finally:
+            changing.join(10)
+        assert not changing.is_alive()
+        assert _ds_statuses(sink) == ["success"]
+        for host in ("host-a", "host-b"):
+            assert (directory / host / "iostat" / "iostat-0.txt").exists()
+
+    @staticmethod
+    def test_pooled_unpack_failure(tmp_path, monkeypatch, make_redis, make_sink):
+        sink, port = make_sink(["host-a", "host-b"], concurrency=2)
+        directory = tmp_path / "run" / "tools-default"
+        tm = _tool_meister(tmp_path, monkeypatch, make_redis, "host-b", directory)[0]
+        changing = _state_change(sink, "send", directory)
+        try:
+            # An xz compressed tar ball which cannot be unpacked.
+            body = b"\xfd7zXZ\x00\x00\x04" + b"not a tar ball" * 100
+            url = f"http://localhost:{port}/tool-data/{sink.data_ctx}/host-a"
+            headers = {"md5sum": hashlib.md5(body).hexdigest()}
+            # The tar ball is received before it is unpacked.
+            assert requests.put(url, data=body, headers=headers).status_code == 200
+            assert tm.send_tools(dict(directory=str(directory))) == 0
+        finally:
+            changing.join(10)
+        assert not changing.is_alive()
+        assert _ds_statuses(sink) == ["failed to unpack data from host-a"]
+        assert (directory / "host-a.tar.xz").read_bytes() == body
+        assert (directory / "host-a.tar.xz.md5").exists()
+        assert not (directory / "host-a").exists()
+        assert (directory / "host-b" / "iostat" / "iostat-0.txt").exists()
+        assert not (directory / "host-b.tar.xz").exists()
+        assert sink._unpack_failures == []
@@ -0,0 +1,337 @@
+import hashlib
+import logging
+import os
+import pytest
+
+from types import SimpleNamespace
+
+import pbench.agent.tool_meister as tool_meister
+from pbench.agent.tool_meister import (
+    Tool,
+    ToolException,
+    ToolMeister,
+    compression_engines,
+    compression_level,
+)
+
+MiB = 1024 * 1024
+
+
+class TestCompressionLevel:
+    @staticmethod
+    @pytest.mark.parametrize(
+        "size, cpus, level",
+        [
+            (0, 1, 6),
+            (32 * MiB, 1, 6),
+            (32 * MiB + 1, 1, 3),
+            # The payload is spread over the CPUs.
+            (64 * MiB, 2, 6),
+            (256 * MiB, 1, 3),
+            (256 * MiB + 1, 1, 1),
+            (1024 * MiB, 4, 3),
+            (1024 * MiB, 2, 1),
+        ],
+    )
+    def test_xz(size, cpus, level):
+        levels = compression_engines["xz"]["levels"]
+        assert compression_level(levels, size, cpus) == level
+
+    @staticmethod
+    def test_engines():
+        levels = {
+            name: compression_level(engine["levels"], 512 * MiB, 1)
+            for name, engine in compression_engines.items()
+            if engine["levels"] is not None
+        }
+        assert levels == {"xz": 1, "zstd": 3, "lz4": 1}
+
+
+class FakeClock:
+    """Stands in for the time module, sleeping by advancing the clock, and
+    running the callbacks scheduled for the times it passes.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.events = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.now = round(self.now + secs, 6)
+        due = [(when, cb) for when, cb in self.events if when <= self.now]
+        self.events = [(when, cb) for when, cb in self.events if when > self.now]
+        for _, cb in sorted(due, key=lambda event: event[0]):
+            cb()
+
+    def at(self, when, cb):
+        self.events.append((when, cb))
+
+
+class FakeProcess:
+    """A tool process exiting at the time returned by `exit_at`, never while
+    it returns None.
+    """
+
+    def __init__(self, clock, exit_at):
+        self.clock = clock
+        self.exit_at = exit_at
+
+    def poll(self):
+        when = self.exit_at()
+        return 0 if when is not None and self.clock.now >= when else None
+
+    def wait(self):
+        when = self.exit_at()
+        assert when is not None, "waiting on a process which never exits"
+        self.clock.now = max(self.clock.now, when)
+        return 0
+
+
+class FakeTools:
+    """Fake tool scripts: a tool's "--stop" process exits right away, its
+    "--start" process `latency` seconds after the "--stop" one was run, and
+    running the "--stop" operation of the tools in `broken` fails.
+    """
+
+    def __init__(self, clock, latency, broken=()):
+        self.clock = clock
+        self.latency = latency
+        self.broken = broken
+        self.stopped_at = {}
+
+    def popen(self, args, stdin, stdout, stderr):
+        script, operation = args[0], args[1]
+        name = os.path.basename(script)
+        if operation == "--start":
+            return FakeProcess(self.clock, lambda: self._start_exit(name))
+        assert operation == "--stop"
+        if name in self.broken:
+            raise OSError(f"cannot run {script}")
+        self.stopped_at[name] = when = self.clock.now
+        return FakeProcess(self.clock, lambda: when)
+
+    def _start_exit(self, name):
+        when = self.stopped_at.get(name)
+        return None if when is None else when + self.latency[name]
+
+
+@pytest.fixture
+def fake_tools(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(
+        tool_meister,
+        "time",
+        SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep),
+    )
+
+    def make(latency, broken=()):
+        tools = FakeTools(clock, latency, broken)
+        monkeypatch.setattr(tool_meister.subprocess, "Popen", tools.popen)
+        return tools
+
+    return clock, make
+
+
+def _pid_file(tool_dir, name):
+    pid_file = tool_dir / name / f"{name}.pid"
+    pid_file.parent.mkdir(exist_ok=True)
+    pid_file.write_text("1234\n")
+
+
+def _tool_meister(tmp_path, names, redis, directory="/var/lib/pbench-agent/run-1"):
+    """A ToolMeister with the given tools started in a tool directory under
+    tmp_path, publishing to the given fake Redis server.
+    """
+    tool_dir = tmp_path / "tools-default" / "tm-host"
+    tool_dir.mkdir(parents=True)
+    logger = logging.getLogger("test_tool_meister")
+    tm = object.__new__(ToolMeister)
+    tm.logger = logger
+    tm._hostname = "tm-host"
+    tm._rs = redis
+    tm._tools = {name: "--interval=1" for name in names}
+    tm.persist_tools = []
+    tm._running_tools = {}
+    for name in names:
+        tool = Tool(
+            name, "default", "--interval=1", "/opt/pbench-agent", tool_dir, logger
+        )
+        tool.start()
+        tm._running_tools[name] = tool
+    tm._directory = directory
+    tm._tool_dir = tool_dir
+    tm.directories = {}
+    return tm
+
+
+class TestTool:
+    @staticmethod
+    def test_poll(tmp_path, fake_tools):
+        clock, make = fake_tools
+        make(dict(iostat=0.3))
+        tool = Tool(
+            "iostat", "default", "--interval=1", "/opt", tmp_path, logging.getLogger()
+        )
+        tool.start()
+        assert not tool.poll(), "polled a tool not stopped"
+        clock.sleep(1)
+        tool.stop()
+        assert not tool.poll(), "start process exited with the stop process"
+        clock.sleep(0.2)
+        assert not tool.poll()
+        clock.sleep(0.2)
+        assert tool.poll()
+        # When the tool was first found to have stopped is kept.
+        clock.sleep(5)
+        assert tool.poll()
+        tool.wait()
+        assert tool.stopped == 1.4
+        assert tool.start_process is None and tool.stop_process is None
+
+    @staticmethod
+    def test_wait_without_poll(tmp_path, fake_tools):
+        clock, make = fake_tools
+        make(dict(iostat=0.3))
+        tool = Tool(
+            "iostat", "default", "--interval=1", "/opt", tmp_path, logging.getLogger()
+        )
+        tool.start()
+        with pytest.raises(ToolException, match="wait not called after 'stop'"):
+            tool.wait()
+        tool.stop()
+        tool.wait()
+        assert tool.stopped == 0.3
+
+
+class TestStopTools:
+    @staticmethod
+    def _stop(tm):
+        directory = tm._directory
+        tool_dir = tm._tool_dir
+        failures = tm.stop_tools(dict(directory=directory))
+        assert tm._running_tools == {}
+        assert tm.directories == {directory: tool_dir}
+        assert len(tm._rs.published) == 1
+        channel, msg = tm._rs.published[0]
+        assert channel == tool_meister.client_channel
+        return failures, msg
+
+    @staticmethod
+    def test_late_pid_file(tmp_path, fake_tools, make_redis):
+        clock, make = fake_tools
+        tools = make(dict(iostat=0.5, mpstat=0.3, vmstat=1.0))
+        tm = _tool_meister(tmp_path, ["iostat", "mpstat", "vmstat"], make_redis())
+        _pid_file(tm._tool_dir, "iostat")
+        _pid_file(tm._tool_dir, "vmstat")
+        clock.at(2.0, lambda: _pid_file(tm._tool_dir, "mpstat"))
+        failures, msg = TestStopTools._stop(tm)
+        assert failures == 0
+        # The tools whose pid files are there are stopped right away, and
+        # their latencies are not held up by the late one.
+        assert tools.stopped_at == dict(iostat=0.0, mpstat=2.0, vmstat=0.0)
+        assert msg == dict(
+            kind="tm",
+            hostname="tm-host",
+            status="success",
+            stop_latency=dict(iostat=0.5, mpstat=2.3, vmstat=1.0),
+        )
+
+    @staticmethod
+    def test_pid_file_deadline(tmp_path, fake_tools, make_redis, caplog):
+        clock, make = fake_tools
+        tools = make(dict(iostat=0.5, mpstat=0.5, vmstat=0.5))
+        tm = _tool_meister(tmp_path, ["iostat", "mpstat", "vmstat"], make_redis())
+        _pid_file(tm._tool_dir, "vmstat")
+        failures, msg = TestStopTools._stop(tm)
+        assert failures == 0
+        # The tools without pid files share a single deadline.
+        wait = float(tool_meister._PID_FILE_WAIT)
+        assert tools.stopped_at == dict(iostat=wait, mpstat=wait, vmstat=0.0)
+        assert msg["stop_latency"] == dict(
+            iostat=wait + 0.5, mpstat=wait + 0.5, vmstat=0.5
+        )
+        missing = [r.getMessage() for r in caplog.records if "does not exist" in r.msg]
+        assert len(missing) == 2
+        assert "Tool(iostat) pid file" in missing[0]
+        assert "Tool(mpstat) pid file" in missing[1]
+
+    @staticmethod
+    def test_stop_raises(tmp_path, fake_tools, make_redis):
+        clock, make = fake_tools
+        tools = make(dict(iostat=0.5, mpstat=0.5, vmstat=0.5), broken={"mpstat"})
+        tm = _tool_meister(tmp_path, ["iostat", "mpstat", "vmstat"], make_redis())
+        for name in ("iostat", "mpstat", "vmstat"):
+            _pid_file(tm._tool_dir, name)
+        failures, msg = TestStopTools._stop(tm)
+        # The failed tool is counted both when stopped and when waited on.
+        assert failures == 2
+        assert tools.stopped_at == dict(iostat=0.0, vmstat=0.0)
+        assert msg == dict(
+            kind="tm",
+            hostname="tm-host",
+            status="2 of 3 failed stopping tools",
+            stop_latency=dict(iostat=0.5, vmstat=0.5),
+        )
+
+    @staticmethod
+    def test_other_directory(tmp_path, fake_tools, make_redis):
+        clock, make = fake_tools
+        make(dict(iostat=0.5))
+        tm = _tool_meister(tmp_path, ["iostat"], make_redis())
+        assert tm.stop_tools(dict(directory="/var/lib/pbench-agent/run-2")) is False
+        assert list(tm._running_tools) == ["iostat"]
+        assert tm._rs.published == []
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "broken, send_failures, failures, status",
+        [
+            ((), 0, 0, "success"),
+            ((), 1, 1, "1 failures sending tool data"),
+            (("mpstat",), 0, 2, "2 of 3 failed stopping tools"),
+            (("mpstat",), 1, 3, "2 of 3 failed stopping tools"),
+        ],
+    )
+    def test_stop_and_send(
+        tmp_path, fake_tools, make_redis, broken, send_failures, failures, status
+    ):
+        clock, make = fake_tools
+        make(dict(iostat=0.5, mpstat=0.5, vmstat=0.5), broken=broken)
+        tm = _tool_meister(tmp_path, ["iostat", "mpstat", "vmstat"], make_redis())
+        for name in ("iostat", "mpstat", "vmstat"):
+            _pid_file(tm._tool_dir, name)
+        tm.state = "idle"
+        tm._controller = "controller"
+        directory = tm._directory
+        tool_dir = tm._tool_dir
+        sent = []
+
+        def send_directory(directory, uri, ctx):
+            sent.append((directory, uri, ctx))
+            return send_failures
+
+        tm._send_directory = send_directory
+        assert tm.stop_and_send_tools(dict(directory=directory)) == failures
+        # The data collected is sent even when tools failed to stop.
+        ctx = hashlib.md5(directory.encode("utf-8")).hexdigest()
+        assert sent == [(tool_dir, "tool-data", ctx)]
+        stop_latency = {
+            name: 0.5 for name in ("iostat", "mpstat", "vmstat") if name not in broken
+        }
+        assert tm._rs.published == [
+            (
+                tool_meister.client_channel,
+                dict(
+                    kind="tm",
+                    hostname="tm-host",
+                    status=status,
+                    stop_latency=stop_latency,
+                ),
+            )
+        ]
+        assert tm._running_tools == {}
+        # The data which failed to be sent is kept for another "send".
+        assert tm.directories == ({directory: tool_dir} if send_failures else {})
@@ -1,8 +1,25 @@
+import hashlib
+import json
+import logging
+import os
+import random
 import shutil
+import tarfile
 import tempfile
+import threading
+import time
 import pytest
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from types import SimpleNamespace
+from elasticsearch.serializer import JSONSerializer
+from pbench.common.logger import _StyleAdapter
 from pbench.server.api import create_app, get_server_config
+from pbench.server.indexer import (
+    OpenFileBudget,
+    PbenchTemplates,
+    _known_tool_handlers,
+)
 
 
 server_cfg_tmpl = """[DEFAULT]
@@ -99,3 +116,341 @@ def client(server_config):
     app_client.debug = True
     app_client.testing = True
     return app_client
+
+
+# The index mappings and settings live in the source tree.
+SERVER_DIR = Path(__file__).resolve().parents[5] / "server"
+
+
+class FakeIdxContext:
+    """The subset of the indexing context, IdxContext, needed to open result
+    tar balls and generate their indexing actions, without any configuration
+    or Elasticsearch instance.
+    """
+
+    def __init__(
+        self,
+        manifests=False,
+        sosreport_workers=1,
+        tool_data_workers=1,
+        tool_data_open_files=64,
+        collect_stats=False,
+    ):
+        self.name = "pbench-unit-test"
+        self.manifests = manifests
+        self.sosreport_workers = sosreport_workers
+        self.tool_data_workers = tool_data_workers
+        self.tool_data_open_files = OpenFileBudget(tool_data_open_files)
+        self.collect_stats = collect_stats
+        self.opctx = []
+        logger = logging.getLogger(self.name)
+        if not logger.handlers:
+            logger.addHandler(logging.NullHandler())
+        logger.propagate = False
+        self.logger = _StyleAdapter(logger)
+        self.templates = PbenchTemplates(
+            str(SERVER_DIR / "bin"), "unit-test", self.logger, _known_tool_handlers
+        )
+
+    def get_tracking_id(self):
+        return self.name
+
+
+@pytest.fixture
+def make_idxctx():
+    """The class of the minimal indexing context, FakeIdxContext."""
+    return FakeIdxContext
+
+
+def _write(path, contents):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fp:
+        fp.write(contents)
+
+
+def _write_csv(path, columns, timestamps, rng):
+    lines = [",".join(["timestamp_ms"] + list(columns))]
+    for ts in timestamps:
+        values = (f"{rng.randrange(1000):d}" for _ in columns)
+        lines.append(",".join([f"{ts * 1000:d}"] + list(values)))
+    _write(path, "\n".join(lines) + "\n")
+
+
+def _iostat(tool_dir, columns, timestamps, rng):
+    devices = [f"dev{d:d}" for d in range(columns)]
+    for fname in ("disk_IOPS.csv", "disk_Wait_Time_msec.csv"):
+        rw_columns = [f"{dev}-{rw}" for dev in devices for rw in ("read", "write")]
+        _write_csv(os.path.join(tool_dir, "csv", fname), rw_columns, timestamps, rng)
+    _write_csv(
+        os.path.join(tool_dir, "csv", "disk_Queue_Size.csv"), devices, timestamps, rng
+    )
+
+
+def _mpstat(tool_dir, columns, timestamps, rng):
+    for cpu in ["all"] + list(range(columns)):
+        _write_csv(
+            os.path.join(tool_dir, "csv", f"cpu{cpu}_cpu{cpu}.csv"),
+            ("idle", "sys", "usr"),
+            timestamps,
+            rng,
+        )
+
+
+def _vmstat(tool_dir, columns, timestamps, rng):
+    for fname, vm_columns in (
+        ("vmstat_cpu.csv", ("idle", "sys", "user")),
+        ("vmstat_procs.csv", ("blocked", "running")),
+    ):
+        _write_csv(os.path.join(tool_dir, "csv", fname), vm_columns, timestamps, rng)
+
+
+_tools = dict(iostat=_iostat, mpstat=_mpstat, vmstat=_vmstat)
+
+
+def make_result_tarball(
+    workdir,
+    iterations=2,
+    samples=2,
+    hosts=1,
+    tools=("iostat", "mpstat", "vmstat"),
+    columns=2,
+    rows=5,
+    files=0,
+    links=0,
+    unpacked=True,
+):
+    """Generate a result tar ball in `workdir`, with `rows` rows of tool data
+    for each of the given tools, each with `columns` devices or CPUs, on each
+    host, for each sample of each iteration, and `files` additional small
+    files, the first `links` of which have a hard link.
+
+    The contents of the tar ball are extracted in the incoming hierarchy;
+    when `unpacked`, the tar ball's UNPACKED link is created as well, so
+    that the members of the tar ball are taken from its extracted contents
+    rather than read from the tar ball itself.
+
+    Returns the path of the tar ball and of the directory where its contents
+    were extracted, as expected by the PbenchTarBall constructor.
+    """
+    rng = random.Random(0)
+    name = "fio_unit-test_2020.05.01T12.00.00"
+    start_run = datetime(2020, 5, 1, 12, 0, 0)
+    start = int(start_run.replace(tzinfo=timezone.utc).timestamp())
+    controller_dir = os.path.join(workdir, "archive", "controller")
+    extracted_root = os.path.join(workdir, "incoming", "controller")
+    top = os.path.join(extracted_root, name)
+    host_names = [f"host-{h:d}" for h in range(hosts)]
+    iteration_names = [f"{i:d}-unit-test" for i in range(1, iterations + 1)]
+    end_run = start_run + timedelta(seconds=iterations * samples * (rows + 1))
+
+    metadata = [
+        "[pbench]",
+        f"name = {name}",
+        "script = fio",
+        "config = unit-test",
+        "date = 2020-05-01T12:00:00",
+        "rpm-version = 0.69.0-1",
+        f"iterations = {', '.join(iteration_names)}",
+        "",
+        "[tools]",
+        f"hosts = {' '.join(host_names)}",
+        "group = default",
+        "",
+    ]
+    for host in host_names:
+        metadata.append(f"[tools/{host}]")
+        metadata.extend(f"{tool} = --interval=1" for tool in tools)
+        metadata.append("")
+    metadata.extend(
+        [
+            "[run]",
+            "controller = controller.example.com",
+            f"start_run = {start_run.isoformat()}.000000",
+            f"end_run = {end_run.isoformat()}.000000",
+            "",
+        ]
+    )
+    _write(os.path.join(top, "metadata.log"), "\n".join(metadata))
+
+    results = []
+    for i, iteration in enumerate(iteration_names):
+        throughput = []
+        for s, sample in enumerate(f"sample{s:d}" for s in range(1, samples + 1)):
+            beg = start + (i * samples + s) * (rows + 1)
+            timestamps = list(range(beg, beg + rows))
+            for host in host_names:
+                for tool in tools:
+                    _tools[tool](
+                        os.path.join(
+                            top, iteration, sample, "tools-default", host, tool
+                        ),
+                        columns,
+                        timestamps,
+                        rng,
+                    )
+            throughput.append(
+                dict(
+                    value=rng.randrange(1000),
+                    timeseries=[
+                        dict(date=ts * 1000, value=rng.randrange(1000))
+                        for ts in timestamps
+                    ],
+                )
+            )
+        results.append(
+            dict(
+                iteration_name="unit-test",
+                iteration_number=i + 1,
+                iteration_data=dict(
+                    parameters=dict(
+                        benchmark=[
+                            dict(
+                                benchmark_name="fio",
+                                benchmark_version="3.19",
+                                primary_metric="iops_sec",
+                                uid="benchmark_name:%benchmark_name%",
+                            )
+                        ]
+                    ),
+                    throughput=dict(
+                        iops_sec=[
+                            dict(
+                                **{"closest sample": 1},
+                                client_hostname="all",
+                                description="I/O operations per second",
+                                mean=0,
+                                role="aggregate",
+                                samples=throughput,
+                                stddev=0,
+                                stddevpct=0,
+                                uid="client_hostname:%client_hostname%",
+                            )
+                        ]
+                    ),
+                ),
+            )
+        )
+    _write(os.path.join(top, "result.json"), json.dumps(results))
+    for n in range(files):
+        _write(os.path.join(top, "files", f"file-{n:05d}.txt"), f"{n:d}\n")
+    for n in range(links):
+        os.link(
+            os.path.join(top, "files", f"file-{n:05d}.txt"),
+            os.path.join(top, "files", f"link-{n:05d}.txt"),
+        )
+
+    os.makedirs(controller_dir)
+    tb = os.path.join(controller_dir, f"{name}.tar.xz")
+    with tarfile.open(tb, "w:xz", preset=1) as tf:
+        tf.add(top, arcname=name)
+    with open(tb, "rb") as fp:
+        md5 = hashlib.md5(fp.read()).hexdigest()
+    with open(f"{tb}.md5", "w") as fp:
+        fp.write(f"{md5}  {os.path.basename(tb)}\n")
+    if unpacked:
+        os.makedirs(os.path.join(controller_dir, "UNPACKED"))
+        os.symlink(
+            os.path.join("..", os.path.basename(tb)),
+            os.path.join(controller_dir, "UNPACKED", os.path.basename(tb)),
+        )
+    return tb, extracted_root
+
+
+@pytest.fixture(scope="module")
+def result_tarball(request, tmp_path_factory):
+    """Generate a result tar ball (see make_result_tarball()), returning its
+    path, the directory its contents were extracted to, and the work
+    directory.
+
+    The shape of the tar ball is given by indirect parametrization, e.g.:
+
+        @pytest.mark.parametrize(
+            "result_tarball", [dict(hosts=2, rows=20)], indirect=True
+        )
+    """
+    workdir = str(tmp_path_factory.mktemp("result-tarball"))
+    tb, extracted_root = make_result_tarball(workdir, **getattr(request, "param", {}))
+    return tb, extracted_root, workdir
+
+
+class FakeElasticsearch:
+    """Just enough of an Elasticsearch client for the bulk helpers, indexing
+    the documents of bulk requests in memory.
+
+    The first attempt to create each document whose ID is in `rejected` is
+    rejected (429), and a document already indexed is a duplicate (409).
+    Each bulk request takes `latency` seconds, advancing the given fake
+    `clock`, or sleeping without one, and the maximum number of concurrent
+    bulk requests is recorded.  Bulk request number `fail_at` raises a
+    BulkFailure, before it is handled, or after when `lose_response` is set.
+    """
+
+    force_elastic_search_module = "elasticsearch"
+
+    class BulkFailure(Exception):
+        pass
+
+    def __init__(self, rejected=(), latency=0.0, clock=None):
+        self.transport = SimpleNamespace(serializer=JSONSerializer())
+        self.rejected = set(rejected)
+        self.latency = latency
+        self.clock = clock
+        self.fail_at = None
+        self.lose_response = False
+        self.indexed = set()
+        self.created = []
+        self.sent = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def bulk(self, *args, **kwargs):
+        body = kwargs.get("body", args[0] if args else "")
+        with self.lock:
+            self.requests += 1
+            fail = self.requests == self.fail_at
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if fail and not self.lose_response:
+                raise self.BulkFailure()
+            if self.clock is not None:
+                self.clock.now += self.latency
+            elif self.latency:
+                time.sleep(self.latency)
+            items = []
+            with self.lock:
+                for line in body.splitlines()[::2]:
+                    ((op_type, meta),) = json.loads(line).items()
+                    key = (meta["_index"], meta["_id"])
+                    self.sent += 1
+                    item = dict(_index=key[0], _id=key[1])
+                    if key[1] in self.rejected:
+                        self.rejected.remove(key[1])
+                        item.update(
+                            status=429,
+                            error="EsRejectedExecutionException[rejected execution]",
+                        )
+                    elif key in self.indexed:
+                        item.update(status=409)
+                    else:
+                        self.indexed.add(key)
+                        self.created.append(key[1])
+                        item.update(status=201)
+                    items.append({op_type: item})
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        if fail:
+            raise self.BulkFailure()
+        return dict(
+            errors=any(item["status"] != 201 for i in items for item in i.values()),
+            items=items,
+        )
+
+
+@pytest.fixture
+def make_es():
+    """The class of the fake Elasticsearch client, FakeElasticsearch."""
+    return FakeElasticsearch
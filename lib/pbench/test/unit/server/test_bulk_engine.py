@@ -0,0 +1,68 @@
+import logging
+from configparser import ConfigParser
+from types import SimpleNamespace
+
+import pytest
+import pyesbulk
+
+from pbench.common.exceptions import ConfigFileError
+from pbench.common.logger import _StyleAdapter
+from pbench.server.indexer import BulkEngine, es_index
+
+
+def _config(**options):
+    conf = ConfigParser()
+    conf.read_dict({"Indexing": options})
+    return SimpleNamespace(conf=conf)
+
+
+def _actions(count):
+    for i in range(count):
+        yield dict(_op_type="create", _index="idx", _id=f"id{i:03d}", _source={"n": i})
+
+
+class TestBulkEngine:
+    @staticmethod
+    def test_defaults():
+        engine = BulkEngine(_config())
+        assert engine.engine == "streaming"
+        assert engine.action_count == 500
+        assert engine.max_bytes == 100 * 1024 * 1024
+        assert engine.concurrency == 4
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "options",
+        [
+            dict(bulk_engine="asyncio"),
+            dict(bulk_action_count="many"),
+            dict(bulk_max_bytes="0"),
+            dict(bulk_concurrency="-1"),
+        ],
+    )
+    def test_invalid(options):
+        with pytest.raises(ConfigFileError):
+            BulkEngine(_config(**options))
+
+    @staticmethod
+    def test_parallel(monkeypatch, make_es):
+        backoffs = []
+        monkeypatch.setattr(pyesbulk, "_sleep_w_backoff", backoffs.append)
+        engine = BulkEngine(
+            _config(bulk_engine="parallel", bulk_action_count="2", bulk_concurrency="3")
+        )
+        es = make_es(rejected=("id001",), latency=0.05)
+        with open("/dev/null", "w") as errorsfp:
+            res = es_index(
+                es,
+                _actions(40),
+                errorsfp,
+                _StyleAdapter(logging.getLogger("test_bulk_engine")),
+                bulk_engine=engine,
+            )
+        _, _, successes, duplicates, failures, retries = res
+        assert (successes, duplicates, failures, retries) == (40, 0, 0, 1)
+        assert backoffs == [1]
+        assert sorted(es.created) == [f"id{i:03d}" for i in range(40)]
+        assert es.requests == 21
+        assert 1 < es.max_in_flight <= 3
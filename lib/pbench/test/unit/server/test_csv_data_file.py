@@ -0,0 +1,71 @@
+import json
+import os
+
+import pytest
+
+from pbench.server.indexer import OpenFileBudget, PbenchTarBall, ToolData
+
+
+def _open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def _tool_data_docs(make_idxctx, tarball, open_files):
+    """Generate the tool data documents of the tar ball, returning them along
+    with the most files opened at once while generating them.
+    """
+    tb, extracted_root, workdir = tarball
+    ctx = make_idxctx(tool_data_open_files=open_files)
+    ptb = PbenchTarBall(ctx, tb, workdir, extracted_root)
+    tds = list(ptb.mk_tool_data())
+    base = _open_fds()
+    most = 0
+    docs = []
+    for td in tds:
+        for source, source_id in td.make_source():
+            most = max(most, _open_fds() - base)
+            docs.append((source_id, json.dumps(source, sort_keys=True)))
+    assert _open_fds() == base
+    return docs, most
+
+
+class TestOpenFileBudget:
+    @staticmethod
+    def test_slots():
+        budget = OpenFileBudget(3)
+        with budget.slots(5) as taken:
+            assert taken == 3
+            assert not budget._slots.acquire(False)
+        with budget.slots(2) as taken:
+            assert taken == 2
+            with budget.slots(2) as more:
+                assert more == 1
+        with budget.slots(3) as taken:
+            assert taken == 3
+
+
+class TestCsvDataFile:
+    @staticmethod
+    def test_closed_after_header(make_idxctx, result_tarball):
+        tb, extracted_root, workdir = result_tarball
+        ctx = make_idxctx()
+        ptb = PbenchTarBall(ctx, tb, workdir, extracted_root)
+        base = _open_fds()
+        tds = list(ptb.mk_tool_data())
+        assert _open_fds() == base
+        csvfs = [csvf for td in tds for csvf in td.files]
+        assert csvfs and all(csvf["header"][0] == "timestamp_ms" for csvf in csvfs)
+        # Reading the rows again, and again, starts after the header.
+        rows = list(csvfs[0].rows())
+        assert len(rows) == 5
+        assert list(csvfs[0].rows()) == rows
+        assert _open_fds() == base
+
+    @staticmethod
+    @pytest.mark.parametrize("open_files", [1, 2, 64])
+    def test_lock_step_budget(make_idxctx, result_tarball, monkeypatch, open_files):
+        expected, _ = _tool_data_docs(make_idxctx, result_tarball, 64)
+        monkeypatch.setattr(ToolData, "unified_columnar", False)
+        docs, most = _tool_data_docs(make_idxctx, result_tarball, open_files)
+        assert docs == expected
+        assert 1 <= most <= open_files
@@ -0,0 +1,120 @@
+import json
+import logging
+import threading
+from collections import Counter
+from configparser import ConfigParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from pbench.common.logger import _StyleAdapter
+from pbench.server.indexer import get_es
+
+
+def _config(**options):
+    conf = ConfigParser()
+    conf.read_dict({"elasticsearch": options})
+    return SimpleNamespace(conf=conf, files=["pbench-server.cfg"], _unittests=False)
+
+
+class _MockNode(BaseHTTPRequestHandler):
+    """A stand-in Elasticsearch node answering every GET with the node info."""
+
+    def do_GET(self):
+        self.server.requests[self.server.server_port] += 1
+        body = json.dumps(
+            dict(
+                version=dict(number="7.17.0", build_flavor="default"),
+                tagline="You Know, for Search",
+            )
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def cluster():
+    """Start three stand-in Elasticsearch nodes on local ports, yielding the
+    server objects, and a counter of the requests received by port.
+    """
+    requests = Counter()
+    servers = []
+    for _ in range(3):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _MockNode)
+        server.requests = requests
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    yield servers, requests
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _hosts(servers):
+    return ", ".join(f"127.0.0.1:{server.server_port}" for server in servers)
+
+
+class TestGetEs:
+    logger = _StyleAdapter(logging.getLogger("test_es_pool"))
+
+    def test_missing(self):
+        assert get_es(_config(), self.logger) is None
+
+    def test_round_robin(self, cluster):
+        servers, requests = cluster
+        es = get_es(_config(hosts=_hosts(servers)), self.logger)
+        # The first request is preceded by a product check.
+        es.info()
+        requests.clear()
+        for _ in range(30):
+            es.info()
+        assert sorted(requests.values()) == [10, 10, 10]
+        for conn in es.transport.connection_pool.connections:
+            assert conn.pool.pool.maxsize == 10
+
+    def test_dead_node(self, cluster):
+        # The last node has gone away: its requests go to the other nodes,
+        # and it is left out once it failed.
+        servers, requests = cluster
+        servers[-1].shutdown()
+        servers[-1].server_close()
+        es = get_es(_config(hosts=_hosts(servers)), self.logger)
+        es.info()
+        requests.clear()
+        for _ in range(20):
+            es.info()
+        assert sum(requests.values()) == 20
+        assert len(es.transport.connection_pool.connections) == 2
+
+    def test_least_loaded(self, cluster):
+        servers, requests = cluster
+        es = get_es(
+            _config(
+                hosts=_hosts(servers),
+                host_selector="least_loaded",
+                connection_pool_size="4",
+            ),
+            self.logger,
+        )
+        es.info()
+        requests.clear()
+        threads = [
+            threading.Thread(target=lambda: [es.info() for _ in range(10)])
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sum(requests.values()) == 40
+        assert len(requests) == 3
+        for conn in es.transport.connection_pool.connections:
+            assert conn.in_flight == 0
@@ -0,0 +1,66 @@
+from configparser import ConfigParser
+from types import SimpleNamespace
+
+import pytest
+
+from pbench.common.exceptions import ConfigFileError
+from pbench.server.esconfig import EsConfig
+
+
+def _config(**options):
+    conf = ConfigParser()
+    conf.read_dict({"elasticsearch": options})
+    return SimpleNamespace(conf=conf)
+
+
+class TestEsConfig:
+    @staticmethod
+    def test_single_host():
+        es_config = EsConfig(_config(host="es.example.com", port="9200"))
+        assert es_config.hosts == [dict(host="es.example.com", port="9200")]
+        assert es_config.urls == ["http://es.example.com:9200"]
+        assert es_config.selector == "round_robin"
+        assert es_config.pool_size == 10
+        assert es_config.max_retries == 0
+
+    @staticmethod
+    def test_hosts():
+        es_config = EsConfig(
+            _config(
+                host="ignored.example.com",
+                port="9200",
+                hosts="es-1.example.com, es-2.example.com:9201,",
+                host_selector="least_loaded",
+                connection_pool_size="25",
+            )
+        )
+        assert es_config.hosts == [
+            dict(host="es-1.example.com", port="9200"),
+            dict(host="es-2.example.com", port="9201"),
+        ]
+        assert es_config.selector == "least_loaded"
+        assert es_config.pool_size == 25
+        assert es_config.max_retries == 1
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "options", [{}, dict(host="es.example.com"), dict(port="9200", hosts=" , ")],
+    )
+    def test_missing(options):
+        assert EsConfig.get(_config(**options)) is None
+        assert EsConfig.get(SimpleNamespace(conf=ConfigParser())) is None
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "options",
+        [
+            dict(hosts="es.example.com:"),
+            dict(hosts="es.example.com", host_selector="fastest"),
+            dict(hosts="es.example.com", connection_pool_size="0"),
+            dict(hosts="es.example.com", dead_timeout="soon"),
+            dict(hosts="es.example.com", max_retries="-1"),
+        ],
+    )
+    def test_invalid(options):
+        with pytest.raises(ConfigFileError):
+            EsConfig(_config(port="9200", **options))
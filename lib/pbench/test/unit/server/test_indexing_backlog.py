@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+from pbench.common.exceptions import JsonFileError
+from pbench.server.indexer import (
+    BacklogEntry,
+    IndexingBacklog,
+    IndexingHistory,
+    tarball_script,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _entries(*sizes, rate=1):
+    return [
+        BacklogEntry(size, "ctrl", f"tb-{size:d}.tar.xz", None, 0, size / rate)
+        for size in sizes
+    ]
+
+
+def _take_all(backlog, lane="small"):
+    return [entry.size for entry in iter(lambda: backlog.take(lane), None)]
+
+
+class TestIndexingHistory:
+    @staticmethod
+    def test_estimate():
+        history = IndexingHistory()
+        assert history.estimate("fio", 2 * history.default_bytes_per_sec) == (0, 2.0)
+        history.record("fio", 1000, 100, 10)
+        history.record("uperf", 1000, 1000, 1)
+        assert history.estimate("fio", 500) == (50, 5.0)
+        assert history.estimate("uperf", 500) == (500, 0.5)
+        # A script without a history is estimated from all of them.
+        docs, secs = history.estimate("linpack", 2000)
+        assert docs == 1100 and secs == pytest.approx(11.0)
+        # Newer tar balls weigh more than older ones.
+        history.record("fio", 1000, 100, 20)
+        assert 15.0 < history.estimate("fio", 1000)[1] < 20.0
+
+    @staticmethod
+    def test_save_load(tmp_path):
+        path = str(tmp_path / "history.json")
+        assert IndexingHistory.load(path).scripts == {}
+        history = IndexingHistory(path)
+        history.record("fio", 1000, 100, 10)
+        history.save()
+        loaded = IndexingHistory.load(path)
+        assert loaded.estimate("fio", 100) == history.estimate("fio", 100)
+        with open(path, "w") as fp:
+            json.dump(dict(version=0, scripts={}), fp)
+        with pytest.raises(JsonFileError):
+            IndexingHistory.load(path)
+        with open(path, "w") as fp:
+            fp.write("{")
+        with pytest.raises(JsonFileError):
+            IndexingHistory.load(path)
+
+    @staticmethod
+    def test_tarball_script(tmp_path):
+        tb = str(tmp_path / "ctrl" / "fio_run.tar.xz")
+        incoming = tmp_path / "incoming"
+        assert tarball_script(tb, str(incoming)) is None
+        (tmp_path / "ctrl").mkdir()
+        with open(f"{tb}.manifest", "w") as fp:
+            json.dump(dict(metadata=dict(pbench=dict(script="uperf"))), fp)
+        assert tarball_script(tb, str(incoming)) == "uperf"
+        (incoming / "fio_run").mkdir(parents=True)
+        (incoming / "fio_run" / "metadata.log").write_text("[pbench]\nscript = fio\n")
+        assert tarball_script(tb, str(incoming)) == "fio"
+
+
+class TestIndexingBacklog:
+    @staticmethod
+    def test_smallest_first():
+        backlog = IndexingBacklog(_entries(30, 10, 20))
+        assert backlog.lanes(1) == dict(small=1)
+        assert _take_all(backlog) == [10, 20, 30]
+        assert not backlog.over_budget
+
+    @staticmethod
+    def test_max_runtime():
+        clock = Clock()
+        backlog = IndexingBacklog(_entries(5, 1, 50, 3), max_runtime=10, clock=clock)
+        assert backlog.take().size == 1
+        clock.now += 1
+        assert backlog.take().size == 3
+        clock.now += 3
+        assert backlog.take().size == 5
+        # The last one does not fit in what is left of the budget.
+        assert backlog.take() is None
+        assert backlog.over_budget
+        assert [entry.size for entry in backlog] == [50]
+
+    @staticmethod
+    def test_lanes():
+        clock = Clock()
+        backlog = IndexingBacklog(
+            _entries(1, 100, 2, 300, 3, 200),
+            max_runtime=250,
+            large_seconds=100,
+            large_workers=1,
+            clock=clock,
+        )
+        assert backlog.lanes(4) == dict(large=1, small=3)
+        # The first tar ball of a lane is taken even when it is over budget.
+        assert backlog.take("large").size == 300
+        assert backlog.take("large").size == 200
+        assert _take_all(backlog, "small") == [1, 2, 3, 100]
+        assert len(backlog) == 0
+        assert not backlog.over_budget
+
+    @staticmethod
+    def test_lanes_steal():
+        backlog = IndexingBacklog(
+            _entries(1, 100), large_seconds=100, large_workers=1, clock=Clock()
+        )
+        assert backlog.take("small").size == 1
+        # With no small tar balls left, the small lane takes the large ones.
+        assert backlog.take("small").size == 100
+        assert backlog.take("large") is None
@@ -0,0 +1,121 @@
+import itertools
+import os
+
+import pytest
+from elasticsearch import helpers
+from elasticsearch.helpers import actions as es_helpers_actions
+
+from pbench.common.exceptions import BadCheckpoint
+from pbench.server.indexer import IndexingCheckpoint, PbenchTarBall, es_index
+
+
+@pytest.fixture(autouse=True)
+def real_helpers(monkeypatch):
+    """Make sure the real bulk helpers are used, not those of the mock'd
+    Elasticsearch client."""
+    monkeypatch.setattr(helpers, "streaming_bulk", es_helpers_actions.streaming_bulk)
+
+
+def _index(make_idxctx, tarball, es):
+    tb, extracted_root, workdir = tarball
+    ctx = make_idxctx()
+    ptb = PbenchTarBall(ctx, tb, workdir, extracted_root)
+    checkpoint = ptb.open_checkpoint(f"{tb}.checkpoint")
+    actions = itertools.chain(ptb.make_all_actions(), ptb.mk_tool_data_actions())
+    with open(os.devnull, "w") as errorsfp:
+        res = es_index(
+            es, actions, errorsfp, ctx.logger, stats=ptb.stats, checkpoint=checkpoint
+        )
+    return ptb, res
+
+
+class TestIndexingCheckpoint:
+    @staticmethod
+    def test_load_missing_and_bad(tmp_path):
+        path = str(tmp_path / "tb.tar.xz.checkpoint")
+        assert not IndexingCheckpoint.load(path, "abc").resuming()
+        with open(path, "w") as fp:
+            fp.write("{")
+        with pytest.raises(BadCheckpoint):
+            IndexingCheckpoint.load(path, "abc")
+        IndexingCheckpoint(path, "def").save()
+        with pytest.raises(BadCheckpoint):
+            IndexingCheckpoint.load(path, "abc")
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "result_tarball", [dict(columns=8, rows=40, files=20)], indirect=True
+    )
+    @pytest.mark.parametrize("lose_response", [False, True])
+    def test_resume(make_idxctx, make_es, result_tarball, lose_response):
+        tb, _, _ = result_tarball
+        es = make_es()
+        ptb, res = _index(make_idxctx, result_tarball, es)
+        total = res[2]
+        assert res[3:5] == (0, 0)
+        ptb.checkpoint.remove()
+
+        # Interrupt a fresh pass at its fourth bulk request.
+        es = make_es()
+        es.fail_at = 4
+        es.lose_response = lose_response
+        with pytest.raises(make_es.BulkFailure):
+            _index(make_idxctx, result_tarball, es)
+        assert os.path.exists(f"{tb}.checkpoint")
+        acked = es.sent if lose_response else 3 * 500
+
+        # The next pass only sends what was not acknowledged.
+        es.fail_at = None
+        es.sent = 0
+        ptb, res = _index(make_idxctx, result_tarball, es)
+        assert ptb.checkpoint.skipped == acked - (500 if lose_response else 0)
+        assert es.sent == total - ptb.checkpoint.skipped
+        assert res[2:5] == (total, 0, 0)
+        # The statistics of the pass only count the documents it sent, which
+        # is what the indexing history records.
+        counters = ptb.stats.counters
+        assert counters["successes"] + counters["duplicates"] == es.sent
+        # All the units are done, so nothing is generated on yet another pass.
+        es.sent = 0
+        ptb, res = _index(make_idxctx, result_tarball, es)
+        assert es.sent == 0
+        assert ptb.checkpoint.skipped == total
+        assert res[2:5] == (total, 0, 0)
+        assert [o["object"] for o in ptb.idxctx.opctx] == []
+        ptb.checkpoint.remove()
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "result_tarball",
+        [dict(columns=8, rows=40, files=20, unpacked=False)],
+        indirect=True,
+    )
+    def test_resume_tar_members(make_idxctx, make_es, result_tarball):
+        tb, extracted_root, workdir = result_tarball
+        es = make_es()
+        ptb, res = _index(make_idxctx, result_tarball, es)
+        assert ptb.members_source == "tarfile"
+        total = res[2]
+        ptb.checkpoint.remove()
+        # Generating the table-of-contents leaves the members in tar order.
+        tar_order = [m.name for m in ptb._read_tar_members()]
+        assert [m.name for m in ptb.members] == tar_order
+
+        # Interrupt a fresh pass once the table-of-contents is indexed.
+        es = make_es()
+        es.fail_at = 3
+        with pytest.raises(make_es.BulkFailure):
+            _index(make_idxctx, result_tarball, es)
+        md5 = ptb.run_metadata["id"]
+        assert IndexingCheckpoint.load(f"{tb}.checkpoint", md5).done("toc")
+
+        # The next pass skips the table-of-contents, and sends exactly what
+        # was not acknowledged, none of it being a duplicate.
+        es.fail_at = None
+        es.sent = 0
+        ptb, res = _index(make_idxctx, result_tarball, es)
+        assert ptb.checkpoint.skipped == 2 * 500
+        assert es.sent == total - ptb.checkpoint.skipped
+        assert res[2:5] == (total, 0, 0)
+        assert len(es.indexed) == total
+        ptb.checkpoint.remove()
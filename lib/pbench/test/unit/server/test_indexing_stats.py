@@ -0,0 +1,199 @@
+import logging
+import pickle
+from collections import Counter
+
+import pytest
+
+from pbench.common.logger import _StyleAdapter
+from pbench.server import indexer
+from pbench.server.indexer import IndexingStats, PbenchTarBall, es_index
+
+
+class FakeClock:
+    """A perf_counter() stand-in advanced by hand."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _gen(clock, costs):
+    for cost in costs:
+        clock.now += cost
+        yield cost
+
+
+class TestIndexingStats:
+    @staticmethod
+    def test_nested_phases(monkeypatch):
+        clock = FakeClock()
+        monkeypatch.setattr(indexer, "perf_counter", clock)
+        stats = IndexingStats()
+        with stats.phase("open"):
+            clock.now += 1.0
+            with stats.phase("members"):
+                clock.now += 2.0
+            clock.now += 0.5
+        assert stats.phases == {"open": 1.5, "members": 2.0}
+
+    @staticmethod
+    def test_timed(monkeypatch):
+        clock = FakeClock()
+        monkeypatch.setattr(indexer, "perf_counter", clock)
+        stats = IndexingStats()
+        consumed = []
+        outer = stats.timed("tool_data", _gen(clock, (0.25, 0.25)))
+        for item in outer:
+            # Only the generation of the items is charged, not the time the
+            # consumer spends on them.
+            inner = stats.timed("tool_csv", _gen(clock, (1.0, 2.0)), tool="iostat")
+            consumed.extend(inner)
+            clock.now += 10.0
+        assert consumed == [1.0, 2.0, 1.0, 2.0]
+        assert stats.phases == {"tool_data": 0.5, "tool_csv": 6.0}
+        assert stats.tools["iostat"] == {"documents": 4, "seconds": 6.0}
+        assert stats.to_dict()["tools"]["iostat"]["docs_per_sec"] == round(4 / 6, 3)
+
+    @staticmethod
+    def test_bulk_latency():
+        stats = IndexingStats()
+        for elapsed in (0.001, 0.01, 0.3, 0.3, 100.0):
+            stats.record_bulk(elapsed, 10)
+        latency = stats.to_dict()["bulk_latency"]
+        buckets = dict((str(le), count) for le, count in latency["buckets"])
+        assert buckets["0.01"] == 2
+        assert buckets["0.25"] == 2
+        assert buckets["0.5"] == 4
+        assert buckets["30.0"] == 4
+        assert buckets["+Inf"] == 5
+        assert latency["count"] == 5
+        assert stats.counters == {"bulk_requests": 5, "bulk_bytes": 50}
+
+    @staticmethod
+    def test_merge_pickled():
+        # The statistics of the tar balls indexed by pool workers are pickled
+        # back to the parent process.
+        run_stats = IndexingStats()
+        for _ in range(2):
+            stats = IndexingStats()
+            with stats.phase("toc"):
+                pass
+            list(stats.timed("tool_json", range(3), tool="pidstat"))
+            stats.record_bulk(0.02, 100)
+            stats.record_index((0, 0, 3, 1, 0, 2), 1.5)
+            run_stats.merge(pickle.loads(pickle.dumps(stats)))
+        assert run_stats.tools["pidstat"]["documents"] == 6
+        assert run_stats.counters["tarballs"] == 2
+        assert run_stats.counters["successes"] == 6
+        assert run_stats.counters["duplicates"] == 2
+        assert run_stats.counters["retries"] == 4
+        assert run_stats.counters["index_seconds"] == 3.0
+        assert run_stats.counters["bulk_bytes"] == 200
+        assert sum(run_stats.bulk_latency) == 2
+        assert set(run_stats.phases) == {"toc", "tool_json"}
+
+    @staticmethod
+    def test_record_opctx():
+        opctx = [
+            dict(tbname="a.tar.xz", object="ResultData", counters=Counter()),
+            dict(
+                tbname="a.tar.xz",
+                object="ToolData-1-1-host-iostat",
+                counters=Counter(ts_cache_hits=30, ts_cache_misses=10, bad_ts=1),
+            ),
+            # The contexts of the other tar balls of a pass are ignored.
+            dict(
+                tbname="b.tar.xz",
+                object="ResultData",
+                counters=Counter(ts_cache_hits=5, ts_cache_misses=5),
+            ),
+        ]
+        stats = IndexingStats()
+        stats.record_opctx(opctx, "a.tar.xz")
+        assert stats.counters == {"ts_cache_hits": 30, "ts_cache_misses": 10}
+        counters = stats.to_dict()["counters"]
+        assert counters["ts_cache_hits"] == 30
+        lines = stats.to_prometheus().splitlines()
+        assert 'pbench_index_timestamp_cache_lookups{outcome="hits"} 30' in lines
+        assert 'pbench_index_timestamp_cache_lookups{outcome="misses"} 10' in lines
+
+    @staticmethod
+    def test_prometheus(tmp_path):
+        stats = IndexingStats()
+        list(stats.timed("tool_csv", range(2), tool="sar"))
+        stats.record_bulk(0.02, 100)
+        prom = tmp_path / "pbench-index.prom"
+        stats.write_prometheus(prom, dict(version="4.0.0"))
+        lines = prom.read_text().splitlines()
+        assert "# TYPE pbench_index_bulk_request_seconds histogram" in lines
+        assert (
+            'pbench_index_bulk_request_seconds_bucket{le="0.01",version="4.0.0"} 0'
+            in lines
+        )
+        assert (
+            'pbench_index_bulk_request_seconds_bucket{le="+Inf",version="4.0.0"} 1'
+            in lines
+        )
+        assert 'pbench_index_bulk_request_seconds_count{version="4.0.0"} 1' in lines
+        assert 'pbench_index_tool_documents{tool="sar",version="4.0.0"} 2' in lines
+        assert 'pbench_index_bulk_bytes{version="4.0.0"} 100' in lines
+        for line in lines:
+            if not line.startswith("#"):
+                float(line.rsplit(" ", 1)[1])
+        assert list(tmp_path.iterdir()) == [prom]
+
+    @staticmethod
+    def test_es_index(monkeypatch, make_es):
+        clock = FakeClock()
+        monkeypatch.setattr(indexer, "perf_counter", clock)
+        stats = IndexingStats()
+        actions = (
+            dict(_op_type="create", _index="idx", _id=f"id{i:03d}", _source={"n": i})
+            for i in range(10)
+        )
+        with open("/dev/null", "w") as errorsfp:
+            res = es_index(
+                make_es(latency=0.2, clock=clock),
+                actions,
+                errorsfp,
+                _StyleAdapter(logging.getLogger("test_indexing_stats")),
+                stats=stats,
+            )
+        assert res[2:] == (10, 0, 0, 0)
+        assert stats.counters["tarballs"] == 1
+        assert stats.counters["successes"] == 10
+        assert stats.counters["bulk_requests"] >= 1
+        assert stats.counters["bulk_bytes"] > 0
+        assert stats.serialization["actions"] >= 10
+        assert stats.bulk_latency_sum == pytest.approx(
+            0.2 * stats.counters["bulk_requests"]
+        )
+
+
+class TestActiveStats:
+    @staticmethod
+    @pytest.fixture(autouse=True)
+    def reset_active(monkeypatch):
+        monkeypatch.setattr(IndexingStats, "active", None)
+
+    @staticmethod
+    def test_not_collected(make_idxctx, result_tarball):
+        tb, extracted_root, workdir = result_tarball
+        ptb = PbenchTarBall(make_idxctx(), tb, workdir, extracted_root)
+        assert IndexingStats.active is None
+        assert sum(1 for _ in ptb.mk_toc_actions()) > 0
+        assert ptb.stats.hashing == {}
+
+    @staticmethod
+    def test_collected(make_idxctx, result_tarball):
+        tb, extracted_root, workdir = result_tarball
+        ctx = make_idxctx(collect_stats=True, tool_data_workers=2)
+        ptb = PbenchTarBall(ctx, tb, workdir, extracted_root)
+        assert IndexingStats.active is ptb.stats
+        toc = sum(1 for _ in ptb.mk_toc_actions())
+        tool_data = sum(1 for _ in ptb.mk_tool_data_actions())
+        # The document IDs computed by the tool data workers are charged to
+        # the statistics of their units, merged into those of the tar ball.
+        assert ptb.stats.hashing["documents"] >= toc + tool_data
@@ -0,0 +1,127 @@
+import io
+import json
+import logging
+import os
+
+import pytest
+
+from pbench.server.indexer import JsonArrayIterator, PbenchTarBall
+
+
+_elements = [
+    {"@timestamp": 1580000000.123, "values": [1, 2.5e-7, -3], "name": "a, ] b"},
+    12345678901234567890,
+    1.5e10,
+    [[], {}, [{"nested": None}]],
+    'string with "escapes" and é',
+    True,
+    None,
+]
+
+
+def _load(text, chunk_size, validate=False):
+    return JsonArrayIterator.load(
+        io.StringIO(text), chunk_size=chunk_size, validate=validate
+    )
+
+
+class TestJsonArrayIterator:
+    @staticmethod
+    @pytest.mark.parametrize("chunk_size", [1, 3, 16, 64 * 1024])
+    @pytest.mark.parametrize("indent", [None, 4])
+    def test_identical(chunk_size, indent):
+        text = json.dumps(_elements, indent=indent)
+        it = _load(text, chunk_size)
+        assert isinstance(it, JsonArrayIterator)
+        assert list(it) == json.loads(text)
+        assert it.error is None
+
+    @staticmethod
+    @pytest.mark.parametrize("text", ["[]", " [ ]\n", "\n[\n]\n"])
+    def test_empty(text):
+        it = _load(text, 1)
+        assert list(it) == []
+        assert it.error is None
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "text", ['{"a": [1, 2]}', '"string"', " 42 "],
+    )
+    def test_not_an_array(text):
+        # Documents which are not arrays are loaded in full.
+        assert _load(text, 1) == json.loads(text)
+
+    @staticmethod
+    @pytest.mark.parametrize("text", ["", "  ", "{", "\ufeff[1]"])
+    def test_invalid_document(text):
+        with pytest.raises(ValueError):
+            _load(text, 1)
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "text,elements",
+        [
+            ("[1, 2", [1]),
+            ("[1, 2,]", [1, 2]),
+            ("[1 2]", []),
+            ("[1, 2] 3", [1, 2]),
+            ('[{"a": 1}, {"b": ]', [{"a": 1}]),
+            ("[1, 1.5e]", [1]),
+        ],
+    )
+    def test_invalid_element(text, elements):
+        # The elements before the error are generated, then the error ends
+        # the iteration.
+        it = _load(text, 2)
+        assert list(it) == elements
+        assert isinstance(it.error, ValueError)
+
+    @staticmethod
+    @pytest.mark.parametrize("chunk_size", [1, 3, 64 * 1024])
+    def test_validate(chunk_size):
+        text = json.dumps(_elements)
+        it = _load(text, chunk_size, validate=True)
+        assert list(it) == json.loads(text)
+        assert it.error is None
+        with pytest.raises(ValueError):
+            _load(text[:-5], chunk_size, validate=True)
+
+
+class _Messages(logging.Handler):
+    """Format and keep the messages logged, letting formatting errors be
+    raised, which logging handlers would otherwise swallow."""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestInvalidJsonFile:
+    @staticmethod
+    @pytest.mark.parametrize(
+        "result_tarball", [dict(iterations=1, samples=1, rows=3)], indirect=True
+    )
+    def test_truncated_result_json(make_idxctx, result_tarball):
+        tb, extracted_root, workdir = result_tarball
+        ctx = make_idxctx()
+        ptb = PbenchTarBall(ctx, tb, workdir, extracted_root)
+        result_json = os.path.join(extracted_root, ptb.dirname, "result.json")
+        with open(result_json) as fp:
+            text = fp.read()
+        with open(result_json, "w") as fp:
+            fp.write(text[: len(text) - 10])
+        handler = _Messages()
+        ctx.logger.logger.addHandler(handler)
+        try:
+            actions = list(ptb.make_all_actions())
+        finally:
+            ctx.logger.logger.removeHandler(handler)
+        # None of the documents of the file are indexed, as when it was
+        # loaded in full.
+        assert not [a for a in actions if ".result-data" in a["_index"]]
+        (counters,) = [o["counters"] for o in ctx.opctx if o["object"] == "ResultData"]
+        assert counters["not_valid_json_file"] == 1
+        assert [m for m in handler.messages if "JSONDecodeError" in m]
@@ -0,0 +1,84 @@
+import io
+import tarfile
+
+import pytest
+
+from pbench.server.indexer import hostnames_if_ip_from_sosreport
+
+
+_ip_o_addr = (
+    "1: lo    inet 127.0.0.1/8 scope host lo\\       valid_lft forever\n"
+    "2: eth0    inet 10.1.2.3/24 brd 10.1.2.255 scope global eth0\\ valid_lft\n"
+)
+
+
+def _sosreport(tmp_path, files, links=()):
+    """Construct a sosreport tar ball with the given files and symlinks."""
+    sos = tmp_path / "sosreport-host.example.com.tar.xz"
+    with tarfile.open(sos, "w:xz") as tf:
+        for name, contents in files:
+            data = contents.encode("iso8859-1")
+            ti = tarfile.TarInfo(f"sosreport-host/{name}")
+            ti.size = len(data)
+            tf.addfile(ti, io.BytesIO(data))
+        for name, target in links:
+            ti = tarfile.TarInfo(f"sosreport-host/{name}")
+            ti.type = tarfile.SYMTYPE
+            ti.linkname = target
+            tf.addfile(ti)
+    return str(sos)
+
+
+class TestSosreportScan:
+    @staticmethod
+    def test_hostnames_and_ips(tmp_path):
+        sos = _sosreport(
+            tmp_path,
+            [
+                ("sos_commands/general/hostname", "host.example.com\n"),
+                ("sos_commands/general/hostname_-f", "host.example.com\n"),
+                ("sos_commands/networking/ip_-o_addr", _ip_o_addr),
+                # Never read, the ip_-o_addr file is preferred.
+                ("sos_commands/networking/ip_address", "garbage\n"),
+            ],
+        )
+        status, d = hostnames_if_ip_from_sosreport(sos)
+        assert status == 0
+        assert d["hostname-f"] == "host.example.com"
+        assert d["hostname-s"] == "host"
+        assert d["inet"] == [
+            {"ifname": "lo", "ipaddr": "127.0.0.1"},
+            {"ifname": "eth0", "ipaddr": "10.1.2.3"},
+        ]
+
+    @staticmethod
+    def test_linked_files(tmp_path):
+        # Links can't be extracted while streaming the sosreport.
+        sos = _sosreport(
+            tmp_path,
+            [("hostname", "host.example.com\n"), ("ip_addr", _ip_o_addr)],
+            links=[
+                ("sos_commands/host/hostname", "../../hostname"),
+                ("sos_commands/networking/ip_-o_addr", "../../ip_addr"),
+            ],
+        )
+        status, d = hostnames_if_ip_from_sosreport(sos)
+        assert status == 0
+        assert d["hostname-f"] == "host.example.com"
+        assert d["hostname-s"] == "host"
+        assert len(d["inet"]) == 2
+
+    @staticmethod
+    def test_no_hostname(tmp_path):
+        sos = _sosreport(tmp_path, [("sos_commands/networking/ip_-o_addr", "")])
+        assert hostnames_if_ip_from_sosreport(sos) == (
+            1,
+            "We do not have a hostname recorded in the sosreport",
+        )
+
+    @staticmethod
+    def test_not_a_tar_ball(tmp_path):
+        sos = tmp_path / "sosreport.tar.xz"
+        sos.write_text("not a tar ball")
+        with pytest.raises(tarfile.ReadError):
+            hostnames_if_ip_from_sosreport(str(sos))
@@ -0,0 +1,66 @@
+import hashlib
+import json
+import pickle
+from collections import OrderedDict
+
+import pytest
+from elasticsearch.serializer import JSONSerializer
+
+from pbench.server.indexer import PbenchData, _BulkSerializer, _ConstFragment
+from pbench.server.report import Report
+
+_run = _ConstFragment(id="0123456789abcdef", name="example", user="üser")
+
+
+class TestMakeSourceId:
+    @staticmethod
+    @pytest.mark.parametrize(
+        "source",
+        [
+            {"run": {"id": "0123456789abcdef", "name": "example"}, "value": 1.5},
+            OrderedDict([("sample", {"hostname": "höst"}), ("@timestamp", None)]),
+            {"nested": {"b": [1, "x", None], "a": {"d": 2, "c": 3}}},
+            {2: "non-string", 1: "keys"},
+            {},
+            {"run": _run, "value": 1.5, "@timestamp": "2020-01-01T00:00:00"},
+            {"sample": _ConstFragment(name="sample1", hostname="höst"), "run": _run},
+            {"run": pickle.loads(pickle.dumps(_run, pickle.HIGHEST_PROTOCOL))},
+        ],
+    )
+    def test_identical(source):
+        # Source IDs must not change from those already indexed.
+        expected = hashlib.md5(
+            json.dumps(source, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        assert PbenchData.make_source_id(source) == expected
+
+
+class TestBulkSerializer:
+    @staticmethod
+    @pytest.mark.parametrize(
+        "data",
+        [
+            {"run": _run, "value": 1.5, "@timestamp": "2020-01-01T00:00:00"},
+            {"run": _run, "sample": _ConstFragment(name="sample1", number=1)},
+            {"value": [1, "x", None]},
+            {"create": {"_index": "pbench.v6.tool-data-pidstat", "_id": "abc"}},
+            "pre-serialized",
+        ],
+    )
+    def test_spliced(data):
+        serializer = JSONSerializer()
+        spliced = _BulkSerializer(serializer).dumps(data)
+        if isinstance(data, str):
+            assert spliced == data
+        else:
+            assert json.loads(spliced) == json.loads(serializer.dumps(data))
+
+
+class TestReportPayload:
+    @staticmethod
+    def test_identical():
+        source = {"text": "log ü\nlines", "chunk_id": 1, "@timestamp": "2020"}
+        payload = json.dumps(source, sort_keys=True)
+        _, source_id, the_payload = Report._make_json_payload(source)
+        assert the_payload == payload
+        assert source_id == hashlib.md5(payload.encode("utf-8")).hexdigest()
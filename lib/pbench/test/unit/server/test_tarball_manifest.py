@@ -0,0 +1,94 @@
+import json
+import tarfile
+
+import pytest
+
+from pbench.common.exceptions import BadManifest
+from pbench.server.indexer import TarBallManifest
+
+
+_dirname = "pbench-user-benchmark_example_2020.01.01T00.00.00"
+_md5 = "0123456789abcdef0123456789abcdef"
+
+
+@pytest.fixture
+def tarball(tmp_path):
+    """Construct a small tar ball, returning its path and members."""
+    run_d = tmp_path / _dirname
+    (run_d / "1-iter" / "sample1").mkdir(parents=True)
+    (run_d / "metadata.log").write_text("[pbench]\nname = example\n")
+    (run_d / "1-iter" / "sample1" / "result.txt").write_text("42\n")
+    (run_d / "latest").symlink_to("1-iter")
+    tb = tmp_path / f"{_dirname}.tar.xz"
+    with tarfile.open(tb, "w:xz") as tf:
+        tf.add(run_d, arcname=_dirname)
+    with tarfile.open(tb) as tf:
+        members = tf.getmembers()
+    return str(tb), members
+
+
+def _manifest(members):
+    return TarBallManifest(
+        _md5,
+        _dirname,
+        members,
+        {"pbench": {"name": "example"}},
+        {"iterations": ["1-iter"], "samples": {"1-iter": ["sample1"]}, "hosts": []},
+    )
+
+
+class TestTarBallManifest:
+    @staticmethod
+    def test_load_missing(tarball):
+        tb, _ = tarball
+        assert TarBallManifest.load(tb, _md5, _dirname) is None
+
+    @staticmethod
+    def test_round_trip(tarball):
+        tb, members = tarball
+        mpath = _manifest(members).save(tb)
+        assert mpath == f"{tb}.manifest"
+        manifest = TarBallManifest.load(tb, _md5, _dirname)
+        assert len(manifest.members) == len(members)
+        for loaded, orig in zip(manifest.members, members):
+            assert loaded.name == orig.name
+            assert loaded.type == orig.type
+            assert loaded.size == orig.size
+            assert loaded.mode == orig.mode
+            assert loaded.mtime == orig.mtime
+            assert loaded.linkpath == orig.linkpath
+            assert loaded.isdir() == orig.isdir()
+            assert loaded.isfile() == orig.isfile()
+            assert loaded.issym() == orig.issym()
+        assert manifest.metadata == {"pbench": {"name": "example"}}
+        assert manifest.layout["samples"] == {"1-iter": ["sample1"]}
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "field,value",
+        [
+            ("version", TarBallManifest.VERSION + 1),
+            ("md5", "fedcba9876543210fedcba9876543210"),
+            ("dirname", "pbench-user-benchmark_other_2020.01.01T00.00.00"),
+            ("members", [["too", "few", "fields"]]),
+            ("layout", {"iterations": []}),
+        ],
+    )
+    def test_invalid(tarball, field, value):
+        tb, members = tarball
+        mpath = _manifest(members).save(tb)
+        with open(mpath) as fp:
+            doc = json.load(fp)
+        doc[field] = value
+        with open(mpath, "w") as fp:
+            json.dump(doc, fp)
+        with pytest.raises(BadManifest):
+            TarBallManifest.load(tb, _md5, _dirname)
+
+    @staticmethod
+    def test_unreadable(tarball):
+        tb, _ = tarball
+        with open(f"{tb}.manifest", "w") as fp:
+            fp.write("{not json")
+        with pytest.raises(BadManifest):
+            TarBallManifest.load(tb, _md5, _dirname)
@@ -0,0 +1,228 @@
+import itertools
+import os
+import tarfile
+
+import pytest
+
+from pbench.server.indexer import (
+    ManifestMember,
+    PbenchTarBall,
+    _MemberIndex,
+    _scan_unpacked_members,
+)
+
+
+def _summary(members):
+    return sorted((m.name, m.type, m.size, m.linkname) for m in members)
+
+
+def _tar_summary(tb):
+    with tarfile.open(tb) as tf:
+        return _summary(tf.getmembers())
+
+
+class TestMemberSources:
+    @staticmethod
+    @pytest.mark.parametrize(
+        "result_tarball, source",
+        [
+            (dict(files=3, unpacked=True), "unpacked"),
+            (dict(files=3, unpacked=False), "tarfile"),
+            # Only the tar ball records which of the links to a file is the
+            # file itself.
+            (dict(files=3, links=2, unpacked=True), "tarfile"),
+            (dict(files=3, links=2, unpacked=False), "tarfile"),
+        ],
+        indirect=["result_tarball"],
+    )
+    def test_same_members(make_idxctx, result_tarball, source):
+        tb, extracted_root, workdir = result_tarball
+        ptb = PbenchTarBall(make_idxctx(), tb, workdir, extracted_root)
+        assert ptb.members_source == source
+        assert _summary(ptb.members) == _tar_summary(tb)
+
+    @staticmethod
+    @pytest.mark.parametrize("result_tarball", [dict(files=3, links=2)], indirect=True)
+    def test_hard_links(result_tarball):
+        tb, extracted_root, _ = result_tarball
+        dirname = os.path.basename(tb)[: -len(".tar.xz")]
+        assert _scan_unpacked_members(extracted_root, dirname) is None
+        links = [m for m in _tar_summary(tb) if m[1] == tarfile.LNKTYPE]
+        assert links == [
+            (
+                f"{dirname}/files/link-{n:05d}.txt",
+                tarfile.LNKTYPE,
+                0,
+                f"{dirname}/files/file-{n:05d}.txt",
+            )
+            for n in range(2)
+        ]
+
+
+_dirname = "pbench-user-benchmark_example_2020.01.01T00.00.00"
+_host_dir = f"{_dirname}/1-iter/sample1/tools-default/host-a"
+
+# Members in no particular order, some directories with a trailing "/", one
+# listed after its own contents.
+_names = [
+    f"{_dirname}/",
+    f"{_dirname}/metadata.log",
+    f"{_dirname}/2-iter/",
+    f"{_dirname}/2-iter/sample2/",
+    f"{_dirname}/2-iter/sample2/tools-default/host-b/iostat/csv/disk_IOPS.csv",
+    f"{_dirname}/2-iter/sample1",
+    f"{_dirname}/2-iter/sample1/tools-default/host-b/iostat/csv/disk_Wait.csv",
+    f"{_dirname}/2-iter/sample1/tools-default/host-b/iostat/csv/disk_IOPS.csv",
+    f"{_dirname}/2-iter/sample1/tools-default/host-b/iostat/csv/",
+    f"{_dirname}/1-iter",
+    f"{_dirname}/1-iter/sample1/",
+    f"{_dirname}/1-iter/reference-result/",
+    f"{_host_dir}/iostat-stdout.txt",
+    f"{_host_dir}/iostat/csv/b.csv",
+    f"{_host_dir}/iostat/csv/a.csv",
+    f"{_host_dir}/iostat/csv_extra/c.csv",
+    f"{_host_dir}/iostat/csv.lnk",
+]
+
+
+def _members(names):
+    """Construct members from the given names, where a trailing "/" denotes
+    a directory, as does a name without a ".", and a ".lnk" a symlink.
+    """
+    members = []
+    for name in names:
+        base = os.path.basename(name.rstrip("/"))
+        if name.endswith("/") or "." not in base:
+            mtype = tarfile.DIRTYPE
+        elif name.endswith(".lnk"):
+            mtype = tarfile.SYMTYPE
+        else:
+            mtype = tarfile.REGTYPE
+        members.append(ManifestMember(name, mtype, 0, 0o644, 0, ""))
+    return members
+
+
+def _ptb(members):
+    """A PbenchTarBall with just the given members, without a tar ball."""
+    ptb = object.__new__(PbenchTarBall)
+    ptb.members = members
+    ptb._idx = _MemberIndex(members)
+    return ptb
+
+
+def _scan_files(members, path):
+    """The files found by a linear scan of the members, as the prefix
+    lookups used to be resolved.
+    """
+    return [m.name for m in members if m.isfile() and m.name.find(path) >= 0]
+
+
+def _scan_subdirs(members, path):
+    """The directories found directly under the given path by a linear scan
+    of the members, as iterations and samples used to be found.
+    """
+    depth = len(path.split("/")) + 1
+    subdirs = []
+    for m in members:
+        path_els = m.name.rstrip("/").split("/")
+        if m.isdir() and len(path_els) == depth and "/".join(path_els[:-1]) == path:
+            subdirs.append(path_els[-1])
+    return sorted(subdirs)
+
+
+class TestMemberIndex:
+    @staticmethod
+    def test_index():
+        members = _members(_names)
+        idx = _MemberIndex(members)
+        assert sorted(idx.dirs) == sorted(
+            n.rstrip("/") for n, m in zip(_names, members) if m.isdir()
+        )
+        assert not any(d.endswith("/") for d in idx.dirs)
+        # Entries are kept in member order, whether or not their directory
+        # precedes them.
+        csv_dir = f"{_dirname}/2-iter/sample1/tools-default/host-b/iostat/csv"
+        assert [m.name for m in idx.dir_entries[csv_dir]] == [
+            f"{csv_dir}/disk_Wait.csv",
+            f"{csv_dir}/disk_IOPS.csv",
+        ]
+        assert [m.name for m in idx.dir_entries[os.path.dirname(csv_dir)]] == [
+            f"{csv_dir}/"
+        ]
+        assert idx.file_names == sorted(_scan_files(members, _dirname))
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "path",
+        [
+            _dirname,
+            f"{_host_dir}/iostat/csv",
+            f"{_host_dir}/iostat/csv/",
+            f"{_host_dir}/iostat-stdout.txt",
+            f"{_dirname}/2-iter/sample1/tools-default/host-b/iostat/csv",
+            f"{_dirname}/2-iter/sample",
+            f"{_dirname}/3-iter",
+        ],
+    )
+    def test_files_by_partial_path(path):
+        members = _members(_names)
+        assert list(_ptb(members).gen_files_by_partial_path(path)) == _scan_files(
+            members, path
+        )
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "path",
+        [
+            _dirname,
+            f"{_dirname}/1-iter",
+            f"{_dirname}/2-iter",
+            f"{_dirname}/2-iter/sample1/tools-default/host-b/iostat",
+            f"{_dirname}/3-iter",
+        ],
+    )
+    def test_subdirs(path):
+        members = _members(_names)
+        assert _ptb(members).get_subdirs(path) == _scan_subdirs(members, path)
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "result_tarball",
+        [dict(hosts=2, unpacked=True), dict(hosts=2, unpacked=False)],
+        indirect=True,
+    )
+    def test_result_tarball(make_idxctx, result_tarball):
+        tb, extracted_root, workdir = result_tarball
+        ptb = PbenchTarBall(make_idxctx(), tb, workdir, extracted_root)
+        assert [i.name for i in ptb.get_iterations()] == _scan_subdirs(
+            ptb.members, ptb.dirname
+        )
+        for iteration in ptb.get_iterations():
+            iter_path = f"{ptb.dirname}/{iteration.name}"
+            samples = [s.name for s in ptb.get_samples(iteration)]
+            assert samples == _scan_subdirs(ptb.members, iter_path)
+            for sample, host, tool in itertools.product(
+                samples, ptb.get_hosts(), ("iostat", "mpstat", "vmstat")
+            ):
+                path = f"{iter_path}/{sample}/tools-default/{host}/{tool}/csv"
+                files = list(ptb.gen_files_by_partial_path(path))
+                assert files
+                assert files == _scan_files(ptb.members, path)
+
+
+class TestHosts:
+    @staticmethod
+    @pytest.mark.parametrize("result_tarball", [dict(hosts=3)], indirect=True)
+    def test_hosts(make_idxctx, result_tarball):
+        tb, extracted_root, workdir = result_tarball
+        ptb = PbenchTarBall(make_idxctx(), tb, workdir, extracted_root)
+        assert ptb.get_hosts() == ["host-0", "host-1", "host-2"]
+        ptb.save_manifest()
+        mptb = PbenchTarBall(make_idxctx(manifests=True), tb, workdir, extracted_root)
+        assert mptb.members_source == "manifest"
+        assert mptb.get_hosts() == ptb.get_hosts()
+        # The hosts are listed once each, sorted.
+        ptb.mdconf.set("tools", "hosts", "host-2 host-0 host-2")
+        assert ptb.get_hosts() == ["host-0", "host-2"]
+        ptb.mdconf.remove_section("tools")
+        assert ptb.get_hosts() == []
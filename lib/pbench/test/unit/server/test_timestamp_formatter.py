@@ -0,0 +1,59 @@
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+from pbench import _STD_DATETIME_FMT
+from pbench.server.indexer import TimestampFormatter
+
+
+_start = datetime(2018, 10, 24, 14, 38, 18, 123456)
+_end = datetime(2018, 10, 24, 16, 0, 0, 654321)
+# The start of the run in milliseconds since the epoch.
+_start_ms = 1540391898123.456
+
+
+class TestTimestampFormatter:
+    @staticmethod
+    @pytest.mark.parametrize(
+        "orig_ts",
+        [
+            _start_ms,
+            f"{_start_ms + 1000.0005}",
+            "1540396800654.321",
+            1540393000000,
+            "1540393000000.0004999",
+        ],
+    )
+    def test_absolute(orig_ts):
+        expected = datetime.utcfromtimestamp(float(orig_ts) / 1000).strftime(
+            _STD_DATETIME_FMT
+        )
+        tsf = TimestampFormatter(_start, _end)
+        assert tsf.format(orig_ts, Counter()) == expected
+
+    @staticmethod
+    def test_relative():
+        tsf = TimestampFormatter(_start, _end)
+        assert tsf.format("1500.25", Counter()) == "2018-10-24T14:38:19.623706"
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "orig_ts",
+        ["not-a-number", "", "nan", "inf", 1540396800654.322, 1e20, -1e20, 6e6],
+    )
+    def test_not_handled(orig_ts):
+        counters = Counter()
+        tsf = TimestampFormatter(_start, _end)
+        assert tsf.format(orig_ts, counters) is None
+        assert not counters
+
+    @staticmethod
+    def test_cache():
+        counters = Counter()
+        tsf = TimestampFormatter(_start, _end, maxsize=2)
+        for orig_ts in ("1000", "2000", "1000", "3000", "2000"):
+            tsf.format(orig_ts, counters)
+        # "2000" was evicted when "3000" was added.
+        assert counters == Counter(ts_cache_hits=1, ts_cache_misses=4)
+        assert list(tsf._cache.keys()) == ["3000", "2000"]
@@ -0,0 +1,86 @@
+import tarfile
+
+import pytest
+
+from pbench.server.indexer import (
+    ManifestMember,
+    _gen_toc_groups,
+    _in_toc_order,
+    _toc_order_key,
+)
+
+
+_dirname = "pbench-user-benchmark_example_2020.01.01T00.00.00"
+
+
+def _members(names):
+    """Construct members from the given names, where a trailing "/" denotes
+    a directory.
+    """
+    return [
+        ManifestMember(
+            name.rstrip("/"),
+            tarfile.DIRTYPE if name.endswith("/") else tarfile.REGTYPE,
+            0,
+            0o644,
+            0,
+            "",
+        )
+        for name in names
+    ]
+
+
+# The members in the order a tar ball records them: each directory followed
+# by its contents, recursively.  Note that "1-iter" sorts before "1/...".
+_tar_order = [
+    f"{_dirname}/",
+    f"{_dirname}/1/",
+    f"{_dirname}/1/sample1/",
+    f"{_dirname}/1/sample1/result.txt",
+    f"{_dirname}/1/result.txt",
+    f"{_dirname}/1-iter/",
+    f"{_dirname}/1-iter/result.txt",
+    f"{_dirname}/metadata.log",
+]
+
+
+class TestTocGroups:
+    @staticmethod
+    def test_order():
+        members = _members(_tar_order)
+        assert not _in_toc_order(members)
+        members.sort(key=_toc_order_key)
+        assert _in_toc_order(members)
+        groups = [
+            (dname, [d.name for d in dirs], [e.name for e in entries])
+            for dname, dirs, entries in _gen_toc_groups(members)
+        ]
+        assert groups == [
+            (_dirname, [_dirname], [f"{_dirname}/metadata.log"]),
+            (f"{_dirname}/1", [f"{_dirname}/1"], [f"{_dirname}/1/result.txt"],),
+            (
+                f"{_dirname}/1-iter",
+                [f"{_dirname}/1-iter"],
+                [f"{_dirname}/1-iter/result.txt"],
+            ),
+            (
+                f"{_dirname}/1/sample1",
+                [f"{_dirname}/1/sample1"],
+                [f"{_dirname}/1/sample1/result.txt"],
+            ),
+        ]
+        # Same order as sorting the directory names.
+        assert [g[0] for g in groups] == sorted(g[0] for g in groups)
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "names,dirs",
+        [
+            ([f"{_dirname}/", f"{_dirname}/1/", f"{_dirname}/1/"], [1, 2]),
+            ([f"{_dirname}/", f"{_dirname}/1/result.txt"], [1, 0]),
+            ([], []),
+        ],
+    )
+    def test_dups_and_missing(names, dirs):
+        members = sorted(_members(names), key=_toc_order_key)
+        assert [len(g[1]) for g in _gen_toc_groups(members)] == dirs
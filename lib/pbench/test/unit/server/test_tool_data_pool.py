@@ -0,0 +1,95 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from configparser import ConfigParser
+from types import SimpleNamespace
+
+import pytest
+
+from pbench.common.logger import _StyleAdapter
+from pbench.server import indexer
+from pbench.server.indexer import BulkEngine, PbenchTarBall, es_index
+
+
+def _tool_data(make_idxctx, tarball, workers):
+    tb, extracted_root, workdir = tarball
+    ctx = make_idxctx(tool_data_workers=workers)
+    ptb = PbenchTarBall(ctx, tb, workdir, extracted_root)
+    docs = sorted(
+        (a["_id"], a["_index"], json.dumps(a["_source"], sort_keys=True))
+        for a in ptb.mk_tool_data_actions()
+    )
+    return ctx, ptb, docs
+
+
+@pytest.mark.parametrize("result_tarball", [dict(hosts=2)], indirect=True)
+class TestToolDataPool:
+    @staticmethod
+    def test_same_documents(make_idxctx, result_tarball):
+        seq_ctx, seq_ptb, seq_docs = _tool_data(make_idxctx, result_tarball, 1)
+        pool_ctx, pool_ptb, pool_docs = _tool_data(make_idxctx, result_tarball, 3)
+        # 2 iterations, of 2 samples, on 2 hosts, 5 rows of 6 documents each.
+        assert len(seq_docs) == 2 * 2 * 2 * 5 * 6
+        assert pool_docs == seq_docs
+        # The operational context and statistics of each unit come back from
+        # the workers.
+        assert sorted(o["object"] for o in pool_ctx.opctx) == sorted(
+            o["object"] for o in seq_ctx.opctx
+        )
+        assert {
+            tool: stats["documents"] for tool, stats in pool_ptb.stats.tools.items()
+        } == {tool: stats["documents"] for tool, stats in seq_ptb.stats.tools.items()}
+        # No spool file is left behind.
+        assert sorted(os.listdir(pool_ptb.tmpdir)) == ["archive", "incoming"]
+
+    @staticmethod
+    def test_unit_error(make_idxctx, result_tarball, monkeypatch):
+        def make_source(td):
+            if td.toolname == "vmstat":
+                raise indexer.BadDate("bad vmstat")
+            return orig_make_source(td)
+
+        orig_make_source = indexer.ToolData.make_source
+        monkeypatch.setattr(indexer.ToolData, "make_source", make_source)
+        with pytest.raises(indexer.BadDate):
+            _tool_data(make_idxctx, result_tarball, 2)
+
+    @staticmethod
+    def test_parallel_bulk_engine(make_idxctx, make_es, result_tarball, monkeypatch):
+        # The "parallel" bulk engine consumes the actions in a thread of its
+        # own, while the pool of tool data workers has to be forked by the
+        # thread which asked for the actions.
+        forked_by = []
+        get_context = multiprocessing.get_context
+
+        def recording_get_context(method):
+            ctx = get_context(method)
+
+            def pool(*args, **kwargs):
+                forked_by.append(threading.current_thread())
+                return ctx.Pool(*args, **kwargs)
+
+            return SimpleNamespace(Pool=pool)
+
+        monkeypatch.setattr(multiprocessing, "get_context", recording_get_context)
+        conf = ConfigParser()
+        conf.read_dict(
+            {"Indexing": dict(bulk_engine="parallel", bulk_action_count="50")}
+        )
+        tb, extracted_root, workdir = result_tarball
+        ctx = make_idxctx(tool_data_workers=3)
+        ptb = PbenchTarBall(ctx, tb, workdir, extracted_root)
+        es = make_es(latency=0.1)
+        with open(os.devnull, "w") as errorsfp:
+            res = es_index(
+                es,
+                ptb.mk_tool_data_actions(),
+                errorsfp,
+                _StyleAdapter(logging.getLogger("test_tool_data_pool")),
+                bulk_engine=BulkEngine(SimpleNamespace(conf=conf)),
+            )
+        assert forked_by == [threading.main_thread()]
+        assert res[2:] == (2 * 2 * 2 * 5 * 6, 0, 0, 0)
+        assert es.max_in_flight > 1
@@ -0,0 +1,96 @@
+import re
+
+import pytest
+
+from pbench.server.indexer import (
+    ToolHandlerResolver,
+    _aliases,
+    _known_tool_handlers,
+)
+
+
+_file_names = [
+    "disk_IOPS.csv",
+    "disk_Queue_Size.csv",
+    "disk_Throughput.csv",
+    "disk_Wait_Time.csv",
+    "disk_Unknown.csv",
+    "cpu0_cpu0.csv",
+    "cpuall_cpuall.csv",
+    "cpu_usage_percent_cpu.csv",
+    "memory_usage_virtual_size.csv",
+    "vmstat_cpu.csv",
+    "vmstat_cpu.csv.bak",
+    "proc-vmstat-stdout.txt",
+    "proc-interrupts-stdout.txt",
+    "README",
+]
+
+
+def _match_each(handler, fname):
+    for name in (fname, _aliases.get(fname)):
+        if name is None:
+            continue
+        for rec in handler["patterns"]:
+            if rec["pattern"].match(name):
+                return rec
+    return None
+
+
+class TestToolHandlerResolver:
+    @staticmethod
+    @pytest.mark.parametrize(
+        "tool",
+        [
+            tool
+            for tool, handler in _known_tool_handlers.items()
+            if handler is not None and "patterns" in handler
+        ],
+    )
+    def test_same_as_each_pattern(tool):
+        handler = _known_tool_handlers[tool]
+        resolver = ToolHandlerResolver(_aliases)
+        for fname in _file_names:
+            assert resolver.resolve(tool, handler, fname) is _match_each(
+                handler, fname
+            ), fname
+
+    @staticmethod
+    def test_memoized():
+        resolver = ToolHandlerResolver(_aliases)
+        handler = _known_tool_handlers["iostat"]
+        for _ in range(3):
+            rec = resolver.resolve("iostat", handler, "disk_Throughput.csv")
+            assert rec["metric"] == "tput"
+            assert resolver.resolve("iostat", handler, "disk_Unknown.csv") is None
+            assert (
+                resolver.resolve(
+                    "iostat", handler, "disk_Throughput.csv", use_aliases=False
+                )
+                is None
+            )
+        assert resolver.cache_info() == dict(hits=6, misses=3, size=3, compiles=1)
+
+    @staticmethod
+    def test_extended_handlers():
+        resolver = ToolHandlerResolver({})
+        handler = {"patterns": [{"pattern": re.compile(r"^(?P<id>a.*)\.csv$")}]}
+        assert resolver.resolve("new-tool", handler, "b.csv") is None
+        # A new pattern, using the same group name, and one with flags.
+        handler["patterns"].append({"pattern": re.compile(r"^(?P<id>b.*)\.csv$")})
+        assert resolver.resolve("new-tool", handler, "b.csv") is handler["patterns"][1]
+        handler["patterns"].append({"pattern": re.compile(r"^c.*\.CSV$", re.I)})
+        assert resolver.resolve("new-tool", handler, "c.csv") is handler["patterns"][2]
+        assert resolver.resolve("new-tool", handler, "a.csv") is handler["patterns"][0]
+        assert resolver.cache_info()["compiles"] == 3
+
+    @staticmethod
+    def test_replaced_handler_pattern():
+        resolver = ToolHandlerResolver({})
+        handler = {"patterns": [{"pattern": re.compile(r"^a.*\.csv$")}]}
+        assert resolver.resolve("new-tool", handler, "b.csv") is None
+        # Replacing a record in place keeps the list and its length.
+        handler["patterns"][0] = {"pattern": re.compile(r"^b.*\.csv$")}
+        assert resolver.resolve("new-tool", handler, "b.csv") is handler["patterns"][0]
+        assert resolver.resolve("new-tool", handler, "a.csv") is None
+        assert resolver.cache_info()["compiles"] == 2
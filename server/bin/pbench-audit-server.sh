@@ -12,7 +12,7 @@
 #     For each "good" controller do:
 #       Verify all sub-directories of a given controller are one
 #         of the expected state directories
-#       Verify all files are *.tar.xz[.md5]
+#       Verify all files are *.tar.xz[.md5|.manifest]
 #         flagging *.tar.xz.prefix or prefix.*.tar.xz in the
 #         controller directory
 #       Verify all prefix files in .prefix directories are *.prefix
@@ -679,7 +679,7 @@ function verify_archive {
         find ${controller} -maxdepth 1 \
                 \( -type d ! -name . ! -name $(basename -- ${controller}) ! -name .prefix -fprintf ${directories}.unsorted "\t  %f\n" \) \
                 -o \( -type l -fprintf ${unexpected_symlinks}.unsorted "\t  %f -> %l\n" \) \
-                -o \( -type f ! -name '*.tar.xz.md5' ! -name '*.tar.xz' -fprintf ${unexpected_objects}.unsorted "\t  %f\n" \) \
+                -o \( -type f ! -name '*.tar.xz.md5' ! -name '*.tar.xz.manifest' ! -name '*.tar.xz' -fprintf ${unexpected_objects}.unsorted "\t  %f\n" \) \
                 -o \( -type f \( -name '*.tar.xz.md5' -o -name '*.tar.xz' \) -fprintf ${tarballs} "%f\n" \)
         status=$?
         if [[ $status -gt 0 ]]; then
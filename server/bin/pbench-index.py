@@ -9,6 +9,9 @@ into the configured Elasticsearch V1 instance.
 import sys
 import os
 import glob
+import json
+import multiprocessing
+import queue
 import signal
 import tarfile
 import tempfile
@@ -28,9 +31,15 @@ from pbench.common.exceptions import (
 )
 from pbench.server import tstos
 from pbench.server.indexer import (
+    BacklogEntry,
     IdxContext,
+    IndexingBacklog,
+    IndexingHistory,
+    IndexingStats,
     PbenchTarBall,
     es_index,
+    get_es,
+    tarball_script,
     VERSION,
 )
 from pbench.server.report import Report
@@ -73,6 +82,465 @@ def _count_lines(fname):
     return cnt
 
 
+def _index_tb(idxctx, tb, tmpdir, extracted_root, ie_filepath):
+    """Index a single tar ball, returning a tuple of the tar ball status code
+    (see main() below for the list of codes), the result tuple from
+    es_index(), which is None if indexing never completed, and the
+    IndexingStats of the tar ball, which is None if it could not be opened.
+
+    When checkpoints are enabled, the progress of indexing the tar ball is
+    recorded next to its symlink, resuming from where an earlier pass left
+    off.  It is removed once the tar ball has been processed, unless it
+    failed with an error which can be retried (12, e.g. an Elasticsearch
+    instance which stalled), so that the retry resumes from it.
+
+    A SigIntException is raised if indexing was interrupted by SIGINT, and a
+    SigTermException is raised, unhandled, when a SIGTERM is received, the
+    checkpoint being kept for the next pass in both cases.
+    """
+    es_res = None
+    ptb = None
+    try:
+        # "Open" the tar ball represented by the tar ball object
+        idxctx.logger.debug("open tar ball")
+        ptb = PbenchTarBall(idxctx, os.path.realpath(tb), tmpdir, extracted_root)
+        if idxctx.checkpoints:
+            checkpoint = ptb.open_checkpoint(f"{tb}.checkpoint")
+            if checkpoint.resuming():
+                idxctx.logger.info("Resuming indexing of {} from its checkpoint", tb)
+
+        # Construct the generator for emitting all actions.  The `idxctx`
+        # dictionary is passed along to each generator so that it can add its
+        # context for error handling to the list.
+        idxctx.logger.debug("generator setup")
+        if idxctx.options.index_tool_data:
+            actions = ptb.stats.timed("tool_data", ptb.mk_tool_data_actions())
+        else:
+            actions = ptb.make_all_actions()
+
+        # File name for containing all indexing errors that can't/won't be
+        # retried.
+        with ie_filepath.open(mode="w") as fp:
+            idxctx.logger.debug("begin indexing")
+            try:
+                signal.signal(signal.SIGINT, sigint_handler)
+                es_res = es_index(
+                    idxctx.es,
+                    actions,
+                    fp,
+                    idxctx.logger,
+                    idxctx._dbg,
+                    bulk_engine=idxctx.bulk_engine,
+                    stats=ptb.stats,
+                    checkpoint=ptb.checkpoint,
+                )
+            finally:
+                # Turn off the SIGINT handler when not indexing.
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+    except (SigIntException, SigTermException):
+        raise
+    except UnsupportedTarballFormat as e:
+        idxctx.logger.warning("Unsupported tar ball format: {}", e)
+        tb_res = 4
+    except BadDate as e:
+        idxctx.logger.warning("Bad Date: {!r}", e)
+        tb_res = 5
+    except _filenotfounderror as e:
+        idxctx.logger.warning("No such file: {}", e)
+        tb_res = 6
+    except BadMDLogFormat as e:
+        idxctx.logger.warning("The metadata.log file is curdled in tar ball: {}", e)
+        tb_res = 7
+    except SosreportHostname as e:
+        idxctx.logger.warning("Bad hostname in sosreport: {}", e)
+        tb_res = 10
+    except tarfile.TarError as e:
+        idxctx.logger.error(
+            "Can't unpack tar ball into {}: {}",
+            ptb.extracted_root if ptb else extracted_root,
+            e,
+        )
+        tb_res = 11
+    except Exception as e:
+        idxctx.logger.exception("Other indexing error: {}", e)
+        tb_res = 12
+    else:
+        beg, end, successes, duplicates, failures, retries = es_res
+        idxctx.logger.info(
+            "done indexing (start ts: {}, end ts: {}, duration:"
+            " {:.2f}s, successes: {:d}, duplicates: {:d},"
+            " failures: {:d}, retries: {:d})",
+            tstos(beg),
+            tstos(end),
+            end - beg,
+            successes,
+            duplicates,
+            failures,
+            retries,
+        )
+        tb_res = 1 if failures > 0 else 0
+        ptb.stats.record_opctx(idxctx.opctx, ptb.tbname)
+        if ptb.checkpoint is not None and ptb.checkpoint.skipped:
+            idxctx.logger.info(
+                "{:d} actions indexed by earlier passes were not sent again",
+                ptb.checkpoint.skipped,
+            )
+        if idxctx.manifests and ptb.manifest is None:
+            # Persist the manifest of the tar ball so that later passes over
+            # it don't have to list its members again.
+            try:
+                ptb.save_manifest()
+            except SigTermException:
+                raise
+            except Exception as e:
+                idxctx.logger.warning(
+                    "Failed to save manifest for tar ball {}: {}", tb, e
+                )
+    finally:
+        # Stop charging the document IDs computed to this tar ball.
+        IndexingStats.active = None
+    if ptb is not None and ptb.checkpoint is not None and tb_res != 12:
+        # The tar ball has been processed, successfully or with an error
+        # which retrying it won't fix; a tar ball with index failures (1)
+        # had all its actions acknowledged, and its retry has to send the
+        # failed ones again.
+        ptb.checkpoint.remove()
+    return tb_res, es_res, ptb.stats if ptb is not None else None
+
+
+def _rebuild_manifests(idxctx, archive, incoming):
+    """(Re)build the manifest of every tar ball in the archive that has been
+    unpacked, replacing any existing manifest.
+    """
+    built = skipped = 0
+    with tempfile.TemporaryDirectory(
+        prefix=f"{idxctx.name}.", dir=idxctx.config.TMP
+    ) as tmpdir:
+        for tb in sorted(glob.iglob(os.path.join(archive, "*", "*.tar.xz"))):
+            tb_path = Path(tb)
+            extracted_root = Path(incoming, tb_path.parent.name)
+            if not Path(extracted_root, tb_path.name[: -len(".tar.xz")]).is_dir():
+                idxctx.logger.debug("Skipping {}, it is not unpacked", tb)
+                skipped += 1
+                continue
+            try:
+                ptb = PbenchTarBall(
+                    idxctx, tb, tmpdir, extracted_root, use_manifest=False
+                )
+                mpath = ptb.save_manifest()
+            except SigTermException:
+                raise
+            except Exception as e:
+                idxctx.logger.warning("Failed to rebuild manifest for {}: {}", tb, e)
+                skipped += 1
+            else:
+                idxctx.logger.debug("Rebuilt manifest {}", mpath)
+                built += 1
+    idxctx.logger.info(
+        "Rebuilt {:d} tar ball manifests ({:d} tar balls skipped)", built, skipped
+    )
+    return 0
+
+
+def _report_indexing_errors(idxctx, report, tb, ie_filepath, es_res):
+    """Post an "errors" status report if indexing the given tar ball recorded
+    any indexing errors, unconditionally removing the indexing errors file.
+    """
+    try:
+        ie_len = ie_filepath.stat().st_size
+    except _filenotfounderror:
+        # Indexing never made it to the actual indexing step, ignore.
+        pass
+    except SigTermException:
+        # Re-raise a SIGTERM to avoid it being lumped in with general
+        # exception handling below.
+        raise
+    except Exception:
+        idxctx.logger.exception(
+            "Unexpected error handling indexing errors file: {}", ie_filepath,
+        )
+    else:
+        # Success fetching indexing error file size.
+        if ie_len > len(tb) + 1:
+            end = es_res[1] if es_res else idxctx.time()
+            try:
+                report.post_status(tstos(end), "errors", ie_filepath)
+            except Exception:
+                idxctx.logger.exception(
+                    "Unexpected error issuing report status with errors: {}",
+                    ie_filepath,
+                )
+    finally:
+        # Unconditionally remove the indexing errors file.
+        try:
+            os.remove(ie_filepath)
+        except SigTermException:
+            # Re-raise a SIGTERM to avoid it being lumped in with general
+            # exception handling below.
+            raise
+        except Exception:
+            pass
+
+
+def _report_stats(idxctx, report, stats, tmpdir):
+    """Post an "indexing-stats" status report of the performance statistics
+    of the tar balls indexed, and write them to the Prometheus text file, as
+    configured.
+    """
+    if not idxctx.collect_stats:
+        return
+    labels = dict(
+        name=idxctx.name,
+        version=VERSION,
+        bulk_engine=idxctx.bulk_engine.engine,
+        workers=idxctx.options.workers,
+    )
+    if idxctx.stats_report:
+        stats_fname = Path(tmpdir, f"{idxctx.name}.{idxctx.TS}.stats.json")
+        record = stats.to_dict()
+        record.update(labels)
+        try:
+            with stats_fname.open(mode="w") as fp:
+                json.dump(record, fp, sort_keys=True)
+            report.post_status(tstos(idxctx.time()), "indexing-stats", stats_fname)
+        except SigTermException:
+            # Re-raise a SIGTERM to avoid it being lumped in with general
+            # exception handling below.
+            raise
+        except Exception:
+            idxctx.logger.exception(
+                "Unexpected error issuing report status with indexing statistics"
+            )
+    if idxctx.stats_prometheus_file:
+        # Given a directory, each flavor of pbench-index writes its own file.
+        prom_path = Path(idxctx.stats_prometheus_file)
+        if prom_path.is_dir():
+            prom_path = prom_path / f"{idxctx.name}.prom"
+        try:
+            stats.write_prometheus(prom_path, labels)
+        except SigTermException:
+            raise
+        except Exception as e:
+            idxctx.logger.warning(
+                "Failed to write indexing statistics to {}: {}", prom_path, e
+            )
+
+
+def _move_tb_link(idxctx, tb, dest):
+    """Move the symlink of the given tar ball to the `dest` directory, along
+    with its indexing checkpoint, if one was kept for a later retry.
+    """
+    rename_tb_link(tb, dest, idxctx.logger)
+    checkpoint = f"{tb}.checkpoint"
+    try:
+        os.rename(checkpoint, Path(dest, os.path.basename(checkpoint)))
+    except _filenotfounderror:
+        pass
+    except SigTermException:
+        raise
+    except Exception as e:
+        idxctx.logger.warning(
+            "Failed to move indexing checkpoint {} to {}: {}", checkpoint, dest, e
+        )
+
+
+def _dispose_tb(idxctx, tb, tb_res, linkdest, linkerrdest, indexed, erred, skipped):
+    """Record the outcome of indexing the given tar ball, and move its symlink
+    to the directory reflecting that outcome.
+
+    Different `linkerrdest` directories are used for different failures so
+    that we can retry indexing easily if possible; the rest end up in
+    `linkerrdest` for later retry.  A tar ball's indexing checkpoint, if
+    kept, moves with its symlink.
+    """
+    controller_path = Path(tb).parent.parent
+
+    if tb_res == 0:
+        idxctx.logger.info(
+            "{}: {}/{}: success", idxctx.TS, controller_path.name, os.path.basename(tb),
+        )
+        # Success
+        with indexed.open(mode="a") as fp:
+            print(tb, file=fp)
+        _move_tb_link(idxctx, tb, Path(controller_path, linkdest))
+    elif tb_res == 1:
+        idxctx.logger.warning("{}: index failures encountered on {}", idxctx.TS, tb)
+        with erred.open(mode="a") as fp:
+            print(tb, file=fp)
+        _move_tb_link(idxctx, tb, Path(controller_path, f"{linkerrdest}.1"))
+    elif tb_res in (2, 3):
+        assert False, (
+            f"Logic Bomb!  Unexpected tar ball handling "
+            f"result status {tb_res:d} for tar ball {tb}"
+        )
+    elif tb_res >= 4:
+        # # Quietly skip these errors
+        with skipped.open(mode="a") as fp:
+            print(tb, file=fp)
+        _move_tb_link(idxctx, tb, Path(controller_path, f"{linkerrdest}.{tb_res:d}"))
+    else:
+        idxctx.logger.error(
+            "{}: index error {:d} encountered on {}", idxctx.TS, tb_res, tb
+        )
+        with erred.open(mode="a") as fp:
+            print(tb, file=fp)
+        _move_tb_link(idxctx, tb, Path(controller_path, linkerrdest))
+
+
+# The indexing context of a worker process, established by _pool_init().
+_pool_idxctx = None
+
+
+def _pool_init(idxctx):
+    """Initialize a forked worker process of the indexing pool.
+
+    Workers exit immediately on SIGTERM, and ignore SIGINT and SIGQUIT (SIGINT
+    is forwarded to the workers by the parent process, and is only handled
+    while a worker is indexing).
+    """
+    global _pool_idxctx
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGQUIT, signal.SIG_IGN)
+    if not idxctx.config._unittests:
+        # Don't share the parent's Elasticsearch connection pool across the
+        # fork.  The mock'd Elasticsearch object is kept, since it carries
+        # the templates the parent already "put".
+        idxctx.es = get_es(idxctx.config, idxctx.logger)
+    _pool_idxctx = idxctx
+
+
+def _pool_index_tb(tb, tmpdir, extracted_root, ie_filepath):
+    """Index a single tar ball in a worker process of the indexing pool.
+
+    Returns a tuple of the tar ball status code (None if indexing was
+    interrupted by SIGINT), the es_index() result tuple, the IndexingStats of
+    the tar ball, and the operational context gathered while indexing it.
+    """
+    idxctx = _pool_idxctx
+    idxctx.opctx = []
+    try:
+        tb_res, es_res, stats = _index_tb(
+            idxctx, tb, tmpdir, extracted_root, ie_filepath
+        )
+    except SigIntException:
+        idxctx.logger.exception(
+            "Indexing interrupted by SIGINT, continuing to next tarball"
+        )
+        tb_res, es_res, stats = None, None, None
+    return tb_res, es_res, stats, idxctx.opctx
+
+
+def _index_tbs_w_pool(
+    idxctx, backlog, tmpdir, incoming_rp, ie_prefix, finish_tb, sigquit_interrupt
+):
+    """Index the tar balls of the given IndexingBacklog using a pool of worker
+    processes.
+
+    At most `idxctx.options.workers` tar balls are indexed concurrently, each
+    lane of the backlog taking the next of its tar balls as one of its
+    workers becomes available.  Each tar ball is finished (errors reported,
+    its symlink moved) by the calling process as soon as its worker
+    completes.
+
+    The signal behaviors of main() are preserved:
+
+        - SIGQUIT: no further tar balls are started, the ones in flight are
+          indexed until completion
+        - SIGINT: forwarded to the workers, interrupting the tar balls in
+          flight (their symlinks are left in place) and proceeding to the
+          next ones
+        - SIGTERM: the workers are terminated immediately
+    """
+    workers = idxctx.options.workers
+    done_q = queue.Queue()
+
+    def on_done(lane, entry, ie_filepath):
+        # The callbacks are invoked on the pool's result handler thread, so we
+        # just queue up the results for the main thread to handle.
+        return lambda res: done_q.put((lane, entry, ie_filepath, res))
+
+    def sigint_forwarder(*args):
+        for child in multiprocessing.active_children():
+            os.kill(child.pid, signal.SIGINT)
+
+    pool = multiprocessing.get_context("fork").Pool(
+        workers, initializer=_pool_init, initargs=(idxctx,)
+    )
+    lanes = backlog.lanes(workers)
+    in_flight = dict.fromkeys(lanes, 0)
+    tb_cnt = 0
+    doc_cnt = 0
+    beg = idxctx.time()
+    try:
+        signal.signal(signal.SIGINT, sigint_forwarder)
+        while True:
+            for lane, lane_workers in lanes.items():
+                while in_flight[lane] < lane_workers and not sigquit_interrupt[0]:
+                    entry = backlog.take(lane)
+                    if entry is None:
+                        break
+                    tb = entry.tb
+                    idxctx.logger.info("Starting {} (size {:d})", tb, entry.size)
+                    ie_filepath = Path(
+                        tmpdir,
+                        f"{ie_prefix}.{os.path.basename(tb)}.indexing-errors.json",
+                    )
+                    cb = on_done(lane, entry, ie_filepath)
+                    pool.apply_async(
+                        _pool_index_tb,
+                        (tb, tmpdir, Path(incoming_rp, entry.controller), ie_filepath),
+                        callback=cb,
+                        error_callback=cb,
+                    )
+                    in_flight[lane] += 1
+            if not any(in_flight.values()):
+                break
+            lane, entry, ie_filepath, res = done_q.get()
+            in_flight[lane] -= 1
+            if isinstance(res, Exception):
+                idxctx.logger.error("Other indexing error: {}", res)
+                tb_res, es_res, stats = 12, None, None
+            else:
+                tb_res, es_res, stats, opctx = res
+                idxctx.opctx.extend(opctx)
+            if tb_res is None:
+                # Interrupted by SIGINT, leave the tar ball symlink in place.
+                continue
+            finish_tb(entry, tb_res, es_res, ie_filepath, stats)
+            idxctx.logger.info(
+                "Finished{} {} (size {:d})",
+                "[SIGQUIT]" if sigquit_interrupt[0] else "",
+                entry.tb,
+                entry.size,
+            )
+            tb_cnt += 1
+            if es_res is not None:
+                doc_cnt += es_res[2]
+    except SigTermException:
+        idxctx.logger.exception("Indexing interrupted by SIGTERM, terminating")
+        pool.terminate()
+    except Exception:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        pool.join()
+    duration = idxctx.time() - beg
+    idxctx.logger.info(
+        "Indexed {:d} tar balls ({:d} documents) using {:d} workers in {:.2f}s:"
+        " {:.2f} tar balls/s, {:.2f} docs/s",
+        tb_cnt,
+        doc_cnt,
+        workers,
+        duration,
+        tb_cnt / duration if duration > 0 else 0.0,
+        doc_cnt / duration if duration > 0 else 0.0,
+    )
+
+
 def main(options, name):
     """Main entry point to pbench-index.
 
@@ -83,7 +551,15 @@ def main(options, name):
                                    list of index patterns that would be used
            dump_templates        - Dump the templates that would be used
            index_tool_data       - Index tool data only
+           max_runtime           - Seconds within which the tar balls
+                                   started are estimated to complete, the
+                                   others being left for the next pass (None
+                                   for no limit)
            re_index              - Consider tar balls marked for re-indexing
+           rebuild_manifests     - Don't do any indexing, but (re)build the
+                                   manifest of every unpacked tar ball
+           workers               - Number of tar balls to index concurrently
+                                   using a pool of worker processes
        All exceptions are caught and logged to syslog with the stacktrace of
        the exception in a sub-object of the logged JSON document.
 
@@ -162,6 +638,22 @@ def main(options, name):
         )
         return 2
 
+    if options.max_runtime is not None and options.max_runtime < 1:
+        print(
+            f"{name}: ERROR: Invalid --max-runtime, {options.max_runtime!r},"
+            " must be greater than zero",
+            file=sys.stderr,
+        )
+        return 2
+
+    if options.workers < 1:
+        print(
+            f"{name}: ERROR: Invalid --workers, {options.workers!r},"
+            " must be greater than zero",
+            file=sys.stderr,
+        )
+        return 2
+
     idxctx = None
     try:
         idxctx = IdxContext(options, name, _dbg=_DEBUG)
@@ -225,6 +717,9 @@ def main(options, name):
         # Exit early if we encounter any errors.
         return res
 
+    if options.rebuild_manifests:
+        return _rebuild_manifests(idxctx, ARCHIVE_rp, INCOMING_rp)
+
     idxctx.logger.debug("{}.{}: starting", name, idxctx.TS)
 
     # find -L $ARCHIVE/*/$linksrc -name '*.tar.xz' -printf "%s\t%p\n" 2>/dev/null | sort -n > $list
@@ -276,12 +771,40 @@ def main(options, name):
             idxctx.logger.info("No tar balls found that need processing")
             return 0
 
-    # We always process the smallest tar balls first.
-    tarballs = sorted(tarballs)
+    # The cost of each tar ball is estimated from the history of indexing the
+    # tar balls of its benchmark script, when one is kept, and from its size
+    # alone otherwise, so that we process the cheapest tar balls first.
+    history = IndexingHistory()
+    if idxctx.backlog_history:
+        try:
+            history = IndexingHistory.load(idxctx.backlog_history)
+        except JsonFileError as e:
+            idxctx.logger.warning("Ignoring indexing history: {}", e)
+            history = IndexingHistory(idxctx.backlog_history)
+    entries = []
+    for size, controller, tb in tarballs:
+        script = (
+            tarball_script(tb, Path(INCOMING_rp, controller))
+            if idxctx.backlog_history
+            else None
+        )
+        documents, seconds = history.estimate(script, size)
+        entries.append(BacklogEntry(size, controller, tb, script, documents, seconds))
+    # With more workers than those of the large tar ball lane, the large tar
+    # balls are indexed apart from the small ones.
+    backlog = IndexingBacklog(
+        entries,
+        max_runtime=options.max_runtime,
+        large_seconds=idxctx.large_tarball_seconds
+        if options.workers > idxctx.large_lane_workers
+        else None,
+        large_workers=idxctx.large_lane_workers,
+    )
 
-    # At this point, tarballs contains a list of tar balls sorted by size
-    # that were available as symlinks in the various 'linksrc' directories.
-    idxctx.logger.debug("Preparing to index {:d} tar balls", len(tarballs))
+    # At this point, the backlog contains the tar balls, ordered by their
+    # estimated cost, that were available as symlinks in the various
+    # 'linksrc' directories.
+    idxctx.logger.debug("Preparing to index {:d} tar balls", len(backlog))
 
     try:
         # Now that we are ready to begin the actual indexing step, ensure we
@@ -333,6 +856,9 @@ def main(options, name):
     else:
         idxctx.set_tracking_id(tracking_id)
 
+    # The performance statistics of all the tar balls indexed.
+    run_stats = IndexingStats()
+
     with tempfile.TemporaryDirectory(
         prefix=f"{name}.", dir=idxctx.config.TMP
     ) as tmpdir:
@@ -342,13 +868,12 @@ def main(options, name):
             with tb_list.open(mode="w") as lfp:
                 # Write out all the tar balls we are processing so external
                 # viewers can follow along from home.
-                for size, controller, tb in tarballs:
-                    print(f"{size:20d} {controller} {tb}", file=lfp)
+                for entry in backlog:
+                    print(f"{entry.size:20d} {entry.controller} {entry.tb}", file=lfp)
 
             indexed = Path(tmpdir, f"{name}.{idxctx.TS}.indexed")
             erred = Path(tmpdir, f"{name}.{idxctx.TS}.erred")
             skipped = Path(tmpdir, f"{name}.{idxctx.TS}.skipped")
-            ie_filepath = Path(tmpdir, f"{name}.{idxctx.TS}.indexing-errors.json")
 
             # We use a list object here so that when we close over this
             # variable in the handler, the list object will be closed over,
@@ -360,192 +885,96 @@ def main(options, name):
 
             signal.signal(signal.SIGQUIT, sigquit_handler)
 
-            for size, controller, tb in tarballs:
+            def finish_tb(entry, tb_res, es_res, ie_filepath, stats):
+                if stats is not None:
+                    run_stats.merge(stats)
+                if es_res is not None:
+                    # The es_index() result includes the documents indexed by
+                    # the earlier passes over a resumed tar ball, while the
+                    # statistics of the tar ball only count those of this
+                    # pass, which is what its elapsed time was spent on.
+                    beg, end = es_res[:2]
+                    history.record(
+                        entry.script,
+                        entry.size,
+                        sum(
+                            stats.counters[outcome]
+                            for outcome in ("successes", "duplicates", "failures")
+                        ),
+                        end - beg,
+                    )
+                _report_indexing_errors(idxctx, report, entry.tb, ie_filepath, es_res)
+                _dispose_tb(
+                    idxctx,
+                    entry.tb,
+                    tb_res,
+                    linkdest,
+                    linkerrdest,
+                    indexed,
+                    erred,
+                    skipped,
+                )
+
+            for entry in backlog:
                 # Sanity check source tar ball path
-                linksrc_dir = Path(tb).parent
-                linksrc_dirname = linksrc_dir.name
+                linksrc_dirname = Path(entry.tb).parent.name
                 assert linksrc_dirname == linksrc, (
-                    f"Logic bomb!  tar ball " f"path {tb} does not contain {linksrc}"
+                    f"Logic bomb!  tar ball "
+                    f"path {entry.tb} does not contain {linksrc}"
                 )
 
-                idxctx.logger.info("Starting {} (size {:d})", tb, size)
-
-                ptb = None
-                try:
-                    # "Open" the tar ball represented by the tar ball object
-                    idxctx.logger.debug("open tar ball")
-                    ptb = PbenchTarBall(
-                        idxctx,
-                        os.path.realpath(tb),
-                        tmpdir,
-                        Path(INCOMING_rp, controller),
-                    )
-
-                    # Construct the generator for emitting all actions.  The
-                    # `idxctx` dictionary is passed along to each generator so
-                    # that it can add its context for error handling to the
-                    # list.
-                    idxctx.logger.debug("generator setup")
-                    if options.index_tool_data:
-                        actions = ptb.mk_tool_data_actions()
-                    else:
-                        actions = ptb.make_all_actions()
-
-                    # File name for containing all indexing errors that
-                    # can't/won't be retried.
-                    with ie_filepath.open(mode="w") as fp:
-                        idxctx.logger.debug("begin indexing")
-                        try:
-                            signal.signal(signal.SIGINT, sigint_handler)
-                            es_res = es_index(
-                                idxctx.es, actions, fp, idxctx.logger, idxctx._dbg
-                            )
-                        except SigIntException:
-                            idxctx.logger.exception(
-                                "Indexing interrupted by SIGINT, continuing to next tarball"
-                            )
-                            continue
-                        finally:
-                            # Turn off the SIGINT handler when not indexing.
-                            signal.signal(signal.SIGINT, signal.SIG_IGN)
-                except UnsupportedTarballFormat as e:
-                    idxctx.logger.warning("Unsupported tar ball format: {}", e)
-                    tb_res = 4
-                except BadDate as e:
-                    idxctx.logger.warning("Bad Date: {!r}", e)
-                    tb_res = 5
-                except _filenotfounderror as e:
-                    idxctx.logger.warning("No such file: {}", e)
-                    tb_res = 6
-                except BadMDLogFormat as e:
-                    idxctx.logger.warning(
-                        "The metadata.log file is curdled in" " tar ball: {}", e
-                    )
-                    tb_res = 7
-                except SosreportHostname as e:
-                    idxctx.logger.warning("Bad hostname in sosreport: {}", e)
-                    tb_res = 10
-                except tarfile.TarError as e:
-                    idxctx.logger.error(
-                        "Can't unpack tar ball into {}: {}", ptb.extracted_root, e
-                    )
-                    tb_res = 11
-                except SigTermException:
-                    idxctx.logger.exception(
-                        "Indexing interrupted by SIGTERM, terminating"
-                    )
-                    break
-                except Exception as e:
-                    idxctx.logger.exception("Other indexing error: {}", e)
-                    tb_res = 12
-                else:
-                    beg, end, successes, duplicates, failures, retries = es_res
-                    idxctx.logger.info(
-                        "done indexing (start ts: {}, end ts: {}, duration:"
-                        " {:.2f}s, successes: {:d}, duplicates: {:d},"
-                        " failures: {:d}, retries: {:d})",
-                        tstos(beg),
-                        tstos(end),
-                        end - beg,
-                        successes,
-                        duplicates,
-                        failures,
-                        retries,
-                    )
-                    tb_res = 1 if failures > 0 else 0
-                try:
-                    ie_len = ie_filepath.stat().st_size
-                except _filenotfounderror:
-                    # Above operation never made it to actual indexing, ignore.
-                    pass
-                except SigTermException:
-                    # Re-raise a SIGTERM to avoid it being lumped in with
-                    # general exception handling below.
-                    raise
-                except Exception:
-                    idxctx.logger.exception(
-                        "Unexpected error handling" " indexing errors file: {}",
-                        ie_filepath,
-                    )
-                else:
-                    # Success fetching indexing error file size.
-                    if ie_len > len(tb) + 1:
-                        try:
-                            report.post_status(tstos(end), "errors", ie_filepath)
-                        except Exception:
-                            idxctx.logger.exception(
-                                "Unexpected error issuing"
-                                " report status with errors: {}",
-                                ie_filepath,
-                            )
-                finally:
-                    # Unconditionally remove the indexing errors file.
+            if options.workers > 1:
+                _index_tbs_w_pool(
+                    idxctx,
+                    backlog,
+                    tmpdir,
+                    INCOMING_rp,
+                    f"{name}.{idxctx.TS}",
+                    finish_tb,
+                    sigquit_interrupt,
+                )
+            else:
+                ie_filepath = Path(tmpdir, f"{name}.{idxctx.TS}.indexing-errors.json")
+                for entry in iter(backlog.take, None):
+                    tb = entry.tb
+                    idxctx.logger.info("Starting {} (size {:d})", tb, entry.size)
                     try:
-                        os.remove(ie_filepath)
+                        tb_res, es_res, stats = _index_tb(
+                            idxctx,
+                            tb,
+                            tmpdir,
+                            Path(INCOMING_rp, entry.controller),
+                            ie_filepath,
+                        )
+                    except SigIntException:
+                        idxctx.logger.exception(
+                            "Indexing interrupted by SIGINT, continuing to next tarball"
+                        )
+                        continue
                     except SigTermException:
-                        # Re-raise a SIGTERM to avoid it being lumped in with
-                        # general exception handling below.
-                        raise
-                    except Exception:
-                        pass
-                # Distinguish failure cases, so we can retry the indexing
-                # easily if possible.  Different `linkerrdest` directories for
-                # different failures; the rest are going to end up in
-                # `linkerrdest` for later retry.
-                controller_path = linksrc_dir.parent
-
-                if tb_res == 0:
+                        idxctx.logger.exception(
+                            "Indexing interrupted by SIGTERM, terminating"
+                        )
+                        break
+                    finish_tb(entry, tb_res, es_res, ie_filepath, stats)
                     idxctx.logger.info(
-                        "{}: {}/{}: success",
-                        idxctx.TS,
-                        controller_path.name,
-                        os.path.basename(tb),
-                    )
-                    # Success
-                    with indexed.open(mode="a") as fp:
-                        print(tb, file=fp)
-                    rename_tb_link(tb, Path(controller_path, linkdest), idxctx.logger)
-                elif tb_res == 1:
-                    idxctx.logger.warning(
-                        "{}: index failures encountered on {}", idxctx.TS, tb
-                    )
-                    with erred.open(mode="a") as fp:
-                        print(tb, file=fp)
-                    rename_tb_link(
-                        tb, Path(controller_path, f"{linkerrdest}.1"), idxctx.logger,
-                    )
-                elif tb_res in (2, 3):
-                    assert False, (
-                        f"Logic Bomb!  Unexpected tar ball handling "
-                        f"result status {tb_res:d} for tar ball {tb}"
-                    )
-                elif tb_res >= 4 or res <= 11:
-                    # # Quietly skip these errors
-                    with skipped.open(mode="a") as fp:
-                        print(tb, file=fp)
-                    rename_tb_link(
+                        "Finished{} {} (size {:d})",
+                        "[SIGQUIT]" if sigquit_interrupt[0] else "",
                         tb,
-                        Path(controller_path, f"{linkerrdest}.{tb_res:d}"),
-                        idxctx.logger,
-                    )
-                else:
-                    idxctx.logger.error(
-                        "{}: index error {:d} encountered on {}", idxctx.TS, tb_res, tb
-                    )
-                    with erred.open(mode="a") as fp:
-                        print(tb, file=fp)
-                    rename_tb_link(
-                        tb, Path(controller_path, linkerrdest), idxctx.logger
+                        entry.size,
                     )
+
+                    if sigquit_interrupt[0]:
+                        break
+            if backlog.over_budget:
+                deferred = list(backlog)
                 idxctx.logger.info(
-                    "Finished{} {} (size {:d})",
-                    "[SIGQUIT]" if sigquit_interrupt[0] else "",
-                    tb,
-                    size,
+                    "Deferred {:d} tar balls (estimated {:.0f}s) to the next pass,"
+                    " beyond the max runtime of {:d}s",
+                    len(deferred),
+                    sum(entry.seconds for entry in deferred),
+                    options.max_runtime,
                 )
-
-                if sigquit_interrupt[0]:
-                    break
         except SigTermException:
             # Re-raise a SIGTERM to avoid it being lumped in with general
             # exception handling below.
@@ -612,6 +1041,18 @@ def main(options, name):
                     with skipped.open() as sfp:
                         for line in sorted(sfp):
                             print(line.strip(), file=fp)
+            _report_stats(idxctx, report, run_stats, tmpdir)
+            if idxctx.backlog_history:
+                try:
+                    history.save()
+                except SigTermException:
+                    raise
+                except Exception as e:
+                    idxctx.logger.warning(
+                        "Failed to save indexing history {}: {}",
+                        idxctx.backlog_history,
+                        e,
+                    )
             try:
                 report.post_status(tstos(idxctx.time()), "status", report_fname)
             except SigTermException:
@@ -675,6 +1116,30 @@ if __name__ == "__main__":
         default=False,
         help="Perform re-indexing of previously indexed data",
     )
+    parser.add_argument(
+        "-M",
+        "--rebuild-manifests",
+        action="store_true",
+        dest="rebuild_manifests",
+        default=False,
+        help="Rebuild the manifest of every unpacked tar ball, without indexing",
+    )
+    parser.add_argument(
+        "-W",
+        "--workers",
+        type=int,
+        dest="workers",
+        default=1,
+        help="Number of tar balls to index concurrently (default 1)",
+    )
+    parser.add_argument(
+        "--max-runtime",
+        type=int,
+        dest="max_runtime",
+        default=None,
+        help="Only start the tar balls estimated to complete within this many"
+        " seconds, leaving the others for the next run",
+    )
     parsed = parser.parse_args()
     try:
         # The SIGTERM handler is established around main() to make it easier
@@ -76,6 +76,8 @@ for host in $hosts; do
                 nmd5errs=$nmd5errs+1
             fi
         fi
+        # remove its manifest, if one was ever persisted by pbench-index
+        rm -f $x.manifest
         # change the state to SATELLITE-DONE
         if [ -L TO-DELETE/$x ]; then
             mv -n TO-DELETE/$x SATELLITE-DONE/